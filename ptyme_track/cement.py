@@ -1,9 +1,11 @@
 import json
+import os
 from pathlib import Path
 from typing import Optional, Union
 
 from ptyme_track.cur_times import CEMENTED_PATH, CUR_TIMES_PATH
 from ptyme_track.ptyme_env import PTYME_TRACK_DIR
+from ptyme_track.time_index import update_time_index
 
 
 def cement_cur_times(
@@ -20,12 +22,17 @@ def cement_cur_times(
     with cur_times_path.open() as f:
         cur_times = f.readlines()
     target_file = Path(PTYME_TRACK_DIR) / target_file
+    try:
+        previous_stat: Optional[os.stat_result] = target_file.stat()
+    except FileNotFoundError:
+        previous_stat = None
     record = None
     with target_file.open("a") as f:
         for line in cur_times:
             record = json.loads(line)
             record["git-branch"] = git_branch
             f.write(json.dumps(record) + "\n")
+    update_time_index(target_file, previous_stat)
     cur_times_path.open("w").close()
 
     if record and record.get("hash"):
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from ptyme_track.walker import GitignoreCache, IgnoreMatcher, relative_path, walk_dirs
+
+logger = logging.getLogger(__name__)
+
+# values from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+_EVENT = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+# paths that changed since the last poll, keyed by the watched dir they belong to
+ChangedPaths = Dict[str, Set[str]]
+
+
+class ChangeSource:
+    """
+    Tells the client which paths changed between two scans.
+
+    The base implementation knows nothing, so the client always falls back to a full scan.
+    """
+
+    def start(
+        self,
+        watched_dirs: List[str],
+        ignored_dirs: List[str],
+        gitignore: Optional[GitignoreCache] = None,
+        prune_gitignored: bool = True,
+    ) -> None:
+        """
+        :param gitignore: When given, a changed .gitignore file means a full scan
+        :param prune_gitignored: Whether directories ignored by .gitignore files can be
+            skipped. Not in git work trees, where git may track files in them.
+        """
+        pass
+
+    def poll(self) -> Optional[ChangedPaths]:
+        """
+        Get the paths that changed since the last poll
+
+        :return: The changed paths for each watched dir, or None if the changes are unknown
+            and every watched dir must be fully scanned
+        """
+        return None
+
+    def close(self) -> None:
+        pass
+
+
+class PollingChangeSource(ChangeSource):
+    pass
+
+
+class InotifyChangeSource(ChangeSource):
+    def __init__(self) -> None:
+        self._libc: Optional[ctypes.CDLL] = None
+        self._fd: Optional[int] = None
+        self._watched_dirs: List[str] = []
+        self._ignore_matcher = IgnoreMatcher([])
+        self._gitignore: Optional[GitignoreCache] = None
+        # prunes the watched directories, only set when that agrees with the client
+        self._prune_gitignore: Optional[GitignoreCache] = None
+        # watch descriptor -> (watched dir, directory being watched)
+        self._watches: Dict[int, Tuple[str, Path]] = {}
+        self._changed: ChangedPaths = {}
+        self._rescan = True
+        self._rebuild = False
+
+    @staticmethod
+    def is_supported() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            _load_libc()
+        except (OSError, AttributeError):
+            return False
+        return True
+
+    def start(
+        self,
+        watched_dirs: List[str],
+        ignored_dirs: List[str],
+        gitignore: Optional[GitignoreCache] = None,
+        prune_gitignored: bool = True,
+    ) -> None:
+        self._watched_dirs = [str(Path(watched_dir)) for watched_dir in watched_dirs]
+        self._ignore_matcher = IgnoreMatcher(ignored_dirs)
+        self._gitignore = gitignore
+        self._prune_gitignore = gitignore if prune_gitignored else None
+        self._libc = _load_libc()
+        self._init_watches()
+
+    def poll(self) -> Optional[ChangedPaths]:
+        if self._fd is None:
+            return None
+        self._read_events()
+        if self._rebuild:
+            self.close()
+            self._init_watches()
+        if self._fd is None or self._rescan:
+            self._rescan = False
+            self._reset_changed()
+            return None
+        changed = self._changed
+        self._reset_changed()
+        return changed
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._watches = {}
+
+    def _init_watches(self) -> None:
+        assert self._libc is not None
+        self._rescan = True
+        self._rebuild = False
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning(
+                f"Could not initialize inotify ({os.strerror(ctypes.get_errno())}), "
+                "falling back to polling"
+            )
+            return
+        self._fd = fd
+        self._reset_changed()
+        for watched_dir in self._watched_dirs:
+            if not Path(watched_dir).is_dir():
+                logger.info(f"{watched_dir} is not a directory, falling back to polling")
+                self.close()
+                return
+            if not self._add_watches(watched_dir, Path(watched_dir)):
+                return
+
+    def _reset_changed(self) -> None:
+        self._changed = {watched_dir: set() for watched_dir in self._watched_dirs}
+
+    def _add_watches(self, watched_dir: str, directory: Path) -> bool:
+        assert self._libc is not None
+        for dir_path in walk_dirs(
+            Path(watched_dir), self._ignore_matcher, directory, self._prune_gitignore
+        ):
+            if self._fd is None:
+                return False
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_path), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    # went away or not readable, nothing to watch
+                    continue
+                logger.warning(
+                    f"Could not watch {dir_path} ({os.strerror(err)}), falling back to polling"
+                )
+                self.close()
+                return False
+            self._watches[wd] = (watched_dir, Path(dir_path))
+        return True
+
+    def _read_events(self) -> None:
+        while self._fd is not None:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name_start = offset + _EVENT.size
+                name = data[name_start : name_start + length].rstrip(b"\0")
+                offset = name_start + length
+                self._handle_event(wd, mask, os.fsdecode(name))
+
+    def _handle_event(self, wd: int, mask: int, name: str) -> None:
+        if mask & IN_Q_OVERFLOW:
+            logger.debug("inotify queue overflowed, rescanning")
+            self._rescan = True
+            return
+        if wd not in self._watches:
+            return
+        watched_dir, directory = self._watches[wd]
+        if mask & IN_IGNORED:
+            del self._watches[wd]
+            if str(directory) == watched_dir:
+                self._rebuild = True
+            return
+        if mask & IN_MOVE_SELF:
+            # watches below a moved directory now report stale paths
+            self._rebuild = True
+            return
+        if self._gitignore is not None and name == ".gitignore":
+            # the set of candidate files may have changed anywhere below this directory
+            self._rescan = True
+            return
+        if not name or name.startswith("."):
+            return
+        path = directory / name
+        if mask & IN_ISDIR:
+            rel_path = relative_path(Path(watched_dir), path)
+            if self._ignore_matcher.is_ignored(rel_path, True) or (
+                self._prune_gitignore is not None
+                and self._prune_gitignore.is_ignored(Path(watched_dir), rel_path, True)
+            ):
+                return
+            if mask & IN_MOVED_FROM:
+                self._rebuild = True
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                if not self._add_watches(watched_dir, path):
+                    return
+        self._changed[watched_dir].add(str(path))
+
+
+def get_change_source(name: str) -> ChangeSource:
+    """
+    Get a change source by name
+
+    :param name: One of "poll", "inotify" or "auto". Auto uses inotify when supported.
+    """
+    if name == "poll":
+        return PollingChangeSource()
+    if name == "inotify" or (name == "auto" and InotifyChangeSource.is_supported()):
+        return InotifyChangeSource()
+    if name == "auto":
+        return PollingChangeSource()
+    raise ValueError(f"Unknown change source: {name}")
+
+
+def _load_libc() -> ctypes.CDLL:
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
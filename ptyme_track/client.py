@@ -2,30 +2,66 @@ from __future__ import annotations
 
 import datetime
 import hashlib
-import itertools
 import json
 import logging
+import queue
+import threading
 import time
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
 from pathlib import Path
-from typing import Dict, Iterator, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
 
+from ptyme_track.change_source import ChangeSource, PollingChangeSource
 from ptyme_track.cur_times import CEMENTED_PATH, CUR_TIMES_PATH
+from ptyme_track.file_hashing import HashResult, hash_file, new_hash
+from ptyme_track.hash_cache import PersistentHashCache, StatSignature
+from ptyme_track.merkle import MerkleTree
+from ptyme_track.metrics import MetricsRecorder, ScanMetrics
+from ptyme_track.pending import PendingEvents
 from ptyme_track.ptyme_env import (
+    PTYME_HASH_ALGORITHM,
+    PTYME_HASH_STRATEGY,
+    PTYME_HASH_WORKERS,
+    PTYME_MAX_HASH_FILE_SIZE,
+    PTYME_MTIME_GRANULARITY_SEC,
+    PTYME_PENDING_RETRY_SEC,
+    PTYME_RESPECT_GITIGNORE,
+    PTYME_SCAN_CPU_PERCENT,
+    PTYME_SCAN_MAX_READ_BYTES_PER_SEC,
+    PTYME_SIGN_QUEUE_SIZE,
     PTYME_TRACK_DIR,
     PTYME_WATCH_INTERVAL_MIN,
 )
 from ptyme_track.secret import validate_secret_file_exists
 from ptyme_track.server import sign_time
 from ptyme_track.signed_time import SignedTime
+from ptyme_track.throttle import ScanGovernor
+from ptyme_track.transport import HttpTransport, TransportError
+from ptyme_track.walker import (
+    GitignoreCache,
+    IgnoreMatcher,
+    WalkStats,
+    in_git_work_tree,
+    list_git_files,
+    relative_path,
+    walk_files,
+)
 
-COUNT_MOD = 10  # when to take a small break when hashing files
-IGNORED_COUNT_MOD = 1000  # when to take a small break when ignoring files
+# content: hash the contents of every changed file
+# stat: derive the hash from size, mtime and inode, only reading ambiguous files
+HASH_STRATEGIES = ("content", "stat")
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 logger = logging.getLogger(__name__)
 
 
+class _StatEntry(NamedTuple):
+    signature: StatSignature
+    # modified too close to the scan to trust the signature alone
+    ambiguous: bool
+
+
 class PtymeClient:
     def __init__(
         self,
@@ -33,33 +69,108 @@ class PtymeClient:
         watched_dirs: List[str],
         ignored_dirs: List[str],
         cur_times: Path = CUR_TIMES_PATH,
+        change_source: Optional[ChangeSource] = None,
+        respect_gitignore: bool = PTYME_RESPECT_GITIGNORE,
+        hash_cache: Optional[PersistentHashCache] = None,
+        hash_strategy: str = PTYME_HASH_STRATEGY,
+        hash_algorithm: str = PTYME_HASH_ALGORITHM,
+        max_file_size: Optional[int] = PTYME_MAX_HASH_FILE_SIZE,
+        hash_workers: int = PTYME_HASH_WORKERS,
+        scan_cpu_percent: float = PTYME_SCAN_CPU_PERCENT,
+        scan_max_read_bytes_per_sec: Optional[float] = PTYME_SCAN_MAX_READ_BYTES_PER_SEC,
+        metrics: Optional[MetricsRecorder] = None,
+        transport: Optional[HttpTransport] = None,
+        pending: Optional[PendingEvents] = None,
     ) -> None:
+        if hash_strategy not in HASH_STRATEGIES:
+            raise ValueError(f"Unknown hash strategy: {hash_strategy}")
+        new_hash(hash_algorithm)  # validate
         self.server_url = server_url
+        self._transport = transport or HttpTransport(server_url)
+        # activity waiting for the server, signed by the signer thread once it's back
+        self._pending = pending
+        # activity handed from the watch loop to the signer thread, None just wakes it
+        self._sign_queue: "queue.Queue[Optional[dict]]" = queue.Queue(PTYME_SIGN_QUEUE_SIZE)
+        self._signer: Optional[threading.Thread] = None
+        self._next_drain = 0.0  # monotonic time of the next retry of the pending events
+        self._record_lock = threading.Lock()
         self._file_hash_cache: Dict[str, bytes] = {}
+        # the file hashes of each watched dir, so changes can be applied without a full scan
+        self._watched_trees: Dict[str, MerkleTree] = {}
+        self._change_source = change_source or PollingChangeSource()
+        self._hash_cache = hash_cache
+        if hash_cache is not None:
+            hash_cache.use_scheme({"algorithm": hash_algorithm, "max_file_size": max_file_size})
+        # hashing may happen on worker threads
+        self._hash_cache_lock = threading.Lock()
+        self._hash_workers = hash_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._governor = ScanGovernor(scan_cpu_percent, scan_max_read_bytes_per_sec)
+        self._hash_strategy = hash_strategy
+        self._hash_algorithm = hash_algorithm
+        self._max_file_size = max_file_size
+        self._stat_entries: Dict[str, _StatEntry] = {}
+        self._metrics = metrics
+        self._scan_metrics = ScanMetrics()
+        self._walk_stats = WalkStats()
+        # when the current cycle was planned to start, to measure how far sleeps drift
+        self._next_time: Optional[float] = None
+        self._mtime_granularity_ns = int(PTYME_MTIME_GRANULARITY_SEC * 1_000_000_000)
         self._last_update: Union[float, None] = None
         self._watched_dirs = watched_dirs
         self._cur_times = cur_times
         self._ignored_dirs = ignored_dirs
+        self._ignore_matcher = IgnoreMatcher(ignored_dirs)
+        self._gitignore = GitignoreCache() if respect_gitignore else None
+        # relative paths of the files git listed for each watched dir in a work tree. Git
+        # decides which files are candidates there, for incremental scans too, so they
+        # agree with full scans about files force-added under ignored directories or
+        # excluded by .git/info/exclude.
+        self._git_files: Dict[str, Set[str]] = {}
+        # changed paths git didn't list, so changes to them don't ask git again each scan
+        self._git_excluded: Dict[str, Set[str]] = {}
 
     def run_forever(self, cemented_file=Path(CEMENTED_PATH)) -> None:
         print("Starting ptyme-track", flush=True)
+        self._change_source.start(
+            self._watched_dirs,
+            self._ignored_dirs,
+            self._gitignore,
+            # git may track files in ignored directories, so they must be watched
+            prune_gitignored=not (
+                self._gitignore is not None
+                and any(in_git_work_tree(Path(watched_dir)) for watched_dir in self._watched_dirs)
+            ),
+        )
+        if self._metrics is not None:
+            self._metrics.start()
+        self._start_signer()
         prev_files_hash = None
         stopped = False
         freshly_cemented = False
-        while True:
-            if cemented_file.exists():
-                prev_files_hash = cemented_file.read_text().strip()
-                stopped = True
-                cemented_file.unlink()
-                freshly_cemented = True
-            prev_files_hash, stopped = self._run_loop(prev_files_hash, stopped, freshly_cemented)
-            freshly_cemented = False
+        try:
+            while True:
+                if cemented_file.exists():
+                    prev_files_hash = cemented_file.read_text().strip()
+                    stopped = True
+                    cemented_file.unlink()
+                    freshly_cemented = True
+                prev_files_hash, stopped = self._run_loop(
+                    prev_files_hash, stopped, freshly_cemented
+                )
+                freshly_cemented = False
+        finally:
+            # don't lose activity the signer hasn't gotten to
+            if self._pending is not None:
+                self._spill_sign_queue()
 
     def _run_loop(
         self, prev_files_hash: Optional[str], stopped: bool, freshly_cemented: bool = False
     ) -> Tuple[Union[str, None], bool]:
         start = time.time()
+        sleep_drift = None if self._next_time is None else start - self._next_time
         files_hash = self._get_files_hash_for_watched_dirs()
+        self._scan_metrics.sleep_drift_sec = sleep_drift
         # _last_update should be set BEFORE the hash is calculated to avoid a race condition
         self._last_update = start
         if not freshly_cemented:
@@ -67,18 +178,38 @@ class PtymeClient:
         prev_files_hash = files_hash
         end = time.time()
         logger.debug(f"Hash took {(end - start):.1f} seconds")
+        if self._metrics is not None:
+            self._metrics.record(self._scan_metrics)
         next_time = start + PTYME_WATCH_INTERVAL_MIN * 60
+        self._next_time = next_time
         cur_time = time.time()
         if cur_time < next_time:
             self._perform_sleep(next_time - cur_time)
         return prev_files_hash, stopped
 
     def _get_files_hash_for_watched_dirs(self) -> str:
+        self._governor.start_scan()
+        self._scan_metrics = metrics = ScanMetrics()
+        self._walk_stats = WalkStats()
+        scan_wall = time.perf_counter()
+        scan_cpu = time.process_time()
+        changed = self._change_source.poll()
         rolling_hash = hashlib.md5()
         for watched_dir in self._get_watched_dirs():
-            result = self._get_files_hash(watched_dir)
+            if changed is not None and str(watched_dir) in self._watched_trees:
+                result = self._get_changed_files_hash(
+                    watched_dir, changed.get(str(watched_dir), set())
+                )
+            else:
+                result = self._get_files_hash(watched_dir)
             if result:
                 rolling_hash.update(result.encode("utf-8"))
+        if self._hash_cache is not None:
+            self._hash_cache.flush()
+        self._governor.log_usage()
+        metrics.scan_wall_sec = time.perf_counter() - scan_wall
+        metrics.scan_cpu_sec = time.process_time() - scan_cpu
+        metrics.ignored_entries = self._walk_stats.ignored
         return rolling_hash.hexdigest()
 
     def _record_time_or_stop(
@@ -101,37 +232,255 @@ class PtymeClient:
     def _get_files_hash(self, watched_dir: Path) -> Union[None, str]:
         # get the hash of all the files in the watched directory
         # use the built-in hashlib module
-        count = 0
-        ignored_count = 0
-        running_hash = hashlib.md5()
         last_update = self._last_update
         start = time.time()
-        local_glob = "[!.]*"
-        glob = "[!.]*/**/[!.]*"
-        for file in itertools.chain(watched_dir.glob(local_glob), watched_dir.glob(glob)):
-            if file.is_file() and not str(file.name).startswith("."):
-                for ignored_dir in self._ignored_dirs:
-                    if ignored_dir in str(file):
-                        ignored_count += 1
-                        if ignored_count % IGNORED_COUNT_MOD == 0:
-                            time.sleep(0.01)
-                        break
-                else:
-                    if (
-                        not last_update
-                        or str(file) not in self._file_hash_cache
-                        or file.stat().st_mtime > last_update
-                    ):
-                        count += 1
-                        if count % COUNT_MOD == 0:
-                            time.sleep(0.01)
-                        with file.open("rb") as f:
-                            file_hash = hashlib.md5()
-                            file_hash.update(f.read())
-                        self._file_hash_cache[str(file)] = file_hash.hexdigest().encode("utf-8")
-                    running_hash.update(self._file_hash_cache[str(file)])
+        scan_start_ns = time.time_ns()
+        tree = self._watched_trees.setdefault(str(watched_dir), MerkleTree())
+        files: Dict[str, str] = {}  # relative path -> path
+        stale: List[Path] = []
+        for file in self._iter_candidate_files(watched_dir):
+            self._governor.tick()
+            if self._is_stale(file, last_update):
+                stale.append(file)
+            files[relative_path(watched_dir, file)] = str(file)
+        self._scan_metrics.files_scanned += len(files)
+        count = self._refresh_files(stale, scan_start_ns)
+        for rel_path in [rel_path for rel_path in tree.iter_files() if rel_path not in files]:
+            self._forget_files(watched_dir, tree, rel_path)
+        for rel_path, file_str in files.items():
+            tree.set(rel_path, self._file_hash_cache[file_str])
         logger.debug(f"Hashed {count} files in {(time.time() - start):.1f} seconds")
-        return running_hash.hexdigest()
+        return tree.hexdigest()
+
+    def _get_changed_files_hash(self, watched_dir: Path, changed: Set[str]) -> Union[None, str]:
+        # apply the changes reported by the change source instead of scanning everything
+        start = time.time()
+        scan_start_ns = time.time_ns()
+        tree = self._watched_trees[str(watched_dir)]
+        if str(watched_dir) in self._git_files:
+            stale = self._changed_git_files(watched_dir, changed, tree)
+        else:
+            stale = self._changed_walked_files(watched_dir, changed, tree)
+        self._scan_metrics.files_scanned += len(stale)
+        count = self._refresh_files(stale, scan_start_ns)
+        for file in stale:
+            tree.set(relative_path(watched_dir, file), self._file_hash_cache[str(file)])
+        logger.debug(f"Hashed {count} changed files in {(time.time() - start):.1f} seconds")
+        return tree.hexdigest()
+
+    def _changed_walked_files(
+        self, watched_dir: Path, changed: Set[str], tree: MerkleTree
+    ) -> List[Path]:
+        stale: List[Path] = []
+        for changed_path in changed:
+            path = Path(changed_path)
+            if path.is_file():
+                if not self._is_ignored(watched_dir, path):
+                    stale.append(path)
+                else:
+                    self._walk_stats.ignored += 1
+            elif path.is_dir():
+                stale.extend(
+                    walk_files(
+                        watched_dir,
+                        self._ignore_matcher,
+                        path,
+                        self._gitignore,
+                        self._walk_stats,
+                    )
+                )
+            else:
+                self._forget_files(watched_dir, tree, relative_path(watched_dir, path))
+        return stale
+
+    def _changed_git_files(
+        self, watched_dir: Path, changed: Set[str], tree: MerkleTree
+    ) -> List[Path]:
+        key = str(watched_dir)
+        paths = {
+            relative_path(watched_dir, Path(changed_path)): Path(changed_path)
+            for changed_path in changed
+        }
+        if any(
+            rel_path not in self._git_files[key]
+            and rel_path not in self._git_excluded[key]
+            and path.exists()
+            for rel_path, path in paths.items()
+        ):
+            # a new path, git may list it now
+            if self._list_git_files(watched_dir) is None:
+                return self._changed_walked_files(watched_dir, changed, tree)
+        git_files = self._git_files[key]
+        excluded = self._git_excluded[key]
+        stale: List[Path] = []
+        for rel_path, path in paths.items():
+            if path.is_file():
+                if rel_path not in git_files:
+                    excluded.add(rel_path)
+                    self._walk_stats.ignored += 1
+                    # it may have been listed before, like a file that became ignored
+                    self._forget_files(watched_dir, tree, rel_path)
+                elif self._is_git_candidate(rel_path):
+                    stale.append(path)
+            elif path.is_dir():
+                prefix = rel_path + "/"
+                inner_rel_paths = [
+                    inner_rel_path
+                    for inner_rel_path in git_files
+                    if inner_rel_path.startswith(prefix)
+                ]
+                if not inner_rel_paths:
+                    excluded.add(rel_path)
+                for inner_rel_path in inner_rel_paths:
+                    file = watched_dir / inner_rel_path
+                    if self._is_git_candidate(inner_rel_path) and file.is_file():
+                        stale.append(file)
+            else:
+                self._forget_files(watched_dir, tree, rel_path)
+        return stale
+
+    def _iter_candidate_files(self, watched_dir: Path) -> Iterator[Path]:
+        if self._gitignore is not None:
+            git_files = self._list_git_files(watched_dir)
+            if git_files is not None:
+                return self._filter_git_files(watched_dir, git_files)
+        return walk_files(
+            watched_dir, self._ignore_matcher, gitignore=self._gitignore, stats=self._walk_stats
+        )
+
+    def _list_git_files(self, watched_dir: Path) -> Optional[List[Path]]:
+        git_files = list_git_files(watched_dir)
+        if git_files is None:
+            self._git_files.pop(str(watched_dir), None)
+            self._git_excluded.pop(str(watched_dir), None)
+            return None
+        self._git_files[str(watched_dir)] = {
+            relative_path(watched_dir, file) for file in git_files
+        }
+        self._git_excluded[str(watched_dir)] = set()
+        return git_files
+
+    def _filter_git_files(self, watched_dir: Path, git_files: List[Path]) -> Iterator[Path]:
+        for file in git_files:
+            # tracked files may have been deleted from the work tree
+            if self._is_git_candidate(relative_path(watched_dir, file)) and file.is_file():
+                yield file
+
+    def _is_git_candidate(self, rel_path: str) -> bool:
+        if any(part.startswith(".") for part in rel_path.split("/")):
+            return False
+        if self._ignore_matcher.is_ignored(rel_path):
+            self._walk_stats.ignored += 1
+            return False
+        return True
+
+    def _is_ignored(self, watched_dir: Path, file: Path) -> bool:
+        rel_path = relative_path(watched_dir, file)
+        if self._ignore_matcher.is_ignored(rel_path):
+            return True
+        return self._gitignore is not None and self._gitignore.is_ignored(watched_dir, rel_path)
+
+    def _is_stale(self, file: Path, last_update: Optional[float]) -> bool:
+        if self._hash_strategy == "stat":
+            # comparing stat signatures is the whole point, so always stat
+            return True
+        return (
+            not last_update
+            or str(file) not in self._file_hash_cache
+            or file.stat().st_mtime > last_update
+        )
+
+    def _refresh_files(self, files: List[Path], scan_start_ns: int) -> int:
+        # returns how many files had to be read
+        count = 0
+        total_read = 0
+        if self._hash_workers <= 1 or len(files) <= 1:
+            for file in files:
+                bytes_read = self._refresh_file(file, scan_start_ns)
+                if bytes_read is not None:
+                    count += 1
+                    total_read += bytes_read
+                self._governor.tick(bytes_read or 0)
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self._hash_workers, thread_name_prefix="ptyme-hash"
+                )
+            # submit in small batches so the throttle can hold the workers back too
+            batch_size = self._hash_workers * 4
+            for idx in range(0, len(files), batch_size):
+                batch = files[idx : idx + batch_size]
+                results = self._executor.map(
+                    lambda file: self._refresh_file(file, scan_start_ns), batch
+                )
+                read = [bytes_read for bytes_read in results if bytes_read is not None]
+                count += len(read)
+                total_read += sum(read)
+                self._governor.tick(sum(read))
+        self._scan_metrics.files_rehashed += count
+        self._scan_metrics.bytes_read += total_read
+        return count
+
+    def _refresh_file(self, file: Path, scan_start_ns: int) -> Optional[int]:
+        # returns the number of bytes read, or None if the file didn't have to be read
+        if self._hash_strategy == "stat":
+            return self._stat_file(file, scan_start_ns)
+        return self._hash_file(file)
+
+    def _stat_file(self, file: Path, scan_start_ns: int) -> Optional[int]:
+        """
+        Derive the file's contribution to the hash from its stat signature
+
+        Contents are only read when the mtime is too close to the scan to tell whether a
+        later write could go unnoticed, and again on the following scan to catch such a
+        write. The content hash is kept with the signature so the contribution stays the
+        same from one scan to the next.
+        """
+        file_str = str(file)
+        signature = StatSignature.from_stat(file.stat())
+        entry = self._stat_entries.get(file_str)
+        if entry and entry.signature == signature and not entry.ambiguous:
+            return None
+        ambiguous = signature.mtime_ns >= scan_start_ns - self._mtime_granularity_ns
+        content_hash = ""
+        bytes_read = None
+        if ambiguous or (entry and entry.signature == signature):
+            content_hash, bytes_read = self._hash_contents(file)
+        self._stat_entries[file_str] = _StatEntry(signature, ambiguous)
+        contribution = f"{signature.size}:{signature.mtime_ns}:{signature.inode}:{content_hash}"
+        self._file_hash_cache[file_str] = (
+            hashlib.md5(contribution.encode("utf-8")).hexdigest().encode("utf-8")
+        )
+        return bytes_read
+
+    def _hash_file(self, file: Path) -> Optional[int]:
+        signature = None
+        if self._hash_cache is not None:
+            signature = StatSignature.from_stat(file.stat())
+            with self._hash_cache_lock:
+                cached_hash = self._hash_cache.get(str(file), signature)
+            if cached_hash is not None:
+                self._file_hash_cache[str(file)] = cached_hash
+                return None
+        file_hash, bytes_read = self._hash_contents(file)
+        self._file_hash_cache[str(file)] = file_hash.encode("utf-8")
+        if self._hash_cache is not None and signature is not None:
+            with self._hash_cache_lock:
+                self._hash_cache.put(str(file), signature, self._file_hash_cache[str(file)])
+        return bytes_read
+
+    def _hash_contents(self, file: Path) -> HashResult:
+        return hash_file(file, self._hash_algorithm, self._max_file_size)
+
+    def _forget_files(self, watched_dir: Path, tree: MerkleTree, rel_path: str) -> None:
+        # the path could have been a file or a directory
+        for removed_rel_path in list(tree.iter_files(rel_path)):
+            file = str(watched_dir / removed_rel_path)
+            self._file_hash_cache.pop(file, None)
+            self._stat_entries.pop(file, None)
+            if self._hash_cache is not None:
+                self._hash_cache.remove(file)
+        tree.remove(rel_path)
 
     def prep_ptyme_dir(self) -> None:
         track_dir = Path(PTYME_TRACK_DIR)
@@ -143,37 +492,219 @@ class PtymeClient:
             git_ignore.write_text("!.gitignore\n!.cemented\n.*\n")
 
     def _retrieve_signed_time(self) -> SignedTime:
-        # retrieve the current time from the server using the built-in urllib module
-        response = urllib.request.urlopen(self.server_url)
+        # retrieve the current time from the server
+        response = self._transport.request("GET")
         logger.debug("Got signed time")
-        return json.loads(response.read().decode("utf-8"))
+        return SignedTime(**json.loads(response.decode("utf-8")))
 
     def _record_time(self, files_hash: str, stop: bool = False) -> None:
-        signed_time = self._retrieve_signed_time()
-        self._perform_record_time(signed_time, files_hash, stop)
+        event = {"time": _utc_now_str(), "hash": files_hash, "stop": stop}
+        if self._signer is not None:
+            # sign in the background so a slow server doesn't hold up the watch loop
+            try:
+                self._sign_queue.put_nowait(event)
+            except queue.Full:
+                if self._pending is None:
+                    self._drop_oldest_queued(event)
+                else:
+                    self._spill_sign_queue(event)
+            return
+        if self._pending is None:
+            signed_time = self._retrieve_signed_time()
+            self._perform_record_time(signed_time, files_hash, stop)
+            return
+        # keep the records in order, nothing is signed directly while events are pending
+        if not self._pending:
+            try:
+                signed_time = self._retrieve_signed_time()
+            except (TransportError, OSError) as exc:
+                logger.warning(f"Could not reach the server, will retry in the background: {exc}")
+            else:
+                self._perform_record_time(signed_time, files_hash, stop)
+                return
+        self._pending.append(event)
 
     def _record_stop(self, files_hash: str) -> None:
         self._record_time(files_hash, stop=True)
 
-    def _perform_record_time(self, signed_time: SignedTime, hash: str, stop: bool) -> None:
-        cur_time = datetime.datetime.utcnow()
-        time_as_str = cur_time.strftime("%Y-%m-%d %H:%M:%S")
-        with self._cur_times.open("a") as cur_time_log:
-            json.dump(
-                {
-                    "time": time_as_str,
-                    "signed_time": asdict(signed_time),
-                    "hash": hash,
-                    "stop": stop,
-                },
-                cur_time_log,
-            )
+    def _perform_record_time(
+        self,
+        signed_time: SignedTime,
+        hash: str,
+        stop: bool,
+        event_time: Optional[str] = None,
+        delayed: bool = False,
+    ) -> None:
+        """
+        :param event_time: When the activity was detected, defaults to now
+        :param delayed: Whether it was signed late, so the signed time isn't when the
+            activity happened
+        """
+        record = {
+            "time": event_time or _utc_now_str(),
+            "signed_time": asdict(signed_time),
+            "hash": hash,
+            "stop": stop,
+        }
+        if delayed:
+            record["signing_delayed"] = True
+        with self._record_lock, self._cur_times.open("a") as cur_time_log:
+            json.dump(record, cur_time_log)
             cur_time_log.write("\n")
 
+    def _start_signer(self) -> None:
+        if self._signer is not None:
+            return
+        self._signer = threading.Thread(target=self._sign_forever, name="ptyme-sign", daemon=True)
+        self._signer.start()
+
+    def _sign_forever(self) -> None:
+        while True:
+            try:
+                self._sign_next()
+            except Exception:
+                logger.exception("Failed to sign records")
+                time.sleep(PTYME_PENDING_RETRY_SEC)
+
+    def _sign_next(self) -> None:
+        # Pending events are always older than the queued ones, so they go first. That
+        # holds because a full queue is spilled to the pending events as a whole, and an
+        # event that fails to sign is put back in front of them.
+        timeout = None
+        older_count = 0
+        if self._pending:
+            if time.monotonic() >= self._next_drain:
+                self._drain_pending()
+            if self._pending:
+                # the server is still unreachable, queue up new activity until the retry
+                self._next_drain = max(
+                    self._next_drain, time.monotonic() + PTYME_PENDING_RETRY_SEC
+                )
+                timeout = max(self._next_drain - time.monotonic(), 0)
+                older_count = len(self._pending)
+        try:
+            event = self._sign_queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+        if event is None:
+            return
+        if self._pending:
+            # The queue may have been spilled since the event was taken from it. The
+            # spilled events are newer, so it goes right behind the ones pending before.
+            if older_count:
+                self._pending.insert(older_count, event)
+            else:
+                self._pending.push_front(event)
+            return
+        while True:
+            try:
+                signed_time = self._retrieve_signed_time()
+            except (TransportError, OSError) as exc:
+                logger.warning(f"Could not reach the server, will retry: {exc}")
+                if self._pending is None:
+                    # nowhere to put it, so hold on to it
+                    time.sleep(PTYME_PENDING_RETRY_SEC)
+                    continue
+                self._pending.push_front(event)
+                self._next_drain = time.monotonic() + PTYME_PENDING_RETRY_SEC
+                return
+            self._perform_record_time(
+                signed_time,
+                event["hash"],
+                event["stop"],
+                event["time"],
+                # a record of later activity would have been due by now
+                _utc_now() - _parse_utc(event["time"])
+                >= datetime.timedelta(minutes=PTYME_WATCH_INTERVAL_MIN),
+            )
+            return
+
+    def _spill_sign_queue(self, event: Optional[dict] = None) -> None:
+        # move the queued activity, and then event, to the pending events
+        assert self._pending is not None
+        events: List[dict] = []
+        while True:
+            try:
+                queued = self._sign_queue.get_nowait()
+            except queue.Empty:
+                break
+            if queued is not None:
+                events.append(queued)
+        if event is not None:
+            events.append(event)
+        self._pending.extend(events)
+        # wake the signer so it drains them
+        try:
+            self._sign_queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _drop_oldest_queued(self, event: dict) -> None:
+        # Without pending events there's nowhere to put the overflow, and waiting for
+        # room would stall the watch loop as long as the server is unreachable. Make
+        # room by dropping the oldest activity, stops are kept to close the time blocks.
+        events: List[dict] = []
+        while True:
+            try:
+                queued = self._sign_queue.get_nowait()
+            except queue.Empty:
+                break
+            if queued is not None:
+                events.append(queued)
+        events.append(event)
+        if len(events) > PTYME_SIGN_QUEUE_SIZE:
+            drop_idx = next((idx for idx, queued in enumerate(events) if not queued["stop"]), 0)
+            dropped = events.pop(drop_idx)
+            logger.warning(
+                f"Sign queue is full, dropped the activity from {dropped['time']} "
+                "waiting for the server"
+            )
+        for queued in events:
+            self._sign_queue.put_nowait(queued)
+
+    def _drain_pending(self) -> int:
+        # sign pending events in order until they run out or the server fails again,
+        # returns how many were signed
+        assert self._pending is not None
+        drained = 0
+        while True:
+            events = self._pending.peek(100)
+            if not events:
+                break
+            signed = 0
+            try:
+                for event in events:
+                    signed_time = self._retrieve_signed_time()
+                    self._perform_record_time(
+                        signed_time, event["hash"], event["stop"], event["time"], True
+                    )
+                    signed += 1
+            except (TransportError, OSError) as exc:
+                logger.debug(f"Server still unreachable: {exc}")
+                break
+            finally:
+                self._pending.pop(signed)
+                drained += signed
+        if drained:
+            logger.info(f"Signed {drained} delayed records")
+        return drained
+
+
+def _utc_now() -> datetime.datetime:
+    return datetime.datetime.utcnow().replace(microsecond=0)
+
+
+def _utc_now_str() -> str:
+    return _utc_now().strftime(_TIME_FORMAT)
+
+
+def _parse_utc(time_str: str) -> datetime.datetime:
+    return datetime.datetime.strptime(time_str, _TIME_FORMAT)
+
 
 class StandalonePtymeClient(PtymeClient):
-    def __init__(self, watched_dirs: List[str], ignored_dirs: List[str]) -> None:
-        super().__init__("", watched_dirs, ignored_dirs)
+    def __init__(self, watched_dirs: List[str], ignored_dirs: List[str], **kwargs: Any) -> None:
+        super().__init__("", watched_dirs, ignored_dirs, **kwargs)
 
     def run_forever(self, cemented_file=Path(CEMENTED_PATH)) -> None:
         validate_secret_file_exists()
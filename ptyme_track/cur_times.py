@@ -5,3 +5,7 @@ from ptyme_track.ptyme_env import PTYME_TRACK_DIR
 CUR_TIMES_FILE = Path(".cur_times")
 CUR_TIMES_PATH = Path(PTYME_TRACK_DIR) / CUR_TIMES_FILE
 CEMENTED_PATH = Path(PTYME_TRACK_DIR) / ".cemented"
+FILE_HASH_CACHE_PATH = Path(PTYME_TRACK_DIR) / ".file_hash_cache"
+METRICS_PATH = Path(PTYME_TRACK_DIR) / ".metrics"
+PENDING_PATH = Path(PTYME_TRACK_DIR) / ".pending"
+VERIFY_CACHE_PATH = Path(PTYME_TRACK_DIR) / ".verify_cache"
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+try:
+    import xxhash  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    xxhash = None
+
+CHUNK_SIZE = 1024 * 1024  # read buffer size when hashing files
+
+HASH_ALGORITHMS = ("md5", "blake2b", "xxhash")
+
+
+class HashResult(NamedTuple):
+    hexdigest: str
+    bytes_read: int
+
+
+def new_hash(algorithm: str) -> Any:
+    """
+    Create a hash object
+
+    :param algorithm: One of md5, blake2b or xxhash. xxhash requires the xxhash package.
+    :raises ValueError: If the algorithm is unknown or not available
+    """
+    if algorithm == "md5":
+        return hashlib.md5()
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=16)
+    if algorithm == "xxhash":
+        if xxhash is None:
+            raise ValueError("The xxhash hash algorithm requires the xxhash package")
+        return xxhash.xxh3_128()
+    raise ValueError(f"Unknown hash algorithm: {algorithm}")
+
+
+def hash_file(path: Path, algorithm: str = "md5", max_size: Optional[int] = None) -> HashResult:
+    """
+    Hash a file without loading all of it into memory
+
+    :param path: The file to hash
+    :param algorithm: The hash algorithm, see new_hash
+    :param max_size: Files bigger than this, in bytes, are hashed by their size and mtime
+        instead of their contents
+    :return: The hex digest and the number of bytes read
+    """
+    file_hash = new_hash(algorithm)
+    bytes_read = 0
+    # unbuffered, reads go straight into the chunk buffer
+    with path.open("rb", buffering=0) as f:
+        stat = os.fstat(f.fileno())
+        if max_size is not None and stat.st_size > max_size:
+            file_hash.update(f"oversized:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        else:
+            # read, never map. Files in watched trees get rewritten in place, and a
+            # mapped file truncated while being hashed kills the process with SIGBUS,
+            # while a read just comes up short.
+            buffer = bytearray(CHUNK_SIZE)
+            view = memoryview(buffer)
+            while True:
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                file_hash.update(view[:size])
+                bytes_read += size
+    return HashResult(file_hash.hexdigest(), bytes_read)
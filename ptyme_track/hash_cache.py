@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# rewrite the cache file once it holds this many more lines than live entries
+COMPACT_SLACK = 1000
+
+
+class StatSignature(NamedTuple):
+    size: int
+    mtime_ns: int
+    inode: int
+
+    @classmethod
+    def from_stat(cls, stat: os.stat_result) -> StatSignature:
+        return cls(stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+_Entry = Tuple[StatSignature, str]
+
+
+class PersistentHashCache:
+    """
+    File hashes that survive client restarts.
+
+    Entries are validated against the file's size, mtime and inode, so a file that
+    hasn't changed since it was hashed doesn't need to be read again. The cache is
+    stored as JSON lines that are appended to on flush, with `[path]` marking a removal,
+    and is rewritten when it accumulates too many stale lines.
+
+    The first line holds the scheme the hashes were made with, like the hash algorithm.
+    A cache made with another scheme is discarded, so hashes of the two don't mix.
+    """
+
+    def __init__(self, path: Path, scheme: Optional[Dict[str, Any]] = None) -> None:
+        self._path = path
+        self._scheme = scheme or {}
+        self._entries: Optional[Dict[str, _Entry]] = None
+        self._pending: Dict[str, Optional[_Entry]] = {}
+        self._line_count = 0
+        # the file needs rewriting for its header to match the scheme
+        self._stale_header = False
+
+    def use_scheme(self, scheme: Dict[str, Any]) -> None:
+        """
+        Set what the hashes depend on besides the files, discarding the hashes made
+        with another scheme
+        """
+        if scheme == self._scheme:
+            return
+        self._scheme = scheme
+        self._entries = None
+        self._pending = {}
+        self._line_count = 0
+
+    def get(self, file: str, signature: StatSignature) -> Optional[bytes]:
+        entry = self._load().get(file)
+        if entry and entry[0] == signature:
+            return entry[1].encode("utf-8")
+        return None
+
+    def put(self, file: str, signature: StatSignature, file_hash: bytes) -> None:
+        entries = self._load()
+        entry = (signature, file_hash.decode("utf-8"))
+        if entries.get(file) != entry:
+            entries[file] = entry
+            self._pending[file] = entry
+
+    def remove(self, file: str) -> None:
+        if self._load().pop(file, None) is not None:
+            self._pending[file] = None
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        entries = self._load()
+        try:
+            if (
+                self._stale_header
+                or self._line_count + len(self._pending) > len(entries) * 2 + COMPACT_SLACK
+            ):
+                self._compact(entries)
+            else:
+                with self._path.open("a") as cache_file:
+                    for file, entry in self._pending.items():
+                        cache_file.write(_dump_line(file, entry))
+                self._line_count += len(self._pending)
+        except OSError as exc:
+            logger.debug(f"Could not write file hash cache: {exc}")
+            return
+        self._pending = {}
+
+    def _compact(self, entries: Dict[str, _Entry]) -> None:
+        tmp_path = self._path.with_name(self._path.name + ".tmp")
+        with tmp_path.open("w") as cache_file:
+            cache_file.write(json.dumps(self._scheme) + "\n")
+            for file, entry in entries.items():
+                cache_file.write(_dump_line(file, entry))
+        os.replace(tmp_path, self._path)
+        self._line_count = len(entries)
+        self._stale_header = False
+
+    def _load(self) -> Dict[str, _Entry]:
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        self._stale_header = True
+        try:
+            with self._path.open() as cache_file:
+                try:
+                    scheme = json.loads(cache_file.readline() or "null")
+                except json.JSONDecodeError:
+                    scheme = None
+                if scheme != self._scheme:
+                    if scheme is not None:
+                        logger.info("Discarding file hashes made with another hash scheme")
+                    return self._entries
+                self._stale_header = False
+                for line in cache_file:
+                    self._line_count += 1
+                    try:
+                        file, *values = json.loads(line)
+                        if values:
+                            size, mtime_ns, inode, file_hash = values
+                            self._entries[file] = (
+                                StatSignature(size, mtime_ns, inode),
+                                file_hash,
+                            )
+                        else:
+                            self._entries.pop(file, None)
+                    except (json.JSONDecodeError, ValueError, TypeError):
+                        # likely a partial write, the file will be rehashed
+                        continue
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.debug(f"Could not read file hash cache: {exc}")
+        return self._entries
+
+
+def _dump_line(file: str, entry: Optional[_Entry]) -> str:
+    if entry is None:
+        return json.dumps([file]) + "\n"
+    signature, file_hash = entry
+    return json.dumps([file, *signature, file_hash]) + "\n"
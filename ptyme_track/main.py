@@ -2,15 +2,30 @@ import argparse
 import json
 import logging
 import subprocess
+import sys
 from datetime import timedelta
 from pathlib import Path
 from shutil import which
+from typing import Any, Dict
 
 from ptyme_track.cement import cement_cur_times
+from ptyme_track.change_source import get_change_source
 from ptyme_track.client import PtymeClient, StandalonePtymeClient
+from ptyme_track.cur_times import (
+    FILE_HASH_CACHE_PATH,
+    METRICS_PATH,
+    PENDING_PATH,
+    VERIFY_CACHE_PATH,
+)
 from ptyme_track.git_ci_diff import display_git_ci_diff_times
+from ptyme_track.hash_cache import PersistentHashCache
+from ptyme_track.metrics import MetricsRecorder
+from ptyme_track.pending import PendingEvents
 from ptyme_track.ptyme_env import (
+    PTYME_CHANGE_SOURCE,
     PTYME_IGNORED_DIRS,
+    PTYME_METRICS,
+    PTYME_METRICS_PORT,
     PTYME_TRACK_BASE_BRANCH,
     PTYME_TRACK_FEATURE_BRANCH,
     PTYME_WATCHED_DIRS,
@@ -40,6 +55,33 @@ def main() -> None:
         action="store_true",
         help="Do not validate time blocks against the known secret. This currently only affects --time-blocks",
     )
+    parser.add_argument(
+        "--no-verify-cache",
+        action="store_true",
+        help="Recompute the signature of every record instead of trusting ones verified before, for audits",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="With --time-blocks, continue from the previous run and only print the blocks since then",
+    )
+    parser.add_argument(
+        "--rollup",
+        choices=["json", "csv"],
+        help="With --time-blocks, print the total time by day, ISO week and git branch instead of the blocks",
+    )
+    parser.add_argument(
+        "--validate",
+        nargs="+",
+        metavar="FILE",
+        help="Validate time files against the known secret and report the number of valid and invalid records",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to validate files, with --validate and --time-blocks",
+    )
     parser.add_argument(
         "--standalone", action="store_true", help="Run as both a client and a server"
     )
@@ -89,19 +131,57 @@ def main() -> None:
 
         generate_secret()
         return
+    if args.validate:
+        from ptyme_track.parallel_validation import validate_files_parallel
+
+        files = [Path(file) for file in args.validate]
+        results = validate_files_parallel(files, get_secret(), args.workers)
+        for file, (valid, invalid) in zip(files, results):
+            print(json.dumps({"file": str(file), "valid": len(valid), "invalid": len(invalid)}))
+        return
     if args.time_blocks:
-        from ptyme_track.time_blocks import get_time_blocks
+        from ptyme_track.time_blocks import get_time_blocks, get_time_blocks_incremental
+        from ptyme_track.verify_cache import VerificationCache
 
-        time_blocks = get_time_blocks(
-            Path(args.time_blocks),
-            get_secret(),
-            check_against_secret=(not args.no_validate),
-            bufferless_block_min_size=int(args.bufferless_block_min_size),
-            bufferless_block_gap=int(args.bufferless_block_gap),
+        secret = get_secret()
+        verify_cache = (
+            None if args.no_verify_cache else VerificationCache(VERIFY_CACHE_PATH, secret)
         )
-        total_time = timedelta(minutes=0)
+        if args.rollup:
+            from ptyme_track.time_rollup import get_time_rollup
+
+            rollup = get_time_rollup(
+                Path(args.time_blocks),
+                secret,
+                check_against_secret=(not args.no_validate),
+                bufferless_block_min_size=int(args.bufferless_block_min_size),
+                bufferless_block_gap=int(args.bufferless_block_gap),
+                verify_cache=verify_cache,
+                workers=args.workers,
+            )
+            rollup.write(sys.stdout, args.rollup)
+            return
+        if args.incremental:
+            time_blocks, total_time = get_time_blocks_incremental(
+                Path(args.time_blocks),
+                secret,
+                check_against_secret=(not args.no_validate),
+                bufferless_block_min_size=int(args.bufferless_block_min_size),
+                bufferless_block_gap=int(args.bufferless_block_gap),
+                verify_cache=verify_cache,
+            )
+        else:
+            time_blocks = get_time_blocks(
+                Path(args.time_blocks),
+                secret,
+                check_against_secret=(not args.no_validate),
+                bufferless_block_min_size=int(args.bufferless_block_min_size),
+                bufferless_block_gap=int(args.bufferless_block_gap),
+                verify_cache=verify_cache,
+                workers=args.workers,
+            )
+            total_time = sum((block.duration for block in time_blocks), timedelta())
         for block in time_blocks:
-            total_time += block.duration
             print(
                 json.dumps(
                     {
@@ -115,10 +195,19 @@ def main() -> None:
         return
     watched_dirs = PTYME_WATCHED_DIRS.split(":")
     ignored_dirs = PTYME_IGNORED_DIRS.split(":")
+    client_options: Dict[str, Any] = {
+        "change_source": get_change_source(PTYME_CHANGE_SOURCE),
+        "hash_cache": PersistentHashCache(FILE_HASH_CACHE_PATH),
+        "pending": PendingEvents(PENDING_PATH),
+    }
+    if PTYME_METRICS or PTYME_METRICS_PORT is not None:
+        client_options["metrics"] = MetricsRecorder(
+            METRICS_PATH if PTYME_METRICS else None, PTYME_METRICS_PORT
+        )
     if args.client:
-        client = PtymeClient(SERVER_URL, watched_dirs, ignored_dirs)
+        client = PtymeClient(SERVER_URL, watched_dirs, ignored_dirs, **client_options)
     elif args.standalone:
-        client = StandalonePtymeClient(watched_dirs, ignored_dirs)
+        client = StandalonePtymeClient(watched_dirs, ignored_dirs, **client_options)
     else:
         parser.print_help()
         return
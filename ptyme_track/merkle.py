@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, Iterator, List, Optional, Union
+
+
+class _Directory:
+    __slots__ = ("children", "digest")
+
+    def __init__(self) -> None:
+        # file name -> file hash, or directory name -> directory
+        self.children: Dict[str, Union[_Directory, bytes]] = {}
+        # None when a child changed and the digest needs to be recomputed
+        self.digest: Optional[bytes] = None
+
+
+class MerkleTree:
+    """
+    File hashes arranged by directory, where each directory hashes its children in
+    sorted order.
+
+    Changing a file only invalidates the directories between it and the root, so
+    recomputing the root hash costs O(changed files * depth), and the root hash doesn't
+    depend on the order files were added in.
+    """
+
+    def __init__(self) -> None:
+        self._root = _Directory()
+
+    def set(self, rel_path: str, file_hash: bytes) -> None:
+        """
+        Add or update a file
+
+        :param rel_path: Path of the file relative to the root, using "/" as the separator
+        :param file_hash: The file's hash
+        """
+        *dir_names, name = rel_path.split("/")
+        path = [self._root]
+        for dir_name in dir_names:
+            child = path[-1].children.get(dir_name)
+            if not isinstance(child, _Directory):
+                child = _Directory()
+                path[-1].children[dir_name] = child
+            path.append(child)
+        if path[-1].children.get(name) == file_hash:
+            return
+        path[-1].children[name] = file_hash
+        _invalidate(path)
+
+    def remove(self, rel_path: str) -> bool:
+        """
+        Remove a file, or a directory and everything below it
+
+        :return: Whether anything was removed
+        """
+        names = rel_path.split("/")
+        path = self._find(names[:-1])
+        if path is None or names[-1] not in path[-1].children:
+            return False
+        del path[-1].children[names[-1]]
+        # drop directories left empty, a scan would never have created them
+        for idx in range(len(path) - 1, 0, -1):
+            if path[idx].children:
+                break
+            del path[idx - 1].children[names[idx - 1]]
+        _invalidate(path)
+        return True
+
+    def iter_files(self, rel_path: str = "") -> Iterator[str]:
+        """
+        Iterate over the files at or below a path, or all files by default
+        """
+        if not rel_path:
+            yield from _iter_files(self._root, "")
+            return
+        names = rel_path.split("/")
+        path = self._find(names[:-1])
+        if path is None:
+            return
+        child = path[-1].children.get(names[-1])
+        if isinstance(child, _Directory):
+            yield from _iter_files(child, rel_path + "/")
+        elif child is not None:
+            yield rel_path
+
+    def hexdigest(self) -> str:
+        return _digest(self._root).decode("utf-8")
+
+    def _find(self, dir_names: List[str]) -> Optional[List[_Directory]]:
+        path = [self._root]
+        for dir_name in dir_names:
+            child = path[-1].children.get(dir_name)
+            if not isinstance(child, _Directory):
+                return None
+            path.append(child)
+        return path
+
+
+def _invalidate(path: List[_Directory]) -> None:
+    for directory in path:
+        directory.digest = None
+
+
+def _iter_files(directory: _Directory, prefix: str) -> Iterator[str]:
+    for name, child in directory.children.items():
+        if isinstance(child, _Directory):
+            yield from _iter_files(child, prefix + name + "/")
+        else:
+            yield prefix + name
+
+
+def _digest(directory: _Directory) -> bytes:
+    if directory.digest is None:
+        dir_hash = hashlib.md5()
+        for name in sorted(directory.children):
+            child = directory.children[name]
+            if isinstance(child, _Directory):
+                dir_hash.update(f"{name}\0d".encode("utf-8") + _digest(child) + b"\n")
+            else:
+                dir_hash.update(f"{name}\0f".encode("utf-8") + child + b"\n")
+        directory.digest = dir_hash.hexdigest().encode("utf-8")
+    return directory.digest
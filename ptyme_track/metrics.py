@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import os
+import threading
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+MAX_METRICS_FILE_SIZE = 10 * 1024 * 1024  # rotate the metrics file past this size
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScanMetrics:
+    files_scanned: int = 0
+    files_rehashed: int = 0
+    bytes_read: int = 0
+    ignored_entries: int = 0
+    scan_wall_sec: float = 0.0
+    scan_cpu_sec: float = 0.0
+    # how much later than planned the cycle started, negative if it started early
+    sleep_drift_sec: Optional[float] = None
+
+    @property
+    def cache_hit_ratio(self) -> Optional[float]:
+        if not self.files_scanned:
+            return None
+        return 1 - self.files_rehashed / self.files_scanned
+
+    def as_dict(self) -> dict:
+        return {
+            "time": datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            **asdict(self),
+            "cache_hit_ratio": self.cache_hit_ratio,
+        }
+
+
+class MetricsRecorder:
+    """
+    Records the metrics of each client cycle as JSON lines, and optionally serves the
+    latest ones as JSON over HTTP on localhost
+    """
+
+    def __init__(self, path: Optional[Path], port: Optional[int] = None) -> None:
+        self._path = path
+        self._port = port
+        self._latest: Optional[dict] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def latest(self) -> Optional[dict]:
+        return self._latest
+
+    def start(self) -> None:
+        if self._port is None or self._server is not None:
+            return
+        recorder = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body = json.dumps(recorder.latest).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                logger.debug(format % args)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self._port), MetricsRequestHandler)
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="ptyme-metrics", daemon=True
+        ).start()
+        logger.info(f"Serving client metrics on http://127.0.0.1:{self._port}")
+
+    def record(self, metrics: ScanMetrics) -> None:
+        self._latest = metrics.as_dict()
+        if self._path is None:
+            return
+        try:
+            if self._path.exists() and self._path.stat().st_size > MAX_METRICS_FILE_SIZE:
+                os.replace(self._path, self._path.with_name(self._path.name + ".1"))
+            with self._path.open("a") as metrics_file:
+                metrics_file.write(json.dumps(self._latest) + "\n")
+        except OSError as exc:
+            logger.debug(f"Could not write metrics: {exc}")
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
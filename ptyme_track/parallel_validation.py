@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from ptyme_track.signed_time import SignedTime
+from ptyme_track.validation import (
+    _SecretAndValidator,
+    iter_entries,
+    split_entries,
+    validate_signed_time_given_secret,
+)
+from ptyme_track.verify_cache import VerificationCache
+
+CHUNK_BYTES = 4 * 1024 * 1024  # files are validated in chunks of about this size
+
+_Entries = Tuple[List[dict], List[Union[dict, str]]]
+_Chunk = Tuple[str, str, int, int, Optional[datetime.datetime], Optional[datetime.datetime]]
+
+# signed times verified before, time -> signature, set in each worker by _init_worker
+_verified: Dict[str, str] = {}
+
+
+def validate_files_parallel(
+    files: Sequence[Path],
+    secret: str,
+    workers: Optional[int] = None,
+    start_time_utc: Optional[datetime.datetime] = None,
+    end_time_utc: Optional[datetime.datetime] = None,
+    chunk_bytes: int = CHUNK_BYTES,
+    verify_cache: Optional[VerificationCache] = None,
+) -> List[_Entries]:
+    """
+    Validate the entries of several files on a process pool
+
+    Each file is split into chunks on line boundaries, and the chunks of all the files
+    are validated in parallel. Results are merged back in file order.
+
+    :param files: The files to validate
+    :param secret: The secret to validate against
+    :param workers: Number of processes, defaults to the number of CPUs
+    :param start_time_utc: Skip entries signed at or before this time
+    :param end_time_utc: Skip entries signed at or after this time
+    :param chunk_bytes: The approximate size of each chunk
+    :param verify_cache: Skip recomputing the signatures it has, and add the ones
+        verified to it
+    :return: The (valid, invalid) entries of each file, like validate_entries
+    """
+    chunks: List[_Chunk] = []
+    chunk_counts: List[int] = []
+    for file in files:
+        ranges = split_on_lines(file, chunk_bytes)
+        chunk_counts.append(len(ranges))
+        for start, end in ranges:
+            chunks.append((str(file), secret, start, end, start_time_utc, end_time_utc))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    verified = verify_cache.snapshot() if verify_cache else {}
+    if workers <= 1 or len(chunks) <= 1:
+        _init_worker(verified)
+        try:
+            chunk_results = [_validate_chunk(chunk) for chunk in chunks]
+        finally:
+            _init_worker({})
+    else:
+        # the verified signed times are sent to each worker once, not with every chunk
+        with ProcessPoolExecutor(
+            min(workers, len(chunks)), initializer=_init_worker, initargs=(verified,)
+        ) as executor:
+            chunk_results = list(executor.map(_validate_chunk, chunks))
+    results: List[_Entries] = []
+    idx = 0
+    for count in chunk_counts:
+        valid: List[dict] = []
+        invalid: List[Union[dict, str]] = []
+        for chunk_valid, chunk_invalid, chunk_verified in chunk_results[idx : idx + count]:
+            valid.extend(chunk_valid)
+            invalid.extend(chunk_invalid)
+            if verify_cache:
+                for time_as_str, sig in chunk_verified.items():
+                    verify_cache.add(time_as_str, sig)
+        results.append((valid, invalid))
+        idx += count
+    return results
+
+
+def split_on_lines(file: Path, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """
+    Split a file into byte ranges of about chunk_bytes that start and end on line
+    boundaries
+    """
+    size = file.stat().st_size
+    ranges: List[Tuple[int, int]] = []
+    start = 0
+    with file.open("rb") as times_file:
+        while start < size:
+            end = start + chunk_bytes
+            if end < size:
+                times_file.seek(end - 1)
+                # finish the line the boundary fell in
+                end += len(times_file.readline()) - 1
+            end = min(end, size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _init_worker(verified: Dict[str, str]) -> None:
+    global _verified
+    _verified = verified
+
+
+def _validate_chunk(
+    chunk: _Chunk,
+) -> Tuple[List[dict], List[Union[dict, str]], Dict[str, str]]:
+    # also returns the signed times newly verified, for the parent's verify cache
+    file, secret, start, end, start_time_utc, end_time_utc = chunk
+    newly_verified: Dict[str, str] = {}
+
+    def validate(secret: str, signed_time: SignedTime) -> dict:
+        if _verified.get(signed_time.time) == signed_time.sig:
+            return {"server_id_match": True, "time": signed_time.time, "sig_matches": True}
+        result = validate_signed_time_given_secret(secret, signed_time)
+        if result["sig_matches"]:
+            newly_verified[signed_time.time] = signed_time.sig
+        return result
+
+    valid, invalid = split_entries(
+        iter_entries(
+            Path(file),
+            _SecretAndValidator(secret, validate),
+            start_time_utc,
+            end_time_utc,
+            (start, end),
+        )
+    )
+    return valid, invalid, newly_verified
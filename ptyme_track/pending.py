@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+
+class PendingEvents:
+    """
+    Write-ahead queue of activity that still needs a signed time.
+
+    Events are appended as JSON lines and synced to disk before append returns, so
+    activity recorded while the server is unreachable survives a client restart. A line
+    torn by a crash mid-append is skipped when reading.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        try:
+            return self._path.stat().st_size > 0
+        except FileNotFoundError:
+            return False
+
+    def append(self, event: dict) -> None:
+        self.extend([event])
+
+    def extend(self, events: List[dict]) -> None:
+        if not events:
+            return
+        line = "".join(json.dumps(event) + "\n" for event in events).encode("utf-8")
+        with self._lock, self._path.open("ab+") as pending_file:
+            if pending_file.seek(0, os.SEEK_END) > 0:
+                pending_file.seek(-1, os.SEEK_END)
+                if pending_file.read(1) != b"\n":
+                    # don't run on from a line torn by a crash
+                    line = b"\n" + line
+            pending_file.write(line)
+            pending_file.flush()
+            os.fsync(pending_file.fileno())
+
+    def __len__(self) -> int:
+        # lines torn by a crash count too, so this lines up with insert
+        with self._lock:
+            return len(self._read_lines())
+
+    def push_front(self, event: dict) -> None:
+        """
+        Put back an event that is older than the ones already queued
+        """
+        self.insert(0, event)
+
+    def insert(self, index: int, event: dict) -> None:
+        """
+        Put an event behind the oldest index events, for one older than the rest
+        """
+        with self._lock:
+            lines = self._read_lines()
+            lines.insert(index, json.dumps(event) + "\n")
+            self._write_lines(lines)
+
+    def peek(self, limit: int) -> List[dict]:
+        """
+        Get up to limit of the oldest events, without removing them
+        """
+        events: List[dict] = []
+        with self._lock:
+            for line in self._read_lines():
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt pending event: {line!r}")
+                    continue
+                if len(events) >= limit:
+                    break
+        return events
+
+    def pop(self, count: int) -> None:
+        """
+        Remove the oldest count events, as returned by peek
+        """
+        if count <= 0:
+            return
+        with self._lock:
+            lines = self._read_lines()
+            remaining: List[str] = []
+            for line in lines:
+                if count > 0:
+                    try:
+                        json.loads(line)
+                    except json.JSONDecodeError:
+                        # skipped by peek too
+                        continue
+                    count -= 1
+                    continue
+                remaining.append(line)
+            self._write_lines(remaining)
+
+    def _write_lines(self, lines: List[str]) -> None:
+        tmp_path = self._path.with_name(self._path.name + ".tmp")
+        with tmp_path.open("w") as pending_file:
+            pending_file.writelines(
+                line if line.endswith("\n") else line + "\n" for line in lines
+            )
+            pending_file.flush()
+            os.fsync(pending_file.fileno())
+        os.replace(tmp_path, self._path)
+
+    def _read_lines(self) -> List[str]:
+        try:
+            with self._path.open() as pending_file:
+                return [line for line in pending_file if line.strip()]
+        except FileNotFoundError:
+            return []
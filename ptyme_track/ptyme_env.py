@@ -1,12 +1,58 @@
 import os
 import uuid
 
+
+def _env_flag(name: str, default: str = "false") -> bool:
+    return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
 ### client concerns ###
 PTYME_TRACK_DIR = os.environ.get("PTYME_TRACK_DIR", ".ptyme_track")
 # colon seperated dirs
 PTYME_WATCHED_DIRS = os.environ.get("PTYME_WATCHED_DIRS", ".")
 PTYME_IGNORED_DIRS = os.environ.get("PTYME_IGNORED_DIRS", "node_modules:__pycache__")
 PTYME_WATCH_INTERVAL_MIN = int(os.environ.get("PTYME_WATCH_INTERVAL_MIN", "2"))
+# how file changes are detected: poll, inotify or auto (inotify when available)
+PTYME_CHANGE_SOURCE = os.environ.get("PTYME_CHANGE_SOURCE", "auto")
+# only hash files git would track, using `git ls-files` or the .gitignore files
+PTYME_RESPECT_GITIGNORE = _env_flag("PTYME_RESPECT_GITIGNORE")
+# content or stat, see PtymeClient for details
+PTYME_HASH_STRATEGY = os.environ.get("PTYME_HASH_STRATEGY", "content")
+# files modified this close to a scan are read even with the stat strategy
+PTYME_MTIME_GRANULARITY_SEC = float(os.environ.get("PTYME_MTIME_GRANULARITY_SEC", "2"))
+# md5, blake2b or xxhash (requires the xxhash package)
+PTYME_HASH_ALGORITHM = os.environ.get("PTYME_HASH_ALGORITHM", "md5")
+# files over this many bytes are hashed by size and mtime instead of contents
+PTYME_MAX_HASH_FILE_SIZE = (
+    int(os.environ["PTYME_MAX_HASH_FILE_SIZE"])
+    if os.environ.get("PTYME_MAX_HASH_FILE_SIZE")
+    else None
+)
+# number of threads hashing files, 1 hashes on the watcher thread
+PTYME_HASH_WORKERS = int(os.environ.get("PTYME_HASH_WORKERS", "1"))
+# share of a CPU core the background scan aims to stay under
+PTYME_SCAN_CPU_PERCENT = float(os.environ.get("PTYME_SCAN_CPU_PERCENT", "25"))
+# optional cap on how fast the background scan reads files
+PTYME_SCAN_MAX_READ_BYTES_PER_SEC = (
+    float(os.environ["PTYME_SCAN_MAX_READ_MB_PER_SEC"]) * 1024 * 1024
+    if os.environ.get("PTYME_SCAN_MAX_READ_MB_PER_SEC")
+    else None
+)
+# record the metrics of each scan to PTYME_TRACK_DIR/.metrics
+PTYME_METRICS = _env_flag("PTYME_METRICS")
+# also serve the latest metrics as JSON on this localhost port
+PTYME_METRICS_PORT = (
+    int(os.environ["PTYME_METRICS_PORT"]) if os.environ.get("PTYME_METRICS_PORT") else None
+)
+# seconds to wait on the server before giving up on a request
+PTYME_SERVER_TIMEOUT_SEC = float(os.environ.get("PTYME_SERVER_TIMEOUT_SEC", "10"))
+# failed requests to the server are retried this many times, with exponential backoff
+PTYME_SERVER_RETRIES = int(os.environ.get("PTYME_SERVER_RETRIES", "3"))
+PTYME_SERVER_RETRY_BACKOFF_SEC = float(os.environ.get("PTYME_SERVER_RETRY_BACKOFF_SEC", "0.5"))
+# activity waiting to be signed in memory, more is written to PTYME_TRACK_DIR/.pending
+PTYME_SIGN_QUEUE_SIZE = int(os.environ.get("PTYME_SIGN_QUEUE_SIZE", "16"))
+# how often activity recorded while the server was unreachable is retried
+PTYME_PENDING_RETRY_SEC = float(os.environ.get("PTYME_PENDING_RETRY_SEC", "30"))
 ######
 
 ### server concerns ###
@@ -14,6 +60,21 @@ SERVER_ID = os.environ.get("PTYME_SERVER_ID", str(uuid.uuid4()))
 SECRET_PATH = os.environ.get("PTYME_SECRET_PATH", ".ptyme.secret")
 # SECRET is used if SECRET_PATH does not exist
 SECRET = os.environ.get("PTYME_SERVER_SECRET", str(uuid.uuid4()))
+# how often the server checks the secret file for a rotated secret
+SECRET_CHECK_INTERVAL_SEC = float(os.environ.get("PTYME_SECRET_CHECK_INTERVAL_SEC", "1"))
+# most requests handled at once, further connections wait to be accepted
+PTYME_SERVER_MAX_WORKERS = int(os.environ.get("PTYME_SERVER_MAX_WORKERS", "32"))
+# largest body accepted by the batch validation endpoint
+PTYME_SERVER_MAX_BATCH_BYTES = int(
+    os.environ.get("PTYME_SERVER_MAX_BATCH_BYTES", str(64 * 1024 * 1024))
+)
+# idle keep-alive connections are closed after this many seconds
+PTYME_SERVER_KEEP_ALIVE_SEC = float(os.environ.get("PTYME_SERVER_KEEP_ALIVE_SEC", "15"))
+#######
+
+### time summaries ###
+# most signed times kept in the cache of verified records
+PTYME_VERIFY_CACHE_SIZE = int(os.environ.get("PTYME_VERIFY_CACHE_SIZE", "1000000"))
 #######
 
 ### used by both client and server ###
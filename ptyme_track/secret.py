@@ -1,8 +1,12 @@
+import hashlib
+import os
+import threading
+import time
 import uuid
 from pathlib import Path
-from typing import Union
+from typing import Any, NamedTuple, Optional, Tuple, Union
 
-from ptyme_track.ptyme_env import SECRET, SECRET_PATH
+from ptyme_track.ptyme_env import SECRET, SECRET_CHECK_INTERVAL_SEC, SECRET_PATH
 
 secret_path = Path(SECRET_PATH)
 
@@ -18,6 +22,83 @@ def get_secret() -> str:
     return SECRET
 
 
+class _LoadedSecret(NamedTuple):
+    secret: str
+    # sha256 state that has already hashed the secret
+    prefix_hash: Any
+    # mtime, size and inode of the secret file, or None if it's missing
+    file_signature: Optional[Tuple[int, int, int]]
+
+
+class SecretProvider:
+    """
+    Keeps the secret in memory instead of reading the secret file for every signature.
+
+    The secret file is checked for changes at most once per check interval, so a
+    rotated secret is picked up without restarting the server.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str] = secret_path,
+        check_interval_sec: float = SECRET_CHECK_INTERVAL_SEC,
+        fallback: str = SECRET,
+    ) -> None:
+        self._path = Path(path)
+        self._check_interval_sec = check_interval_sec
+        self._fallback = fallback
+        self._loaded: Optional[_LoadedSecret] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def secret(self) -> str:
+        return self._get().secret
+
+    def signature(self, time_as_str: str) -> str:
+        """
+        Same as signature_from_time, but only the time has to be hashed
+        """
+        sig_hash = self._get().prefix_hash.copy()
+        sig_hash.update(time_as_str.encode("utf-8"))
+        return sig_hash.hexdigest()
+
+    def _get(self) -> _LoadedSecret:
+        loaded = self._loaded
+        if loaded is not None and time.monotonic() < self._next_check:
+            return loaded
+        with self._lock:
+            if self._loaded is None or time.monotonic() >= self._next_check:
+                self._refresh()
+                self._next_check = time.monotonic() + self._check_interval_sec
+            assert self._loaded is not None
+            return self._loaded
+
+    def _refresh(self) -> None:
+        try:
+            stat = os.stat(self._path)
+            file_signature: Optional[Tuple[int, int, int]] = (
+                stat.st_mtime_ns,
+                stat.st_size,
+                stat.st_ino,
+            )
+        except FileNotFoundError:
+            file_signature = None
+        if self._loaded is not None and self._loaded.file_signature == file_signature:
+            return
+        if file_signature is None:
+            secret = self._fallback
+        else:
+            try:
+                secret = self._path.read_text().strip()
+            except FileNotFoundError:
+                # removed since the stat, check again next time
+                secret, file_signature = self._fallback, None
+        self._loaded = _LoadedSecret(
+            secret, hashlib.sha256(secret.encode("utf-8")), file_signature
+        )
+
+
 def generate_secret() -> None:
     with open(SECRET_PATH, "w") as f:
         f.write(str(uuid.uuid4()))
@@ -1,53 +1,215 @@
 import datetime
 import json
+import logging
+import signal
+import socket
+import threading
 from dataclasses import asdict
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Set, Tuple
 from urllib.parse import urlparse
 
-from ptyme_track.ptyme_env import SERVER_ID, SERVER_URL
-from ptyme_track.secret import get_secret, validate_secret_file_exists
-from ptyme_track.signature import signature_from_time
+from ptyme_track.ptyme_env import (
+    PTYME_SERVER_KEEP_ALIVE_SEC,
+    PTYME_SERVER_MAX_BATCH_BYTES,
+    PTYME_SERVER_MAX_WORKERS,
+    SERVER_ID,
+    SERVER_URL,
+)
+from ptyme_track.secret import SecretProvider, validate_secret_file_exists
 from ptyme_track.signed_time import SignedTime
-from ptyme_track.validation import validate_signed_time_given_secret
+from ptyme_track.validation import validate_signed_time_given_signer
+
+BATCH_VALIDATE_PATH = "/validate/batch"
+MAX_BATCH_LINE_BYTES = 64 * 1024  # longer lines in a batch are rejected
+BATCH_RESPONSE_CHUNK_BYTES = 64 * 1024  # batch results are sent in chunks of about this size
+
+logger = logging.getLogger(__name__)
+
+secret_provider = SecretProvider()
 
 
 class MyRequestHandler(BaseHTTPRequestHandler):
+    # keep connections open between requests, every response must send a Content-Length
+    protocol_version = "HTTP/1.1"
+    # idle keep-alive connections and stalled clients time out after this
+    timeout = PTYME_SERVER_KEEP_ALIVE_SEC
+    # headers and body are written separately, don't let Nagle hold back the body
+    disable_nagle_algorithm = True
+
     def do_GET(self) -> None:
-        self.send_response(200)
-        self.send_header("Content-type", "application/json")
-        self.end_headers()
         # get the current time and sign the request
         signed_time = json.dumps(asdict(sign_time())).encode("utf-8")
-        self.wfile.write(signed_time)
+        self._send_json(200, signed_time)
         return
 
     def do_POST(self) -> None:
-        content_length = int(self.headers["Content-Length"])
-        if content_length > 1024:
+        try:
+            content_length = int(self.headers["Content-Length"])
+        except (TypeError, ValueError):
+            self.close_connection = True
+            self._send_json(411)
+            return
+        is_batch = urlparse(self.path).path == BATCH_VALIDATE_PATH
+        if content_length > (PTYME_SERVER_MAX_BATCH_BYTES if is_batch else 1024):
             # too big, go away
+            self.close_connection = True
+            self._send_json(413)
+            return
+        if is_batch:
+            self._validate_batch(content_length)
             return
         post_data = self.rfile.read(content_length)
-        json_data = json.loads(post_data)
         try:
-            incoming_signed_time = SignedTime(**json_data)
-            incoming_signed_time.dt  # validate
-        except ValueError:
-            signed_time = None
-            self.send_response(400)
+            incoming_signed_time = _parse_signed_time(json.loads(post_data))
+        except (ValueError, TypeError):
+            self._send_json(400)
         else:
-            self.send_response(200)
             # get the current time and sign the request
             signed_time = json.dumps(validate_signed_time(incoming_signed_time)).encode("utf-8")
+            self._send_json(200, signed_time)
+        return
+
+    def _validate_batch(self, content_length: int) -> None:
+        # the body is JSON lines of signed times, or of records holding one under
+        # "signed_time" like the cur times files. Each line gets a result line back,
+        # streamed as the body is read.
+        self.send_response(200)
+        self.send_header("Content-type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        remaining = content_length
+        line_no = 0
+        pending: List[bytes] = []
+        pending_size = 0
+        while remaining > 0:
+            line = self.rfile.readline(min(remaining, MAX_BATCH_LINE_BYTES + 1))
+            if not line:
+                # the client went away
+                self.close_connection = True
+                break
+            remaining -= len(line)
+            line_no += 1
+            if len(line) > MAX_BATCH_LINE_BYTES:
+                # skip the rest of the line
+                while remaining > 0 and not line.endswith(b"\n"):
+                    line = self.rfile.readline(min(remaining, MAX_BATCH_LINE_BYTES))
+                    if not line:
+                        break
+                    remaining -= len(line)
+                result: dict = {"line": line_no, "error": "line too long"}
+            elif not line.strip():
+                continue
+            else:
+                result = {"line": line_no, **_validate_batch_line(line)}
+            encoded = json.dumps(result).encode("utf-8") + b"\n"
+            pending.append(encoded)
+            pending_size += len(encoded)
+            if pending_size >= BATCH_RESPONSE_CHUNK_BYTES:
+                self._write_chunk(b"".join(pending))
+                pending.clear()
+                pending_size = 0
+        if pending:
+            self._write_chunk(b"".join(pending))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
 
+    def _send_json(self, code: int, body: bytes = b"") -> None:
+        self.send_response(code)
         self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
         self.end_headers()
-        if signed_time:
-            self.wfile.write(signed_time)
-        return
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class BoundedThreadingHTTPServer(ThreadingHTTPServer):
+    """
+    Handles each connection on its own thread, with at most max_workers connections
+    being handled at once. When all workers are busy, new connections wait in the
+    listen backlog until one finishes.
+
+    Threads are joined when the server is closed, so in-flight requests finish first.
+    Idle keep-alive connections are closed for reading then, so they don't hold up the
+    shutdown.
+    """
+
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(
+        self,
+        server_address: Tuple[str, int],
+        handler_class: Any,
+        max_workers: int = PTYME_SERVER_MAX_WORKERS,
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("The server needs at least one worker")
+        self._workers = threading.BoundedSemaphore(max_workers)
+        self._connections: Set[socket.socket] = set()
+        self._connections_lock = threading.Lock()
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        self._workers.acquire()
+        with self._connections_lock:
+            self._connections.add(request)
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._workers.release()
+            raise
+
+    def shutdown_request(self, request: Any) -> None:
+        with self._connections_lock:
+            self._connections.discard(request)
+        super().shutdown_request(request)
+
+    def server_close(self) -> None:
+        with self._connections_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                # handlers waiting for the next request see the end of the stream,
+                # responses being written still go out
+                connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+        super().server_close()
+
+    def process_request_thread(self, request: Any, client_address: Any) -> None:
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._workers.release()
+
+
+def _parse_signed_time(json_data: Any) -> SignedTime:
+    if not isinstance(json_data, dict):
+        raise ValueError("Expected a JSON object")
+    incoming_signed_time = SignedTime(**json_data)
+    incoming_signed_time.dt  # validate
+    return incoming_signed_time
+
+
+def _validate_batch_line(line: bytes) -> dict:
+    try:
+        json_data = json.loads(line)
+        if isinstance(json_data, dict) and "signed_time" in json_data:
+            json_data = json_data["signed_time"]
+        incoming_signed_time = _parse_signed_time(json_data)
+    except (ValueError, TypeError):
+        return {"error": "invalid signed time"}
+    return validate_signed_time(incoming_signed_time)
 
 
 def validate_signed_time(incoming_signed_time: SignedTime) -> dict:
-    return validate_signed_time_given_secret(get_secret(), incoming_signed_time)
+    return validate_signed_time_given_signer(secret_provider.signature, incoming_signed_time)
 
 
 def sign_time() -> SignedTime:
@@ -59,15 +221,28 @@ def sign_time() -> SignedTime:
 
 
 def _signature_from_time(time_as_str: str) -> str:
-    return signature_from_time(get_secret(), time_as_str)
+    return secret_provider.signature(time_as_str)
 
 
-def run_forever(server_class=HTTPServer, handler_class=MyRequestHandler) -> None:
+def run_forever(server_class=BoundedThreadingHTTPServer, handler_class=MyRequestHandler) -> None:
     validate_secret_file_exists()
     server_host = urlparse(SERVER_URL).hostname
     server_port = urlparse(SERVER_URL).port
     httpd = server_class((server_host, server_port), handler_class)
-    httpd.serve_forever()
+
+    def shutdown(signum: int, frame: Any) -> None:
+        logger.info("Shutting down, waiting for in-flight requests")
+        # shutdown() waits for serve_forever to return, so it can't run on the serving thread
+        threading.Thread(target=httpd.shutdown).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # waits for the in-flight requests
+        httpd.server_close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Optional
+
+CHECK_INTERVAL_SEC = 0.1  # how often the usage is compared against the budget
+
+logger = logging.getLogger(__name__)
+
+
+class ScanGovernor:
+    """
+    Keeps the CPU use and read rate of a scan near a budget by sleeping when it runs ahead.
+
+    Usage is compared against the budget in short windows, and each window sleeps for
+    however long it would have needed to take to stay within budget, so the sleeps adapt
+    to how expensive the files being scanned are. CPU time is measured for the whole
+    process, so hashing done by worker threads counts against the same budget.
+    """
+
+    def __init__(
+        self, max_cpu_percent: float, max_read_bytes_per_sec: Optional[float] = None
+    ) -> None:
+        if max_cpu_percent <= 0:
+            raise ValueError("The CPU budget must be positive")
+        if max_read_bytes_per_sec is not None and max_read_bytes_per_sec <= 0:
+            raise ValueError("The read budget must be positive")
+        self._cpu_budget = max_cpu_percent / 100
+        self._read_budget = max_read_bytes_per_sec
+        self.start_scan()
+
+    def start_scan(self) -> None:
+        self._scan_wall = time.perf_counter()
+        self._scan_cpu = time.process_time()
+        self._scan_bytes = 0
+        self._slept = 0.0
+        self._start_window()
+
+    def tick(self, bytes_read: int = 0) -> None:
+        """
+        Call regularly while scanning, sleeps if the budget has been exceeded
+
+        :param bytes_read: Bytes read since the last tick
+        """
+        self._window_bytes += bytes_read
+        self._scan_bytes += bytes_read
+        wall = time.perf_counter() - self._window_wall
+        if wall < CHECK_INTERVAL_SEC:
+            return
+        cpu = time.process_time() - self._window_cpu
+        # how long the window should have taken for the usage to be within budget
+        target_wall = cpu / self._cpu_budget
+        if self._read_budget:
+            target_wall = max(target_wall, self._window_bytes / self._read_budget)
+        if target_wall > wall:
+            time.sleep(target_wall - wall)
+            self._slept += target_wall - wall
+        self._start_window()
+
+    def log_usage(self) -> None:
+        wall = time.perf_counter() - self._scan_wall
+        if wall <= 0:
+            return
+        cpu = time.process_time() - self._scan_cpu
+        usage = (
+            f"Scan used {cpu:.2f}s CPU over {wall:.2f}s "
+            f"({cpu / wall:.0%} of a {self._cpu_budget:.0%} budget), "
+            f"read {self._scan_bytes / 1024 / 1024:.1f} MiB"
+        )
+        if self._read_budget:
+            usage += (
+                f" ({self._scan_bytes / wall / 1024 / 1024:.1f} MiB/s of a "
+                f"{self._read_budget / 1024 / 1024:.1f} MiB/s budget)"
+            )
+        logger.debug(f"{usage}, slept {self._slept:.2f}s")
+
+    def _start_window(self) -> None:
+        self._window_wall = time.perf_counter()
+        self._window_cpu = time.process_time()
+        self._window_bytes = 0
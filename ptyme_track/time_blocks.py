@@ -1,10 +1,35 @@
 import datetime
+import logging
+from array import array
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterable, List, Optional, Tuple
 
+from ptyme_track.parallel_validation import validate_files_parallel
 from ptyme_track.signed_time import SignedTime
-from ptyme_track.validation import load_entries, validate_entries
+from ptyme_track.time_checkpoint import TimeBlockCheckpoint, complete_lines_end
+from ptyme_track.time_index import time_region
+from ptyme_track.validation import (
+    _SecretAndValidator,
+    cached_validator,
+    iter_valid_records,
+    validate_signed_time_given_secret,
+)
+from ptyme_track.verify_cache import VerificationCache
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# epoch: integer seconds, only creating datetimes for the resulting blocks
+# datetime: the original implementation, working on datetimes throughout
+TIME_BLOCK_ENGINES = ("epoch", "datetime")
+
+_EPOCH = datetime.datetime(1970, 1, 1)
 
 
 @dataclass
@@ -26,6 +51,8 @@ def get_time_blocks(
     check_against_secret: bool = True,
     bufferless_block_min_size: int = 5,
     bufferless_block_gap: int = 90,
+    verify_cache: Optional[VerificationCache] = None,
+    workers: int = 1,
 ) -> List[TimeBlock]:
     """
     Get the time blocks from a file
@@ -48,57 +75,181 @@ def get_time_blocks(
         the next block is over 90 minutes, then the block will NOT be given a buffer.
         If there are two blocks near each other and and the gap between them is less than
         90 minutes, then the two blocks will have a buffer around them.
+    :param verify_cache: Skip recomputing the signatures of records verified before
+    :param workers: Validate the whole file on this many processes when reading all of it
     :return: _description_
     """
-    if check_against_secret:
-        valid, invalid = validate_entries(file, secret)
-    else:
-        valid, invalid = load_entries(file)
-    considered = []
-    for record in valid:
-        signed_time = SignedTime(**record["signed_time"])
-        if start_time_utc and signed_time.dt <= start_time_utc:
-            continue
-        if end_time_utc and signed_time.dt >= end_time_utc:
-            continue
-        considered.append(record)
-    return build_time_blocks_from_records(
-        considered,
+    records = read_valid_records(
+        file,
+        secret,
+        start_time_utc,
+        end_time_utc,
+        check_against_secret,
+        verify_cache,
+        workers,
+    )
+    time_blocks = build_time_blocks_from_records(
+        records,
         datetime.timedelta(minutes=buffer_minutes),
         bufferless_block_min_size,
         bufferless_block_gap,
     )
+    if verify_cache:
+        verify_cache.save()
+    return time_blocks
+
+
+def read_valid_records(
+    file: Path,
+    secret: str,
+    start_time_utc: Optional[datetime.datetime] = None,
+    end_time_utc: Optional[datetime.datetime] = None,
+    check_against_secret: bool = True,
+    verify_cache: Optional[VerificationCache] = None,
+    workers: int = 1,
+) -> Iterable[dict]:
+    """
+    The records time blocks are built from, see get_time_blocks for the parameters.
+    The records may be read lazily, save the verify cache after going through them.
+    """
+    secret_and_validator = _secret_and_validator(secret, check_against_secret, verify_cache)
+    byte_range = None
+    if start_time_utc or end_time_utc:
+        # only read the part of the file holding those days
+        byte_range = time_region(file, start_time_utc, end_time_utc)
+    if check_against_secret and workers > 1 and byte_range is None:
+        return validate_files_parallel([file], secret, workers, verify_cache=verify_cache)[0][0]
+    return iter_valid_records(
+        file, secret_and_validator, start_time_utc, end_time_utc, byte_range
+    )
+
+
+def _secret_and_validator(
+    secret: str, check_against_secret: bool, verify_cache: Optional[VerificationCache]
+) -> Optional[_SecretAndValidator]:
+    if not check_against_secret:
+        return None
+    return _SecretAndValidator(
+        secret,
+        cached_validator(verify_cache) if verify_cache else validate_signed_time_given_secret,
+    )
+
+
+def get_time_blocks_incremental(
+    file: Path,
+    secret: str,
+    buffer_minutes: int = 5,
+    check_against_secret: bool = True,
+    bufferless_block_min_size: int = 5,
+    bufferless_block_gap: int = 90,
+    verify_cache: Optional[VerificationCache] = None,
+) -> Tuple[List[TimeBlock], datetime.timedelta]:
+    """
+    Like get_time_blocks, but continue from the checkpoint of the previous call, only
+    reading the records appended to the file since. The file is read from the start
+    when there's no usable checkpoint, or when records from before the last block
+    were appended, like from a merge.
+
+    :return: The blocks finished since the checkpoint and the last block, which may
+        still change, and the total duration of all the blocks in the file
+    """
+    secret_and_validator = _secret_and_validator(secret, check_against_secret, verify_cache)
+    buffer_sec = buffer_minutes * 60
+    config = {
+        "buffer_sec": buffer_sec,
+        "bufferless_block_min_size": bufferless_block_min_size,
+        "bufferless_block_gap": bufferless_block_gap,
+        "check_against_secret": check_against_secret,
+    }
+
+    checkpoint = TimeBlockCheckpoint.load(file, secret, config)
+    offset = checkpoint.offset if checkpoint else 0
+    end = complete_lines_end(file, offset)
+    epochs = sorted(
+        _record_epoch(record)
+        for record in iter_valid_records(file, secret_and_validator, byte_range=(offset, end))
+    )
+    accumulator = TimeBlockAccumulator(
+        buffer_sec,
+        bufferless_block_min_size,
+        bufferless_block_gap,
+        checkpoint.state if checkpoint else None,
+    )
+    if epochs and not accumulator.accepts(epochs[0]):
+        logger.info("Records from before the checkpoint were added, rebuilding time blocks")
+        end = complete_lines_end(file, 0)
+        epochs = sorted(
+            _record_epoch(record)
+            for record in iter_valid_records(file, secret_and_validator, byte_range=(0, end))
+        )
+        accumulator = TimeBlockAccumulator(
+            buffer_sec, bufferless_block_min_size, bufferless_block_gap
+        )
+
+    blocks: List[TimeBlock] = []
+    for epoch in epochs:
+        finished = accumulator.add(epoch)
+        if finished:
+            blocks.append(_epoch_time_block(*finished))
+    TimeBlockCheckpoint.at(file, end, config, accumulator.state).save(file, secret)
+    if verify_cache:
+        verify_cache.save()
+
+    total_sec = accumulator.finished_sec
+    open_block = accumulator.open_block()
+    if open_block:
+        blocks.append(_epoch_time_block(*open_block))
+        total_sec += open_block[1] - open_block[0]
+    return blocks, datetime.timedelta(seconds=total_sec)
 
 
 def build_time_blocks_from_records(
-    records: List[dict],
+    records: Iterable[dict],
     buffer: datetime.timedelta,
     bufferless_block_min_size: int = 5,
     bufferless_block_gap: int = 90,
+    engine: str = "epoch",
 ) -> List[TimeBlock]:
-    sorted_signed_times: List[SignedTime] = sorted(
-        [SignedTime(**r["signed_time"]) for r in records], key=lambda r: r.dt
+    """
+    Build time blocks from the signed times of records
+
+    :param engine: epoch works on integer seconds and only creates datetimes for the
+        resulting blocks, datetime is the original implementation. Both give the same
+        blocks.
+    """
+    if engine not in TIME_BLOCK_ENGINES:
+        raise ValueError(f"Unknown time block engine: {engine}")
+    if engine == "epoch" and not buffer.microseconds:
+        return build_time_blocks_from_epochs(
+            array("q", [_record_epoch(r) for r in records]),
+            int(buffer.total_seconds()),
+            bufferless_block_min_size,
+            bufferless_block_gap,
+        )
+
+    sorted_times: List[datetime.datetime] = sorted(
+        SignedTime(**r["signed_time"]).dt for r in records
     )
     blocks: List[TimeBlock] = []
 
-    def add_block(signed_time: SignedTime) -> None:
+    def add_block(signed_dt: datetime.datetime) -> None:
         blocks.append(
             TimeBlock(
-                start_time=signed_time.dt - buffer,
-                end_time=signed_time.dt + buffer,
+                start_time=signed_dt - buffer,
+                end_time=signed_dt + buffer,
             )
         )
 
-    for signed_time in sorted_signed_times:
+    for signed_dt in sorted_times:
         if not blocks:
-            add_block(signed_time)
+            add_block(signed_dt)
             continue
         last_block = blocks[-1]
         # note: block already incorporates the buffer
-        if signed_time.dt < last_block.end_time:
-            last_block.end_time = signed_time.dt + buffer
+        if signed_dt < last_block.end_time:
+            last_block.end_time = signed_dt + buffer
         else:
-            add_block(signed_time)
+            add_block(signed_dt)
 
     _remove_buffer_from_bufferless_blocks(
         blocks, buffer, bufferless_block_min_size, bufferless_block_gap
@@ -107,6 +258,281 @@ def build_time_blocks_from_records(
     return blocks
 
 
+def build_time_blocks_from_epochs(
+    epochs: "array[int]",
+    buffer_sec: int,
+    bufferless_block_min_size: int = 5,
+    bufferless_block_gap: int = 90,
+    use_numpy: Optional[bool] = None,
+) -> List[TimeBlock]:
+    """
+    Same as build_time_blocks_from_records, but from UTC epoch seconds
+
+    :param epochs: The signed times, in any order
+    :param buffer_sec: The buffer around each entry, in seconds
+    :param use_numpy: Build the blocks with vectorized numpy operations. By default,
+        numpy is used if it is installed.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None and buffer_sec >= 0
+    elif use_numpy and numpy is None:
+        raise ValueError("Building time blocks with numpy requires the numpy package")
+    if use_numpy:
+        starts, ends = _epoch_block_bounds_numpy(
+            epochs, buffer_sec, bufferless_block_min_size, bufferless_block_gap
+        )
+    else:
+        starts, ends = _epoch_block_bounds(
+            epochs, buffer_sec, bufferless_block_min_size, bufferless_block_gap
+        )
+    return [TimeBlock(start_time=start, end_time=end) for start, end in zip(starts, ends)]
+
+
+def _epoch_block_bounds(
+    epochs: "array[int]",
+    buffer_sec: int,
+    bufferless_block_min_size: int,
+    bufferless_block_gap: int,
+) -> Tuple[List[datetime.datetime], List[datetime.datetime]]:
+    starts = array("q")
+    ends = array("q")
+    end = None
+    for epoch in sorted(epochs):
+        # note: the end already incorporates the buffer
+        if end is not None and epoch < end:
+            end = epoch + buffer_sec
+            ends[-1] = end
+        else:
+            end = epoch + buffer_sec
+            starts.append(epoch - buffer_sec)
+            ends.append(end)
+
+    # same as _remove_buffer_from_bufferless_blocks
+    min_size_sec = bufferless_block_min_size * 60
+    gap_sec = bufferless_block_gap * 60
+    last_idx = len(starts) - 1
+    for idx in range(len(starts)):
+        start = starts[idx]
+        end = ends[idx]
+        if end - start - buffer_sec * 2 > min_size_sec:
+            continue
+        if idx > 0 and start + buffer_sec - ends[idx - 1] <= gap_sec:
+            continue
+        if idx < last_idx and starts[idx + 1] - (end - buffer_sec) <= gap_sec:
+            continue
+        starts[idx] = start + buffer_sec
+        ends[idx] = end - buffer_sec
+
+    return (
+        [_EPOCH + datetime.timedelta(seconds=start) for start in starts],
+        [_EPOCH + datetime.timedelta(seconds=end) for end in ends],
+    )
+
+
+def _epoch_time_block(start: int, end: int) -> TimeBlock:
+    return TimeBlock(
+        start_time=_EPOCH + datetime.timedelta(seconds=start),
+        end_time=_EPOCH + datetime.timedelta(seconds=end),
+    )
+
+
+def _epoch_block_bounds_numpy(
+    epochs: "array[int]",
+    buffer_sec: int,
+    bufferless_block_min_size: int,
+    bufferless_block_gap: int,
+) -> Tuple[List[datetime.datetime], List[datetime.datetime]]:
+    sorted_epochs = numpy.sort(numpy.asarray(epochs, dtype=numpy.int64))
+    if not sorted_epochs.size:
+        return [], []
+    # a block ends where the next entry is outside of the buffer of the previous one
+    is_first = numpy.empty(sorted_epochs.size, dtype=bool)
+    is_first[0] = True
+    is_first[1:] = numpy.diff(sorted_epochs) >= buffer_sec
+    first_idxs = numpy.flatnonzero(is_first)
+    last_idxs = numpy.append(first_idxs[1:] - 1, sorted_epochs.size - 1)
+    starts = sorted_epochs[first_idxs] - buffer_sec
+    ends = sorted_epochs[last_idxs] + buffer_sec
+
+    # same as _remove_buffer_from_bufferless_blocks. That goes block by block, checking
+    # the gap to the previous block after its buffer may have been removed. A block only
+    # loses its buffer when the gap after it is wide, which is the gap before the next
+    # block, so checking the original gaps gives the same result.
+    bufferless = ends - starts - buffer_sec * 2 <= bufferless_block_min_size * 60
+    wide_gaps = starts[1:] - ends[:-1] + buffer_sec > bufferless_block_gap * 60
+    bufferless[1:] &= wide_gaps
+    bufferless[:-1] &= wide_gaps
+    starts[bufferless] += buffer_sec
+    ends[bufferless] -= buffer_sec
+
+    return (
+        starts.astype("datetime64[s]").tolist(),
+        ends.astype("datetime64[s]").tolist(),
+    )
+
+
+class TimeBlockAccumulator:
+    """
+    Builds time blocks from signed times one at a time, in UTC epoch seconds, with the
+    same result as build_time_blocks_from_epochs on all of them.
+
+    The times must come in ascending order, except that times within the block being
+    built can come in any order. Only that last block is kept. It stays open since the
+    next time may extend it, and whether it keeps its buffer depends on the gap to the
+    next block.
+    """
+
+    def __init__(
+        self,
+        buffer_sec: int,
+        bufferless_block_min_size: int = 5,
+        bufferless_block_gap: int = 90,
+        state: Optional[dict] = None,
+    ) -> None:
+        """
+        :param state: Continue from the state of an earlier accumulator
+        """
+        self._buffer_sec = buffer_sec
+        self._min_size_sec = bufferless_block_min_size * 60
+        self._gap_sec = bufferless_block_gap * 60
+        state = state or {}
+        # the open block, including the buffer
+        self._start: Optional[int] = state.get("start")
+        self._end: Optional[int] = state.get("end")
+        # the end of the block before it, including the buffer
+        self._prev_end: Optional[int] = state.get("prev_end")
+        # the number and total duration of the finished blocks
+        self.finished_blocks: int = state.get("finished_blocks", 0)
+        self.finished_sec: int = state.get("finished_sec", 0)
+
+    @property
+    def state(self) -> dict:
+        return {
+            "start": self._start,
+            "end": self._end,
+            "prev_end": self._prev_end,
+            "finished_blocks": self.finished_blocks,
+            "finished_sec": self.finished_sec,
+        }
+
+    def accepts(self, epoch: int) -> bool:
+        """
+        Whether a time can be added, it must not be before the open block's first time
+        """
+        return self._start is None or epoch >= self._start + self._buffer_sec
+
+    def add(self, epoch: int) -> Optional[Tuple[int, int]]:
+        """
+        Add a signed time
+
+        :return: The start and end of the block this time finished, if any
+        :raises ValueError: If the time is before the open block's first time
+        """
+        if not self.accepts(epoch):
+            raise ValueError("Signed times must be added in ascending order")
+        if self._end is not None and epoch < self._end:
+            self._end = max(self._end, epoch + self._buffer_sec)
+            return None
+        finished = None
+        if self._start is not None and self._end is not None:
+            finished = self._finish(self._start, self._end, epoch - self._buffer_sec)
+            self.finished_blocks += 1
+            self.finished_sec += finished[1] - finished[0]
+            self._prev_end = self._end
+        self._start = epoch - self._buffer_sec
+        self._end = epoch + self._buffer_sec
+        return finished
+
+    def open_block(self) -> Optional[Tuple[int, int]]:
+        """
+        The start and end of the open block, as if no more times were added
+        """
+        if self._start is None or self._end is None:
+            return None
+        return self._finish(self._start, self._end, None)
+
+    def _finish(self, start: int, end: int, next_start: Optional[int]) -> Tuple[int, int]:
+        # same as _remove_buffer_from_bufferless_blocks, see _epoch_block_bounds_numpy for
+        # why the end of the previous block before removing its buffer can be used
+        buffer_sec = self._buffer_sec
+        if (
+            end - start - buffer_sec * 2 <= self._min_size_sec
+            and (self._prev_end is None or start + buffer_sec - self._prev_end > self._gap_sec)
+            and (next_start is None or next_start - (end - buffer_sec) > self._gap_sec)
+        ):
+            return start + buffer_sec, end - buffer_sec
+        return start, end
+
+
+def _record_epoch(record: dict) -> int:
+    try:
+        return parse_epoch(record["signed_time"]["time"])
+    except ValueError:
+        # strptime also takes unpadded fields, which the server never writes
+        signed_dt = SignedTime(**record["signed_time"]).dt
+        return (signed_dt - _EPOCH) // datetime.timedelta(seconds=1)
+
+
+def parse_epoch(time_as_str: str) -> int:
+    """
+    Parse a signed time, formatted as %Y-%m-%d %H:%M:%S, into UTC epoch seconds.
+
+    Much faster than strptime, and stricter since every field must be zero padded.
+
+    :raises ValueError: If the time isn't in that format or isn't a valid time
+    """
+    if (
+        len(time_as_str) != 19
+        or time_as_str[10] != " "
+        or time_as_str[13] != ":"
+        or time_as_str[16] != ":"
+    ):
+        raise ValueError(f"Invalid time: {time_as_str!r}")
+    hms = time_as_str[11:13] + time_as_str[14:16] + time_as_str[17:19]
+    if not (hms.isdigit() and hms.isascii()):
+        raise ValueError(f"Invalid time: {time_as_str!r}")
+    hour = int(hms[0:2])
+    minute = int(hms[2:4])
+    second = int(hms[4:6])
+    if hour > 23 or minute > 59 or second > 59:
+        raise ValueError(f"Invalid time: {time_as_str!r}")
+    return _parse_epoch_day(time_as_str[:10]) * 86400 + hour * 3600 + minute * 60 + second
+
+
+@lru_cache(maxsize=4096)
+def _parse_epoch_day(date_str: str) -> int:
+    # records come in runs of the same day, so the date is parsed once per day
+    if date_str[4] != "-" or date_str[7] != "-":
+        raise ValueError(f"Invalid date: {date_str!r}")
+    digits = date_str[0:4] + date_str[5:7] + date_str[8:10]
+    if not (digits.isdigit() and digits.isascii()):
+        raise ValueError(f"Invalid date: {date_str!r}")
+    year = int(digits[0:4])
+    month = int(digits[4:6])
+    day = int(digits[6:8])
+    if year < 1 or not 1 <= month <= 12 or not 1 <= day <= _days_in_month(year, month):
+        raise ValueError(f"Invalid date: {date_str!r}")
+    return _days_from_civil(year, month, day)
+
+
+def _days_in_month(year: int, month: int) -> int:
+    if month == 2:
+        return 29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28
+    return 30 if month in (4, 6, 9, 11) else 31
+
+
+def _days_from_civil(year: int, month: int, day: int) -> int:
+    # days since 1970-01-01 in the proleptic Gregorian calendar, from
+    # http://howardhinnant.github.io/date_algorithms.html#days_from_civil
+    if month <= 2:
+        year -= 1
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
 def _remove_buffer_from_bufferless_blocks(
     blocks: List[TimeBlock],
     buffer: datetime.timedelta,
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+TAIL_BYTES = 4096  # the checkpoint remembers a digest of this much of the file before its offset
+
+
+def checkpoint_path_for(file: Path) -> Path:
+    # a dotfile, so the .ptyme_track .gitignore keeps it out of git
+    return file.with_name(f".{file.name}.checkpoint")
+
+
+class TimeBlockCheckpoint:
+    """
+    How far time blocks were built from a times file, so the next run only needs to
+    read the records appended since.
+
+    The checkpoint holds the byte offset it read up to, the configuration the blocks
+    were built with and the state of the time block accumulator. It is tied to the
+    bytes just before the offset, so a file rewritten by something other than
+    appending, like a git merge, is rebuilt from the start. Like the verification
+    cache, the file is authenticated with an HMAC keyed by the secret, so an edited
+    checkpoint can't inflate the totals.
+    """
+
+    def __init__(self, offset: int, tail_digest: str, config: dict, state: dict) -> None:
+        self.offset = offset
+        self.tail_digest = tail_digest
+        self.config = config
+        self.state = state
+
+    @classmethod
+    def at(cls, file: Path, offset: int, config: dict, state: dict) -> TimeBlockCheckpoint:
+        """
+        Create a checkpoint for a file read up to offset
+        """
+        return cls(offset, _tail_digest(file, offset), config, state)
+
+    @classmethod
+    def load(cls, file: Path, secret: str, config: dict) -> Optional[TimeBlockCheckpoint]:
+        """
+        Load the checkpoint of a file, if it was made with the same secret and
+        configuration and the file was only appended to since
+        """
+        try:
+            header_line, body = checkpoint_path_for(file).read_bytes().split(b"\n", 1)
+            header = json.loads(header_line)
+            data = json.loads(body)
+            size = file.stat().st_size
+        except (OSError, ValueError):
+            return None
+        if (
+            not isinstance(header, dict)
+            or header.get("version") != CHECKPOINT_VERSION
+            or not hmac.compare_digest(str(header.get("mac")), _mac(secret, body))
+        ):
+            logger.info("Ignoring time block checkpoint written for another secret or modified")
+            return None
+        if data["config"] != config:
+            return None
+        if data["offset"] > size or _tail_digest(file, data["offset"]) != data["tail_digest"]:
+            logger.info("Times file was rewritten, rebuilding its time blocks")
+            return None
+        return cls(data["offset"], data["tail_digest"], data["config"], data["state"])
+
+    def save(self, file: Path, secret: str) -> None:
+        body = json.dumps(
+            {
+                "offset": self.offset,
+                "tail_digest": self.tail_digest,
+                "config": self.config,
+                "state": self.state,
+            }
+        ).encode("utf-8")
+        header = json.dumps({"version": CHECKPOINT_VERSION, "mac": _mac(secret, body)}).encode(
+            "utf-8"
+        )
+        checkpoint_path = checkpoint_path_for(file)
+        tmp_path = checkpoint_path.with_name(checkpoint_path.name + ".tmp")
+        try:
+            tmp_path.write_bytes(header + b"\n" + body)
+            os.replace(tmp_path, checkpoint_path)
+        except OSError as exc:
+            logger.debug(f"Could not write time block checkpoint: {exc}")
+
+
+def complete_lines_end(file: Path, start: int) -> int:
+    """
+    The offset just after the last complete line of a file, at least start. A line
+    still being appended is left for the next run.
+    """
+    with file.open("rb") as times_file:
+        end = times_file.seek(0, os.SEEK_END)
+        while end > start:
+            chunk_start = max(start, end - TAIL_BYTES)
+            times_file.seek(chunk_start)
+            newline = times_file.read(end - chunk_start).rfind(b"\n")
+            if newline >= 0:
+                return chunk_start + newline + 1
+            end = chunk_start
+    return start
+
+
+def _tail_digest(file: Path, offset: int) -> str:
+    try:
+        with file.open("rb") as times_file:
+            times_file.seek(max(0, offset - TAIL_BYTES))
+            tail = times_file.read(min(offset, TAIL_BYTES))
+    except OSError:
+        return ""
+    return hashlib.sha256(tail).hexdigest()
+
+
+def _mac(secret: str, body: bytes) -> str:
+    key = hashlib.sha256(f"ptyme-time-checkpoint:{secret}".encode("utf-8")).digest()
+    return hmac.new(key, body, hashlib.sha256).hexdigest()
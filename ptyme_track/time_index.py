@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+
+def index_path_for(file: Path) -> Path:
+    # a dotfile, so the .ptyme_track .gitignore keeps it out of git
+    return file.with_name(f".{file.name}.index")
+
+
+class TimeIndex:
+    """
+    Byte ranges of each day's records in a times file.
+
+    A day's range spans from the start of its first record to the end of its last
+    one, so records out of order, like ones signed late, are still covered. The index
+    is tied to the file's size and mtime, and is rebuilt when the file was changed by
+    anything other than update, like a git merge.
+    """
+
+    def __init__(self) -> None:
+        # day -> [start offset, end offset]
+        self._days: Dict[str, List[int]] = {}
+        self._size = 0
+        self._mtime_ns = 0
+
+    @classmethod
+    def load(cls, file: Path, stat: Optional[os.stat_result] = None) -> Optional[TimeIndex]:
+        """
+        Load the index of a file if it is up to date
+
+        :param stat: Check the index against this stat instead of the file's current one
+        """
+        try:
+            if stat is None:
+                stat = file.stat()
+            data = json.loads(index_path_for(file).read_text())
+        except (OSError, ValueError):
+            return None
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != INDEX_VERSION
+            or data.get("size") != stat.st_size
+            or data.get("mtime_ns") != stat.st_mtime_ns
+        ):
+            return None
+        index = cls()
+        index._days = data["days"]
+        index._size = stat.st_size
+        index._mtime_ns = stat.st_mtime_ns
+        return index
+
+    @classmethod
+    def build(cls, file: Path) -> TimeIndex:
+        index = cls()
+        index._scan(file, 0)
+        return index
+
+    def region(
+        self,
+        start_time_utc: Optional[datetime.datetime],
+        end_time_utc: Optional[datetime.datetime],
+    ) -> Tuple[int, int]:
+        """
+        The byte range holding every record signed between the two times
+        """
+        first_day = start_time_utc.strftime("%Y-%m-%d") if start_time_utc else None
+        last_day = end_time_utc.strftime("%Y-%m-%d") if end_time_utc else None
+        start: Optional[int] = None
+        end = 0
+        for day, (day_start, day_end) in self._days.items():
+            if (first_day and day < first_day) or (last_day and day > last_day):
+                continue
+            start = day_start if start is None else min(start, day_start)
+            end = max(end, day_end)
+        if start is None:
+            return 0, 0
+        return start, end
+
+    def save(self, file: Path) -> None:
+        data = {
+            "version": INDEX_VERSION,
+            "size": self._size,
+            "mtime_ns": self._mtime_ns,
+            "days": self._days,
+        }
+        index_path = index_path_for(file)
+        tmp_path = index_path.with_name(index_path.name + ".tmp")
+        try:
+            tmp_path.write_text(json.dumps(data))
+            os.replace(tmp_path, index_path)
+        except OSError as exc:
+            logger.debug(f"Could not write time index: {exc}")
+
+    def _scan(self, file: Path, offset: int) -> None:
+        with file.open("rb") as times_file:
+            stat = os.fstat(times_file.fileno())
+            times_file.seek(offset)
+            for line in times_file:
+                end = offset + len(line)
+                try:
+                    day = json.loads(line)["signed_time"]["time"][:10]
+                except (ValueError, KeyError, TypeError):
+                    day = None
+                if isinstance(day, str):
+                    day_range = self._days.get(day)
+                    if day_range is None:
+                        self._days[day] = [offset, end]
+                    else:
+                        day_range[0] = min(day_range[0], offset)
+                        day_range[1] = max(day_range[1], end)
+                offset = end
+        self._size = stat.st_size
+        self._mtime_ns = stat.st_mtime_ns
+
+
+def update_time_index(file: Path, previous_stat: Optional[os.stat_result]) -> None:
+    """
+    Update the index of a file after appending to it
+
+    :param file: The times file
+    :param previous_stat: The stat of the file before appending, None if it didn't exist
+    """
+    index = TimeIndex.load(file, previous_stat) if previous_stat is not None else None
+    if index is None:
+        index = TimeIndex.build(file)
+    else:
+        index._scan(file, index._size)
+    index.save(file)
+
+
+def time_region(
+    file: Path,
+    start_time_utc: Optional[datetime.datetime],
+    end_time_utc: Optional[datetime.datetime],
+) -> Tuple[int, int]:
+    """
+    Get the byte range of a file holding the records signed between two times,
+    building the index if it's missing or out of date
+    """
+    index = TimeIndex.load(file)
+    if index is None:
+        index = TimeIndex.build(file)
+        index.save(file)
+    return index.region(start_time_utc, end_time_utc)
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import csv
+import datetime
+import json
+from array import array
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Dict, Iterable, List, Optional
+
+from ptyme_track.time_blocks import TimeBlockAccumulator, _record_epoch, read_valid_records
+from ptyme_track.verify_cache import VerificationCache
+
+ROLLUP_FORMATS = ("json", "csv")
+ROLLUP_FIELDS = ("bucket", "key", "seconds", "duration")
+
+_EPOCH_DATE = datetime.date(1970, 1, 1)
+
+
+@dataclass
+class TimeRollup:
+    """
+    Total time of the blocks in a times file, and bucketed by UTC day, ISO week and git
+    branch, in seconds.
+
+    Blocks spanning midnight are split between the days. Branch totals are from blocks
+    built from only that branch's records, like git_ci_diff reports them, so they don't
+    add up to the total when work on branches was interleaved. Records cemented without
+    a branch are under None.
+    """
+
+    total_sec: int = 0
+    # days since the epoch -> seconds
+    day_secs: Dict[int, int] = field(default_factory=dict)
+    branch_secs: Dict[Optional[str], int] = field(default_factory=dict)
+
+    @property
+    def days(self) -> Dict[str, int]:
+        return {
+            str(_EPOCH_DATE + datetime.timedelta(days=day)): secs
+            for day, secs in sorted(self.day_secs.items())
+        }
+
+    @property
+    def weeks(self) -> Dict[str, int]:
+        weeks: Dict[str, int] = {}
+        for day, secs in sorted(self.day_secs.items()):
+            year, week, _ = (_EPOCH_DATE + datetime.timedelta(days=day)).isocalendar()
+            week_key = f"{year}-W{week:02d}"
+            weeks[week_key] = weeks.get(week_key, 0) + secs
+        return weeks
+
+    def rows(self) -> List[dict]:
+        """
+        One row per bucket, with the fields in ROLLUP_FIELDS
+        """
+        rows = [_row("total", None, self.total_sec)]
+        rows.extend(_row("day", day, secs) for day, secs in self.days.items())
+        rows.extend(_row("week", week, secs) for week, secs in self.weeks.items())
+        rows.extend(
+            _row("branch", branch, secs)
+            for branch, secs in sorted(
+                self.branch_secs.items(), key=lambda item: (item[0] is not None, item[0] or "")
+            )
+        )
+        return rows
+
+    def write(self, out: IO[str], format: str = "json") -> None:
+        """
+        Write the rows as JSON lines or as CSV with a header
+
+        :param format: json or csv
+        """
+        if format == "json":
+            for row in self.rows():
+                out.write(json.dumps(row) + "\n")
+        elif format == "csv":
+            writer = csv.DictWriter(out, fieldnames=ROLLUP_FIELDS, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(self.rows())
+        else:
+            raise ValueError(f"Unknown rollup format: {format}")
+
+
+def _row(bucket: str, key: Optional[str], secs: int) -> dict:
+    return {
+        "bucket": bucket,
+        "key": key,
+        "seconds": secs,
+        "duration": str(datetime.timedelta(seconds=secs)),
+    }
+
+
+class TimeRollupBuilder:
+    """
+    Collects records one at a time for a rollup. Only the signed time and branch of each
+    record are kept, in compact form.
+    """
+
+    def __init__(
+        self,
+        buffer_minutes: int = 5,
+        bufferless_block_min_size: int = 5,
+        bufferless_block_gap: int = 90,
+    ) -> None:
+        self._buffer_sec = buffer_minutes * 60
+        self._bufferless_block_min_size = bufferless_block_min_size
+        self._bufferless_block_gap = bufferless_block_gap
+        self._epochs = array("q")
+        self._branches: List[Optional[str]] = []
+
+    def add(self, record: dict) -> None:
+        self._epochs.append(_record_epoch(record))
+        self._branches.append(record.get("git-branch"))
+
+    def build(self) -> TimeRollup:
+        """
+        Build the time blocks of the records and total them in every bucket at once
+        """
+        epochs = self._epochs
+        branches = self._branches
+        rollup = TimeRollup()
+        accumulator = self._new_accumulator()
+        branch_accumulators: Dict[Optional[str], TimeBlockAccumulator] = {}
+        for idx in sorted(range(len(epochs)), key=epochs.__getitem__):
+            epoch = epochs[idx]
+            finished = accumulator.add(epoch)
+            if finished:
+                _add_to_days(rollup.day_secs, *finished)
+            branch = branches[idx]
+            branch_accumulator = branch_accumulators.get(branch)
+            if branch_accumulator is None:
+                branch_accumulator = branch_accumulators[branch] = self._new_accumulator()
+            branch_accumulator.add(epoch)
+
+        rollup.total_sec = _total_sec(accumulator)
+        open_block = accumulator.open_block()
+        if open_block:
+            _add_to_days(rollup.day_secs, *open_block)
+        for branch, branch_accumulator in branch_accumulators.items():
+            rollup.branch_secs[branch] = _total_sec(branch_accumulator)
+        return rollup
+
+    def _new_accumulator(self) -> TimeBlockAccumulator:
+        return TimeBlockAccumulator(
+            self._buffer_sec, self._bufferless_block_min_size, self._bufferless_block_gap
+        )
+
+
+def rollup_records(
+    records: Iterable[dict],
+    buffer_minutes: int = 5,
+    bufferless_block_min_size: int = 5,
+    bufferless_block_gap: int = 90,
+) -> TimeRollup:
+    """
+    Build the time blocks of records and total them in every bucket at once. The
+    records are only gone through once, see build_time_blocks_from_records for the
+    parameters.
+    """
+    builder = TimeRollupBuilder(buffer_minutes, bufferless_block_min_size, bufferless_block_gap)
+    for record in records:
+        builder.add(record)
+    return builder.build()
+
+
+def get_time_rollup(
+    file: Path,
+    secret: str,
+    buffer_minutes: int = 5,
+    start_time_utc: Optional[datetime.datetime] = None,
+    end_time_utc: Optional[datetime.datetime] = None,
+    check_against_secret: bool = True,
+    bufferless_block_min_size: int = 5,
+    bufferless_block_gap: int = 90,
+    verify_cache: Optional[VerificationCache] = None,
+    workers: int = 1,
+) -> TimeRollup:
+    """
+    Get the rollup of a file, see get_time_blocks for the parameters
+    """
+    records = read_valid_records(
+        file,
+        secret,
+        start_time_utc,
+        end_time_utc,
+        check_against_secret,
+        verify_cache,
+        workers,
+    )
+    rollup = rollup_records(
+        records, buffer_minutes, bufferless_block_min_size, bufferless_block_gap
+    )
+    if verify_cache:
+        verify_cache.save()
+    return rollup
+
+
+def _total_sec(accumulator: TimeBlockAccumulator) -> int:
+    total_sec = accumulator.finished_sec
+    open_block = accumulator.open_block()
+    if open_block:
+        total_sec += open_block[1] - open_block[0]
+    return total_sec
+
+
+def _add_to_days(day_secs: Dict[int, int], start: int, end: int) -> None:
+    while start < end:
+        day = start // 86400
+        day_end = min(end, (day + 1) * 86400)
+        day_secs[day] = day_secs.get(day, 0) + day_end - start
+        start = day_end
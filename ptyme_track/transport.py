@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import http.client
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+from ptyme_track.ptyme_env import (
+    PTYME_SERVER_RETRIES,
+    PTYME_SERVER_RETRY_BACKOFF_SEC,
+    PTYME_SERVER_TIMEOUT_SEC,
+)
+
+# pooled connections idle longer than this are dropped, the server will have closed them
+MAX_IDLE_SEC = 10.0
+
+logger = logging.getLogger(__name__)
+
+_Connection = Union[http.client.HTTPConnection, http.client.HTTPSConnection]
+
+
+class TransportError(Exception):
+    pass
+
+
+class HttpTransport:
+    """
+    Talks to the ptyme server over a small pool of keep-alive connections.
+
+    Requests time out instead of hanging, and failed requests are retried with
+    exponential backoff. A pooled connection the server already closed is replaced
+    right away without counting as a retry.
+    """
+
+    def __init__(
+        self,
+        server_url: str,
+        timeout_sec: float = PTYME_SERVER_TIMEOUT_SEC,
+        retries: int = PTYME_SERVER_RETRIES,
+        backoff_sec: float = PTYME_SERVER_RETRY_BACKOFF_SEC,
+        max_idle_connections: int = 2,
+    ) -> None:
+        url = urlparse(server_url)
+        self._https = url.scheme == "https"
+        self._host = url.hostname or ""
+        self._port = url.port
+        self._base_path = url.path.rstrip("/")
+        self._timeout_sec = timeout_sec
+        self._retries = retries
+        self._backoff_sec = backoff_sec
+        self._max_idle_connections = max_idle_connections
+        # idle connections and when they were last used
+        self._idle: List[Tuple[_Connection, float]] = []
+        self._lock = threading.Lock()
+
+    def request(self, method: str, path: str = "/", body: Optional[bytes] = None) -> bytes:
+        """
+        Send a request and return the response body
+
+        :raises TransportError: If the request still fails after the retries, or the
+            server rejected it
+        """
+        if not self._host:
+            raise TransportError("No server to connect to")
+        headers: Dict[str, str] = {}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        attempt = 0
+        while True:
+            conn, reused = self._acquire()
+            try:
+                conn.request(method, self._base_path + path, body, headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as exc:
+                conn.close()
+                if reused:
+                    # most likely closed by the server while idle, try a fresh connection
+                    continue
+                error: Exception = exc
+            else:
+                if response.will_close:
+                    conn.close()
+                else:
+                    self._release(conn)
+                if response.status < 400:
+                    return data
+                error = TransportError(f"Server responded with {response.status}")
+                if response.status < 500:
+                    raise error
+            if attempt >= self._retries:
+                raise TransportError(f"Request to the server failed: {error}") from error
+            delay = self._backoff_sec * 2**attempt * random.uniform(0.5, 1.5)
+            logger.info(f"Request to the server failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+    def _acquire(self) -> Tuple[_Connection, bool]:
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if now - last_used < MAX_IDLE_SEC:
+                    return conn, True
+                conn.close()
+        connection_class = (
+            http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        )
+        return connection_class(self._host, self._port, timeout=self._timeout_sec), False
+
+    def _release(self, conn: _Connection) -> None:
+        with self._lock:
+            if len(self._idle) < self._max_idle_connections:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
@@ -1,9 +1,25 @@
+import datetime
 import json
 from pathlib import Path
-from typing import Callable, List, NamedTuple, Optional, Tuple, Union
+from typing import (
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
 from ptyme_track.signature import signature_from_time
 from ptyme_track.signed_time import SignedTime
+from ptyme_track.verify_cache import VerificationCache
+
+# how signed times are formatted
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 _SecretAndValidator = NamedTuple(
     "_SecretAndValidator", [("secret", str), ("validator", Callable)]
@@ -11,8 +27,16 @@ _SecretAndValidator = NamedTuple(
 
 
 def validate_signed_time_given_secret(secret: str, signed_time: SignedTime) -> dict:
+    return validate_signed_time_given_signer(
+        lambda time_as_str: signature_from_time(secret, time_as_str), signed_time
+    )
+
+
+def validate_signed_time_given_signer(
+    signer: Callable[[str], str], signed_time: SignedTime
+) -> dict:
     server_id_matches = signed_time.server_id == signed_time.server_id
-    hash_sig = signature_from_time(secret, signed_time.time)
+    hash_sig = signer(signed_time.time)
     return {
         "server_id_match": server_id_matches,
         "time": signed_time.time,
@@ -20,31 +44,125 @@ def validate_signed_time_given_secret(secret: str, signed_time: SignedTime) -> d
     }
 
 
+def cached_validator(cache: VerificationCache) -> Callable[[str, SignedTime], dict]:
+    """
+    A validator that skips signed times the cache has already verified, and adds the
+    ones it verifies
+    """
+
+    def validate(secret: str, signed_time: SignedTime) -> dict:
+        if cache.is_verified(signed_time.time, signed_time.sig):
+            return {"server_id_match": True, "time": signed_time.time, "sig_matches": True}
+        result = validate_signed_time_given_secret(secret, signed_time)
+        if result["sig_matches"]:
+            cache.add(signed_time.time, signed_time.sig)
+        return result
+
+    return validate
+
+
 def validate_entries(file: Path, secret: str) -> Tuple[List[dict], List[Union[dict, str]]]:
     return load_entries(file, _SecretAndValidator(secret, validate_signed_time_given_secret))
 
 
 def load_entries(
     file: Path, secret_and_validator: Optional[_SecretAndValidator] = None
+) -> Tuple[List[dict], List[Union[dict, str]]]:
+    return split_entries(iter_entries(file, secret_and_validator))
+
+
+def split_entries(
+    entries: Iterable[Tuple[Union[dict, str], bool]],
 ) -> Tuple[List[dict], List[Union[dict, str]]]:
     valid: List[dict] = []
     invalid: List[Union[dict, str]] = []
-    with file.open() as times_file:
-        for line in times_file.readlines():
+    for entry, is_valid in entries:
+        if is_valid:
+            valid.append(cast(dict, entry))
+        else:
+            invalid.append(entry)
+    return valid, invalid
+
+
+def iter_entries(
+    file: Path,
+    secret_and_validator: Optional[_SecretAndValidator] = None,
+    start_time_utc: Optional[datetime.datetime] = None,
+    end_time_utc: Optional[datetime.datetime] = None,
+    byte_range: Optional[Tuple[int, int]] = None,
+) -> Iterator[Tuple[Union[dict, str], bool]]:
+    """
+    Lazily read the entries of a file
+
+    :param file: The file to read
+    :param secret_and_validator: Validates the entries, all well-formed entries are
+        valid without it
+    :param start_time_utc: Skip entries signed at or before this time
+    :param end_time_utc: Skip entries signed at or after this time
+    :param byte_range: Only read the lines between these offsets, see time_index
+    :return: An iterator of (record, True) for valid entries, and (record or line, False)
+        for invalid ones
+    """
+    # signed times are formatted so they sort as strings, which is much cheaper than
+    # parsing them. The entries have whole seconds, so round the bounds the same way.
+    start = _floor_time_str(start_time_utc) if start_time_utc else None
+    end = _ceil_time_str(end_time_utc) if end_time_utc else None
+    with file.open("rb") as times_file:
+        if byte_range is not None:
+            times_file.seek(byte_range[0])
+            lines: Iterator[bytes] = _lines_until(times_file, byte_range[1] - byte_range[0])
+        else:
+            lines = iter(times_file)
+        for raw_line in lines:
+            line = raw_line.decode("utf-8", errors="replace")
             try:
                 record: dict = json.loads(line)
+                if start or end:
+                    signed_time_str = record["signed_time"]["time"]
+                    if (start and signed_time_str <= start) or (end and signed_time_str >= end):
+                        continue
                 if secret_and_validator:
                     result = secret_and_validator.validator(
                         secret_and_validator.secret, SignedTime(**record["signed_time"])
                     )
                 else:
-                    valid.append(record)
+                    yield record, True
                     continue
-            except (json.JSONDecodeError, ValueError, KeyError):
-                invalid.append(line)
+            except (json.JSONDecodeError, ValueError, KeyError, TypeError):
+                yield line, False
             else:
-                if result["sig_matches"]:
-                    valid.append(record)
-                else:
-                    invalid.append(record)
-    return valid, invalid
+                yield record, bool(result["sig_matches"])
+
+
+def _lines_until(times_file: BinaryIO, size: int) -> Iterator[bytes]:
+    for line in times_file:
+        if size <= 0:
+            return
+        size -= len(line)
+        yield line
+
+
+def iter_valid_records(
+    file: Path,
+    secret_and_validator: Optional[_SecretAndValidator] = None,
+    start_time_utc: Optional[datetime.datetime] = None,
+    end_time_utc: Optional[datetime.datetime] = None,
+    byte_range: Optional[Tuple[int, int]] = None,
+) -> Iterator[dict]:
+    """
+    Like iter_entries, but only the valid records
+    """
+    entries = iter_entries(file, secret_and_validator, start_time_utc, end_time_utc, byte_range)
+    for entry, valid in entries:
+        if valid:
+            yield cast(dict, entry)
+
+
+def _floor_time_str(dt: datetime.datetime) -> str:
+    return dt.strftime(TIME_FORMAT)
+
+
+def _ceil_time_str(dt: datetime.datetime) -> str:
+    if dt.microsecond:
+        dt = dt.replace(microsecond=0) + datetime.timedelta(seconds=1)
+    return dt.strftime(TIME_FORMAT)
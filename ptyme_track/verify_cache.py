@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from ptyme_track.ptyme_env import PTYME_VERIFY_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+class VerificationCache:
+    """
+    Signed times already verified against a secret, so validating the same history
+    again doesn't need to recompute their signatures.
+
+    A signature only depends on the secret and the time, so the cache maps each verified
+    time to its signature, and a lookup is a dict access instead of a hash. The file is
+    authenticated with an HMAC keyed by the secret, so a cache edited by hand, or written
+    for another secret, is discarded instead of vouching for forged records. The least
+    recently used times are evicted past max_entries.
+    """
+
+    def __init__(
+        self, path: Path, secret: str, max_entries: int = PTYME_VERIFY_CACHE_SIZE
+    ) -> None:
+        self._path = path
+        self._key = hashlib.sha256(f"ptyme-verify-cache:{secret}".encode("utf-8")).digest()
+        self._max_entries = max_entries
+        self._verified: Optional[Dict[str, str]] = None
+        self._dirty = False
+
+    def is_verified(self, time_as_str: str, sig: str) -> bool:
+        verified = self._load()
+        if verified.get(time_as_str) != sig:
+            return False
+        # most recently used last
+        del verified[time_as_str]
+        verified[time_as_str] = sig
+        return True
+
+    def add(self, time_as_str: str, sig: str) -> None:
+        verified = self._load()
+        verified.pop(time_as_str, None)
+        verified[time_as_str] = sig
+        self._dirty = True
+
+    def snapshot(self) -> Dict[str, str]:
+        """
+        A copy of the verified signed times, time -> signature, for other processes
+        """
+        return dict(self._load())
+
+    def save(self) -> None:
+        if not self._dirty or self._verified is None:
+            return
+        while len(self._verified) > self._max_entries:
+            del self._verified[next(iter(self._verified))]
+        body = json.dumps(self._verified).encode("utf-8")
+        header = json.dumps({"version": CACHE_VERSION, "mac": self._mac(body)}).encode("utf-8")
+        tmp_path = self._path.with_name(self._path.name + ".tmp")
+        try:
+            tmp_path.write_bytes(header + b"\n" + body)
+            os.replace(tmp_path, self._path)
+        except OSError as exc:
+            logger.debug(f"Could not write verification cache: {exc}")
+            return
+        self._dirty = False
+
+    def _load(self) -> Dict[str, str]:
+        if self._verified is not None:
+            return self._verified
+        self._verified = {}
+        try:
+            header_line, body = self._path.read_bytes().split(b"\n", 1)
+            header = json.loads(header_line)
+        except FileNotFoundError:
+            return self._verified
+        except ValueError:
+            logger.info("Ignoring malformed verification cache")
+            return self._verified
+        if header.get("version") != CACHE_VERSION or not hmac.compare_digest(
+            str(header.get("mac")), self._mac(body)
+        ):
+            logger.info("Ignoring verification cache written for another secret or modified")
+            return self._verified
+        self._verified = json.loads(body)
+        return self._verified
+
+    def _mac(self, body: bytes) -> str:
+        return hmac.new(self._key, body, hashlib.sha256).hexdigest()
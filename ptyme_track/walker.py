@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+from pathlib import Path
+from shutil import which
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Pattern, Tuple
+
+
+class WalkStats:
+    """
+    Counts what a walk skipped
+    """
+
+    def __init__(self) -> None:
+        self.ignored = 0
+
+
+class _IgnoreRule(NamedTuple):
+    regex: Pattern[str]
+    negated: bool
+    dir_only: bool
+
+
+class IgnoreMatcher:
+    """
+    Matches paths relative to a watched dir against gitignore-style patterns.
+
+    A pattern without a slash matches a name at any depth, like `node_modules`.
+    A pattern with a leading or middle slash is anchored to the watched dir.
+    A trailing slash only matches directories, `*`, `?`, `[...]` and `**` work like
+    they do in .gitignore and a leading `!` re-includes a previously ignored path.
+    """
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self._rules: List[_IgnoreRule] = []
+        for pattern in patterns:
+            rule = _compile_rule(pattern)
+            if rule:
+                self._rules.append(rule)
+
+    def __bool__(self) -> bool:
+        return bool(self._rules)
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        """
+        Whether the entry itself is ignored, without looking at its parents
+
+        :param rel_path: Path relative to the watched dir, using "/" as the separator
+        :param is_dir: Whether the path is a directory
+        """
+        return self.match(rel_path, is_dir) is True
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Like matches, but returns None when no pattern applies to the path at all
+        """
+        result = None
+        for rule in self._rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if result == (not rule.negated):
+                # can't change the outcome
+                continue
+            if rule.regex.fullmatch(rel_path):
+                result = not rule.negated
+        return result
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """
+        Whether the path or any of its parent directories are ignored
+        """
+        parts = rel_path.split("/")
+        for idx in range(1, len(parts)):
+            if self.matches("/".join(parts[:idx]), True):
+                return True
+        return self.matches(rel_path, is_dir)
+
+
+class GitignoreCache:
+    """
+    Compiled matchers for .gitignore files, reloaded when a .gitignore file changes
+    """
+
+    def __init__(self) -> None:
+        self._matchers: Dict[str, Tuple[int, IgnoreMatcher]] = {}
+
+    def get(self, directory: str) -> Optional[IgnoreMatcher]:
+        path = os.path.join(directory, ".gitignore")
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            self._matchers.pop(path, None)
+            return None
+        cached = self._matchers.get(path)
+        if cached and cached[0] == mtime_ns:
+            return cached[1]
+        try:
+            matcher = IgnoreMatcher(Path(path).read_text().splitlines())
+        except (OSError, UnicodeDecodeError):
+            return None
+        self._matchers[path] = (mtime_ns, matcher)
+        return matcher
+
+    def is_ignored(self, root: Path, rel_path: str, is_dir: bool = False) -> bool:
+        """
+        Whether the path is ignored by .gitignore files in the watched dir or below it
+        """
+        parts = rel_path.split("/")
+        levels: List[Tuple[str, IgnoreMatcher]] = []
+        for idx in range(len(parts)):
+            rel_dir = "/".join(parts[:idx])
+            matcher = self.get(os.path.join(root, rel_dir))
+            if matcher:
+                levels.append((rel_dir + "/" if rel_dir else "", matcher))
+            entry_is_dir = is_dir or idx < len(parts) - 1
+            if _levels_match(levels, "/".join(parts[: idx + 1]), entry_is_dir):
+                return True
+        return False
+
+
+_GitignoreLevels = List[Tuple[str, IgnoreMatcher]]
+
+
+def _levels_match(levels: _GitignoreLevels, rel_path: str, is_dir: bool) -> bool:
+    # deeper .gitignore files take precedence
+    for rel_prefix, matcher in reversed(levels):
+        result = matcher.match(rel_path[len(rel_prefix) :], is_dir)
+        if result is not None:
+            return result
+    return False
+
+
+def list_git_files(root: Path) -> Optional[List[Path]]:
+    """
+    List the tracked and untracked, but not ignored, files under a watched dir using git
+
+    :return: The files, or None if git is not installed or the dir is not in a work tree
+    """
+    if not which("git") or not root.is_dir():
+        return None
+    try:
+        output = subprocess.run(
+            ["git", "ls-files", "--cached", "--others", "--exclude-standard", "-z"],
+            cwd=root,
+            capture_output=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return [root / os.fsdecode(name) for name in output.split(b"\0") if name]
+
+
+def in_git_work_tree(root: Path) -> bool:
+    """
+    Whether a watched dir is in a git work tree, so list_git_files works for it
+    """
+    if not which("git") or not root.is_dir():
+        return False
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--is-inside-work-tree"],
+            cwd=root,
+            capture_output=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return output.strip() == b"true"
+
+
+def _compile_rule(pattern: str) -> Optional[_IgnoreRule]:
+    pattern = pattern.strip()
+    if not pattern or pattern.startswith("#"):
+        return None
+    negated = pattern.startswith("!")
+    if negated:
+        pattern = pattern[1:]
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    regex = _translate(pattern)
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    return _IgnoreRule(re.compile(regex), negated, dir_only)
+
+
+def _translate(pattern: str) -> str:
+    result = []
+    idx = 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        if pattern.startswith("**/", idx):
+            result.append("(?:.*/)?")
+            idx += 3
+            continue
+        if pattern.startswith("**", idx):
+            result.append(".*")
+            idx += 2
+            continue
+        if char == "*":
+            result.append("[^/]*")
+        elif char == "?":
+            result.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", idx + 2)
+            if end == -1:
+                result.append(re.escape(char))
+            else:
+                contents = pattern[idx + 1 : end].replace("\\", "\\\\")
+                if contents.startswith("!"):
+                    contents = "^" + contents[1:]
+                result.append(f"[{contents}]")
+                idx = end
+        elif char == "\\" and idx + 1 < len(pattern):
+            idx += 1
+            result.append(re.escape(pattern[idx]))
+        else:
+            result.append(re.escape(char))
+        idx += 1
+    return "".join(result)
+
+
+def relative_path(root: Path, path: Path) -> str:
+    root_str = str(root)
+    path_str = str(path)
+    # fast paths for the common case of a path found by walking the root
+    if path_str.startswith(root_str + os.sep):
+        return path_str[len(root_str) + 1 :].replace(os.sep, "/")
+    if root_str == "." and not os.path.isabs(path_str) and not path_str.startswith(".."):
+        return path_str.replace(os.sep, "/")
+    rel_path = os.path.relpath(path, root)
+    if rel_path == ".":
+        return ""
+    return rel_path.replace(os.sep, "/")
+
+
+def walk_files(
+    root: Path,
+    ignore: IgnoreMatcher,
+    directory: Optional[Path] = None,
+    gitignore: Optional[GitignoreCache] = None,
+    stats: Optional[WalkStats] = None,
+) -> Iterator[Path]:
+    """
+    Walk the files under a watched dir, skipping hidden entries and pruning ignored
+    directories before descending into them
+
+    :param root: The watched dir that ignore patterns are relative to
+    :param ignore: The ignore patterns
+    :param directory: Directory under the root to start from, defaults to the root
+    :param gitignore: When given, .gitignore files found while walking are honored too
+    :param stats: When given, counts the ignored entries
+    """
+    for entry in _walk(root, ignore, directory, gitignore, stats, files=True):
+        yield Path(entry)
+
+
+def walk_dirs(
+    root: Path,
+    ignore: IgnoreMatcher,
+    directory: Optional[Path] = None,
+    gitignore: Optional[GitignoreCache] = None,
+) -> Iterator[str]:
+    """
+    Like walk_files, but yields the directories, including the starting directory
+    """
+    yield str(directory if directory is not None else root)
+    yield from _walk(root, ignore, directory, gitignore, None, files=False)
+
+
+def _walk(
+    root: Path,
+    ignore: IgnoreMatcher,
+    directory: Optional[Path],
+    gitignore: Optional[GitignoreCache],
+    stats: Optional[WalkStats],
+    files: bool,
+) -> Iterator[str]:
+    start = directory if directory is not None else root
+    rel_start = relative_path(root, start)
+    levels: _GitignoreLevels = []
+    if gitignore is not None and rel_start:
+        # pick up the .gitignore files between the root and the starting directory
+        parts = rel_start.split("/")
+        for idx in range(len(parts)):
+            rel_dir = "/".join(parts[:idx])
+            matcher = gitignore.get(os.path.join(root, rel_dir))
+            if matcher:
+                levels.append((rel_dir + "/" if rel_dir else "", matcher))
+    stack = [(str(start), rel_start + "/" if rel_start else "", levels)]
+    while stack:
+        dir_path, rel_prefix, levels = stack.pop()
+        if gitignore is not None:
+            matcher = gitignore.get(dir_path)
+            if matcher:
+                levels = levels + [(rel_prefix, matcher)]
+        try:
+            entries = os.scandir(dir_path)
+        except OSError:
+            # removed while walking or not readable
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                rel_path = rel_prefix + entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_file = not is_dir and entry.is_file()
+                except OSError:
+                    continue
+                if is_dir:
+                    if ignore.matches(rel_path, True) or _levels_match(levels, rel_path, True):
+                        if stats is not None:
+                            stats.ignored += 1
+                        continue
+                    if not files:
+                        yield entry.path
+                    stack.append((entry.path, rel_path + "/", levels))
+                elif files and is_file:
+                    if ignore.matches(rel_path, False) or _levels_match(levels, rel_path, False):
+                        if stats is not None:
+                            stats.ignored += 1
+                        continue
+                    yield entry.path
@@ -4,6 +4,7 @@ from pathlib import Path
 import pytest
 
 from ptyme_track.cement import cement_cur_times
+from ptyme_track.time_index import TimeIndex
 
 
 class TestCementCurrentTimes:
@@ -42,3 +43,17 @@ class TestCementCurrentTimes:
 
         assert self.cement_path.exists()
         assert self.cement_path.read_text() == "abc123"
+
+    def test_cement_indexes_target_file(self) -> None:
+        self.source_file.write_text(
+            json.dumps({"signed_time": {"server_id": "id", "time": "2023-06-16 10:00:00"}}) + "\n"
+        )
+
+        cement_cur_times(self.target_file, self.source_file, self.cement_path)
+
+        index = TimeIndex.load(self.target_file)
+        assert index is not None
+        assert index.region(None, None) == (
+            len('{"existing": "value"}\n'),
+            self.target_file.stat().st_size,
+        )
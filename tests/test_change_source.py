@@ -0,0 +1,93 @@
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from ptyme_track.change_source import (
+    InotifyChangeSource,
+    PollingChangeSource,
+    get_change_source,
+)
+from ptyme_track.walker import GitignoreCache
+
+
+def test_polling_change_source_never_knows_changes() -> None:
+    source = PollingChangeSource()
+    source.start(["."], [])
+
+    assert source.poll() is None
+
+
+def test_get_change_source_rejects_unknown_name() -> None:
+    with pytest.raises(ValueError):
+        get_change_source("carrier pigeon")
+
+
+@pytest.mark.skipif(not InotifyChangeSource.is_supported(), reason="requires inotify")
+class TestInotifyChangeSource:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> Iterator[None]:
+        self.watched_dir = tmp_path / "watched"
+        self.watched_dir.mkdir()
+        (self.watched_dir / "node_modules").mkdir()
+        self.source = InotifyChangeSource()
+        self.source.start([str(self.watched_dir)], ["node_modules"])
+        yield
+        self.source.close()
+
+    def test_first_poll_requires_full_scan(self) -> None:
+        assert self.source.poll() is None
+
+    def test_reports_changed_files(self) -> None:
+        self.source.poll()
+        (self.watched_dir / "a_file").write_text("Some value")
+
+        changed = self.source.poll()
+
+        assert changed == {str(self.watched_dir): {str(self.watched_dir / "a_file")}}
+
+    def test_watches_new_directories(self) -> None:
+        self.source.poll()
+        subdir = self.watched_dir / "subdir"
+        subdir.mkdir()
+        self.source.poll()
+        (subdir / "a_file").write_text("Some value")
+
+        changed = self.source.poll()
+
+        assert changed == {str(self.watched_dir): {str(subdir / "a_file")}}
+
+    def test_skips_hidden_and_ignored_paths(self) -> None:
+        self.source.poll()
+        (self.watched_dir / ".hidden").write_text("Some value")
+        (self.watched_dir / "node_modules" / "a_file").write_text("Some value")
+
+        changed = self.source.poll()
+
+        assert changed == {str(self.watched_dir): set()}
+
+    @pytest.mark.parametrize("prune_gitignored", [True, False])
+    def test_gitignored_directories(self, prune_gitignored: bool) -> None:
+        self.source.close()
+        (self.watched_dir / ".gitignore").write_text("build/\n")
+        build_dir = self.watched_dir / "build"
+        build_dir.mkdir()
+        self.source = InotifyChangeSource()
+        self.source.start(
+            [str(self.watched_dir)], [], GitignoreCache(), prune_gitignored=prune_gitignored
+        )
+        self.source.poll()
+        (build_dir / "a_file").write_text("Some value")
+
+        changed = self.source.poll()
+
+        # git may track files in ignored directories
+        expected = set() if prune_gitignored else {str(build_dir / "a_file")}
+        assert changed == {str(self.watched_dir): expected}
+
+    def test_falls_back_to_polling_when_watched_dir_missing(self, tmp_path: Path) -> None:
+        source = InotifyChangeSource()
+        source.start([str(tmp_path / "missing")], [])
+
+        assert source.poll() is None
+        assert source.poll() is None
@@ -1,15 +1,26 @@
 import datetime
 import hashlib
 import json
+import os
+import shutil
+import subprocess
+import threading
+import time
 from pathlib import Path
+from typing import Optional
 from unittest import mock
 
 import freezegun
 import pytest
 from pytest_mock import MockerFixture
 
+from ptyme_track.change_source import ChangedPaths, ChangeSource
 from ptyme_track.client import PtymeClient
+from ptyme_track.hash_cache import PersistentHashCache
+from ptyme_track.metrics import MetricsRecorder
+from ptyme_track.pending import PendingEvents
 from ptyme_track.signed_time import SignedTime
+from ptyme_track.transport import TransportError
 
 
 class PtymeClientTestBase:
@@ -68,6 +79,19 @@ class TestPtymeClient:
             [mock.call(new_hash, stopped, True), mock.call(new_hash, stopped, False)]
         )
 
+    def test_retrieve_signed_time_uses_transport(self, mocker: MockerFixture) -> None:
+        transport = mocker.Mock()
+        transport.request.return_value = json.dumps(
+            {"server_id": "server", "time": "2023-06-16 22:26:26", "sig": "signature"}
+        ).encode("utf-8")
+
+        client = PtymeClient("", ["a directory"], [], Path(""), transport=transport)
+
+        assert client._retrieve_signed_time() == SignedTime(
+            "server", "2023-06-16 22:26:26", "signature"
+        )
+        transport.request.assert_called_once_with("GET")
+
     class TestRunLoop(PtymeClientTestBase):
         def test_with_empty_watched_dir(self, mocker: MockerFixture) -> None:
             record_time_mock = mocker.patch.object(PtymeClient, "_record_time")
@@ -152,9 +176,34 @@ class TestPtymeClient:
 
             # stops on second call
             assert record_time_mock.call_count == 1
-            assert prev_files_hash == "76aaec7943a73f3174a72c3fa49d7907"
+            assert prev_files_hash == "bdbfa33ba61cd649db7acfe558a6bd56"
             assert stopped is False
 
+        def test_records_scan_metrics(self, mocker: MockerFixture, tmp_path: Path) -> None:
+            mocker.patch.object(PtymeClient, "_record_time")
+            self._watched_path.mkdir()
+            (self._watched_path / "a_file").write_text("some text")
+            (self._watched_path / "node_modules").mkdir()
+            metrics = MetricsRecorder(tmp_path / ".metrics")
+
+            client = PtymeClient(
+                "", self._watched_dirs, ["node_modules"], self._cur_times_path, metrics=metrics
+            )
+            prev_files_hash, stopped = client._run_loop(None, False)
+            client._run_loop(prev_files_hash, stopped)
+
+            first, second = [
+                json.loads(line) for line in (tmp_path / ".metrics").read_text().splitlines()
+            ]
+            assert first["files_scanned"] == 1
+            assert first["files_rehashed"] == 1
+            assert first["bytes_read"] == 9
+            assert first["ignored_entries"] == 1
+            assert first["sleep_drift_sec"] is None
+            assert second["files_rehashed"] == 0
+            assert second["cache_hit_ratio"] == 1.0
+            assert second["sleep_drift_sec"] is not None
+
     class TestGetFilesHash(PtymeClientTestBase):
         @pytest.fixture(autouse=True)
         def setup_2(self) -> None:
@@ -202,7 +251,7 @@ class TestPtymeClient:
 
             result = self._client._get_files_hash(self._watched_dir)
 
-            assert result == "231ce651470e28a49815b51ff3e0d5a3"
+            assert result == "b7cdbee6f7a57ceaa968d97e792dd189"
 
         def test_basic_case(self) -> None:
             inner_file = self._watched_dir / "inner_file"
@@ -210,7 +259,7 @@ class TestPtymeClient:
 
             result = self._client._get_files_hash(self._watched_dir)
 
-            assert result == "231ce651470e28a49815b51ff3e0d5a3"
+            assert result == "3efd03a5915fb6db4dcb095a441886c9"
 
         def test_works_when_watched_dir_is_hidden(self) -> None:
             watched_dir = self._watched_dir / ".hidden"
@@ -221,7 +270,7 @@ class TestPtymeClient:
 
             result = self._client._get_files_hash(watched_dir)
 
-            assert result == "231ce651470e28a49815b51ff3e0d5a3"
+            assert result == "3efd03a5915fb6db4dcb095a441886c9"
 
         def test_sets_file_cache(self) -> None:
             inner_file = self._watched_dir / "some_file"
@@ -241,9 +290,87 @@ class TestPtymeClient:
             result = self._client._get_files_hash(self._watched_dir)
 
             running_hash = hashlib.md5()
-            running_hash.update(b"some hash")
+            running_hash.update(b"some_file\0fsome hash\n")
             assert running_hash.hexdigest() == result
 
+        def test_forgets_deleted_files(self) -> None:
+            inner_file = self._watched_dir / "some_file"
+            inner_file.write_text("Some value")
+            self._client._get_files_hash(self._watched_dir)
+            inner_file.unlink()
+
+            result = self._client._get_files_hash(self._watched_dir)
+
+            assert result == "d41d8cd98f00b204e9800998ecf8427e"
+            assert str(inner_file) not in self._client._file_hash_cache
+
+        def test_parallel_hashing_matches_sequential(self) -> None:
+            for idx in range(20):
+                subdir = self._watched_dir / f"subdir_{idx % 3}"
+                subdir.mkdir(exist_ok=True)
+                (subdir / f"file_{idx}").write_text(f"Some value {idx}")
+            client = PtymeClient("", self._watched_dirs, [], self._cur_times_path, hash_workers=4)
+
+            result = client._get_files_hash(self._watched_dir)
+
+            assert result == self._client._get_files_hash(self._watched_dir)
+            assert client._file_hash_cache == self._client._file_hash_cache
+
+        def test_uses_persistent_cache_on_restart(self, mocker: MockerFixture) -> None:
+            inner_file = self._watched_dir / "some_file"
+            inner_file.write_text("Some value")
+            cache_path = self._watched_dir.parent / ".file_hash_cache"
+            client = PtymeClient(
+                "",
+                self._watched_dirs,
+                [],
+                self._cur_times_path,
+                hash_cache=PersistentHashCache(cache_path),
+            )
+            expected = client._get_files_hash_for_watched_dirs()
+
+            restarted_client = PtymeClient(
+                "",
+                self._watched_dirs,
+                [],
+                self._cur_times_path,
+                hash_cache=PersistentHashCache(cache_path),
+            )
+            hash_contents_spy = mocker.spy(PtymeClient, "_hash_contents")
+
+            assert restarted_client._get_files_hash_for_watched_dirs() == expected
+            hash_contents_spy.assert_not_called()
+
+        def test_rehashes_on_restart_with_another_algorithm(self, mocker: MockerFixture) -> None:
+            inner_file = self._watched_dir / "some_file"
+            inner_file.write_text("Some value")
+            cache_path = self._watched_dir.parent / ".file_hash_cache"
+            PtymeClient(
+                "",
+                self._watched_dirs,
+                [],
+                self._cur_times_path,
+                hash_cache=PersistentHashCache(cache_path),
+            )._get_files_hash_for_watched_dirs()
+
+            restarted_client = PtymeClient(
+                "",
+                self._watched_dirs,
+                [],
+                self._cur_times_path,
+                hash_cache=PersistentHashCache(cache_path),
+                hash_algorithm="blake2b",
+            )
+            hash_contents_spy = mocker.spy(PtymeClient, "_hash_contents")
+
+            result = restarted_client._get_files_hash_for_watched_dirs()
+
+            hash_contents_spy.assert_called_once_with(restarted_client, inner_file)
+            uncached_client = PtymeClient(
+                "", self._watched_dirs, [], self._cur_times_path, hash_algorithm="blake2b"
+            )
+            assert result == uncached_client._get_files_hash_for_watched_dirs()
+
         def test_ignores_ignored_directories(self) -> None:
             node_modules = self._watched_dir / "node_modules"
             node_modules.mkdir()
@@ -255,6 +382,210 @@ class TestPtymeClient:
 
             assert result == "d41d8cd98f00b204e9800998ecf8427e"
 
+        def test_respects_gitignore_when_enabled(self) -> None:
+            client = PtymeClient(
+                "", self._watched_dirs, [], self._cur_times_path, respect_gitignore=True
+            )
+            (self._watched_dir / ".gitignore").write_text("build/\n")
+            build_dir = self._watched_dir / "build"
+            build_dir.mkdir()
+            (build_dir / "output").write_text("Some value")
+
+            result = client._get_files_hash(self._watched_dir)
+
+            assert result == "d41d8cd98f00b204e9800998ecf8427e"
+
+    class TestStatHashStrategy(PtymeClientTestBase):
+        @pytest.fixture(autouse=True)
+        def setup_2(self) -> None:
+            self._client = PtymeClient(
+                "", self._watched_dirs, [], self._cur_times_path, hash_strategy="stat"
+            )
+            self._watched_path.mkdir()
+            self._file = self._watched_path / "a_file"
+            self._file.write_text("Some value")
+
+        def _set_mtime(self, seconds_ago: float) -> None:
+            mtime_ns = time.time_ns() - int(seconds_ago * 1_000_000_000)
+            os.utime(self._file, ns=(mtime_ns, mtime_ns))
+
+        def test_does_not_read_old_files(self, mocker: MockerFixture) -> None:
+            self._set_mtime(60)
+            open_spy = mocker.spy(Path, "open")
+
+            self._client._get_files_hash(self._watched_path)
+
+            open_spy.assert_not_called()
+
+        def test_detects_metadata_changes(self) -> None:
+            self._set_mtime(120)
+            first = self._client._get_files_hash(self._watched_path)
+            self._set_mtime(60)
+
+            assert self._client._get_files_hash(self._watched_path) != first
+
+        def test_reads_recently_modified_files_until_settled(self, mocker: MockerFixture) -> None:
+            open_spy = mocker.spy(Path, "open")
+
+            first = self._client._get_files_hash(self._watched_path)
+            second = self._client._get_files_hash(self._watched_path)
+            self._client._get_files_hash(self._watched_path)
+
+            assert first == second
+            assert open_spy.call_count == 3
+
+        def test_detects_rewrite_with_same_signature(self) -> None:
+            first = self._client._get_files_hash(self._watched_path)
+            stat = self._file.stat()
+            self._file.write_text("Some thing")
+            os.utime(self._file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+            assert self._client._get_files_hash(self._watched_path) != first
+
+        def test_rejects_unknown_strategy(self) -> None:
+            with pytest.raises(ValueError):
+                PtymeClient("", self._watched_dirs, [], hash_strategy="vibes")
+
+    class TestGetChangedFilesHash(PtymeClientTestBase):
+        class FakeChangeSource(ChangeSource):
+            def __init__(self) -> None:
+                self.changed: Optional[ChangedPaths] = None
+
+            def poll(self) -> Optional[ChangedPaths]:
+                return self.changed
+
+        @pytest.fixture(autouse=True)
+        def setup_2(self) -> None:
+            self._change_source = self.FakeChangeSource()
+            self._client = PtymeClient(
+                "",
+                self._watched_dirs,
+                ["node_modules"],
+                self._cur_times_path,
+                change_source=self._change_source,
+            )
+            self._watched_path.mkdir()
+            self._file = self._watched_path / "a_file"
+            self._file.write_text("Some value")
+            self._full_scan_hash = self._client._get_files_hash_for_watched_dirs()
+
+        def test_only_rehashes_changed_files(self, mocker: MockerFixture) -> None:
+            other_file = self._watched_path / "other_file"
+            other_file.write_text("Other value")
+            self._change_source.changed = {str(self._watched_path): {str(other_file)}}
+            hash_file_spy = mocker.spy(PtymeClient, "_hash_file")
+
+            result = self._client._get_files_hash_for_watched_dirs()
+
+            hash_file_spy.assert_called_once_with(self._client, other_file)
+            assert result != self._full_scan_hash
+
+        def test_matches_full_scan(self) -> None:
+            subdir = self._watched_path / "subdir"
+            subdir.mkdir()
+            (subdir / "inner_file").write_text("Inner value")
+            self._change_source.changed = {str(self._watched_path): {str(subdir)}}
+
+            result = self._client._get_files_hash_for_watched_dirs()
+
+            self._change_source.changed = None
+            assert result == self._client._get_files_hash_for_watched_dirs()
+
+        def test_forgets_removed_directories(self) -> None:
+            subdir = self._watched_path / "subdir"
+            subdir.mkdir()
+            (subdir / "inner_file").write_text("Inner value")
+            self._client._get_files_hash_for_watched_dirs()
+            (subdir / "inner_file").unlink()
+            subdir.rmdir()
+            self._change_source.changed = {str(self._watched_path): {str(subdir)}}
+
+            result = self._client._get_files_hash_for_watched_dirs()
+
+            assert result == self._full_scan_hash
+            assert str(subdir / "inner_file") not in self._client._file_hash_cache
+
+        def test_skips_ignored_files(self) -> None:
+            node_modules = self._watched_path / "node_modules"
+            node_modules.mkdir()
+            ignored_file = node_modules / "inner_file"
+            ignored_file.write_text("Some value")
+            self._change_source.changed = {str(self._watched_path): {str(ignored_file)}}
+
+            result = self._client._get_files_hash_for_watched_dirs()
+
+            assert result == self._full_scan_hash
+
+    @pytest.mark.skipif(not shutil.which("git"), reason="requires git")
+    class TestGetChangedGitFilesHash(PtymeClientTestBase):
+        @pytest.fixture(autouse=True)
+        def setup_2(self) -> None:
+            self._change_source = TestPtymeClient.TestGetChangedFilesHash.FakeChangeSource()
+            self._client = PtymeClient(
+                "",
+                self._watched_dirs,
+                [],
+                self._cur_times_path,
+                change_source=self._change_source,
+                respect_gitignore=True,
+            )
+            self._watched_path.mkdir()
+            subprocess.run(["git", "init", "-q"], cwd=self._watched_path, check=True)
+            (self._watched_path / ".gitignore").write_text("build/\n")
+            (self._watched_path / ".git" / "info" / "exclude").write_text("*.log\n")
+            self._build_file = self._watched_path / "build" / "conf.json"
+            self._build_file.parent.mkdir()
+            self._build_file.write_text("{}")
+            subprocess.run(
+                ["git", "add", "-f", "build/conf.json"], cwd=self._watched_path, check=True
+            )
+            self._full_scan_hash = self._client._get_files_hash_for_watched_dirs()
+
+        def _assert_matches_full_scan(self, result: str) -> None:
+            self._change_source.changed = None
+            assert result == self._client._get_files_hash_for_watched_dirs()
+
+        def test_detects_tracked_file_in_ignored_dir(self) -> None:
+            self._build_file.write_text('{"changed": true}')
+            self._change_source.changed = {str(self._watched_path): {str(self._build_file)}}
+
+            result = self._client._get_files_hash_for_watched_dirs()
+
+            assert result != self._full_scan_hash
+            self._assert_matches_full_scan(result)
+
+        def test_skips_file_excluded_by_info_exclude(self) -> None:
+            log_file = self._watched_path / "debug.log"
+            log_file.write_text("Some value")
+            self._change_source.changed = {str(self._watched_path): {str(log_file)}}
+
+            result = self._client._get_files_hash_for_watched_dirs()
+
+            assert result == self._full_scan_hash
+            self._assert_matches_full_scan(result)
+
+        def test_detects_new_untracked_file(self) -> None:
+            new_file = self._watched_path / "new_file"
+            new_file.write_text("Some value")
+            self._change_source.changed = {str(self._watched_path): {str(new_file)}}
+
+            result = self._client._get_files_hash_for_watched_dirs()
+
+            assert result != self._full_scan_hash
+            self._assert_matches_full_scan(result)
+
+        def test_new_directory_with_ignored_file(self) -> None:
+            subdir = self._watched_path / "subdir"
+            subdir.mkdir()
+            (subdir / "inner_file").write_text("Inner value")
+            (subdir / "inner.log").write_text("Inner value")
+            self._change_source.changed = {str(self._watched_path): {str(subdir)}}
+
+            result = self._client._get_files_hash_for_watched_dirs()
+
+            assert result != self._full_scan_hash
+            self._assert_matches_full_scan(result)
+
     class TestPerformRecordTime(PtymeClientTestBase):
         @freezegun.freeze_time("2020-01-02 03:04:05")
         def test_perform_record_time(self) -> None:
@@ -277,3 +608,215 @@ class TestPtymeClient:
                 )
                 + "\n"
             )
+
+    class TestOfflineBuffering(PtymeClientTestBase):
+        @pytest.fixture(autouse=True)
+        def setup_2(self) -> None:
+            self._ptyme_track_dir.mkdir()
+            self._pending = PendingEvents(self._ptyme_track_dir / ".pending")
+            self._client = PtymeClient(
+                "", self._watched_dirs, [], self._cur_times_path, pending=self._pending
+            )
+            self._signed_time = SignedTime("server_id", "2020-01-02 03:10:00", "sig")
+
+        def _records(self) -> list:
+            if not self._cur_times_path.exists():
+                return []
+            return [json.loads(line) for line in self._cur_times_path.read_text().splitlines()]
+
+        @freezegun.freeze_time("2020-01-02 03:04:05")
+        def test_queues_records_while_server_is_unreachable(self) -> None:
+            self._mock_signed_time.side_effect = TransportError("unreachable")
+
+            self._client._record_time("hash")
+
+            assert self._records() == []
+            assert self._pending.peek(10) == [
+                {"time": "2020-01-02 03:04:05", "hash": "hash", "stop": False}
+            ]
+
+        @freezegun.freeze_time("2020-01-02 03:04:05")
+        def test_drains_with_delayed_marker(self) -> None:
+            self._mock_signed_time.side_effect = TransportError("unreachable")
+            self._client._record_time("hash 1")
+            self._mock_signed_time.side_effect = None
+            self._mock_signed_time.return_value = self._signed_time
+            # queued behind the pending record to keep the order
+            self._client._record_time("hash 2", stop=True)
+
+            assert self._client._drain_pending() == 2
+
+            records = self._records()
+            assert [record["hash"] for record in records] == ["hash 1", "hash 2"]
+            assert all(record["signing_delayed"] for record in records)
+            assert records[0]["time"] == "2020-01-02 03:04:05"
+            assert records[0]["signed_time"]["time"] == "2020-01-02 03:10:00"
+            assert records[1]["stop"] is True
+            assert not self._pending
+
+        def test_keeps_events_the_server_did_not_sign(self) -> None:
+            self._mock_signed_time.side_effect = TransportError("unreachable")
+            self._client._record_time("hash 1")
+            self._client._record_time("hash 2")
+            self._mock_signed_time.side_effect = [self._signed_time, TransportError("again")]
+
+            assert self._client._drain_pending() == 1
+
+            assert [record["hash"] for record in self._records()] == ["hash 1"]
+            assert [event["hash"] for event in self._pending.peek(10)] == ["hash 2"]
+
+        def test_signs_directly_when_nothing_is_pending(self) -> None:
+            self._mock_signed_time.return_value = self._signed_time
+
+            self._client._record_time("hash")
+
+            assert "signing_delayed" not in self._records()[0]
+            assert not self._pending
+
+    class TestSigningPipeline(PtymeClientTestBase):
+        @pytest.fixture(autouse=True)
+        def setup_2(self, mocker: MockerFixture) -> None:
+            mocker.patch("ptyme_track.client.PTYME_SIGN_QUEUE_SIZE", 2)
+            self._ptyme_track_dir.mkdir()
+            self._pending = PendingEvents(self._ptyme_track_dir / ".pending")
+            self._client = PtymeClient(
+                "", self._watched_dirs, [], self._cur_times_path, pending=self._pending
+            )
+            self._signed_time = SignedTime("server_id", "2020-01-02 03:10:00", "sig")
+
+        def test_run_loop_does_not_wait_for_the_server(self) -> None:
+            release = threading.Event()
+
+            def slow_server() -> SignedTime:
+                release.wait(5)
+                return self._signed_time
+
+            self._mock_signed_time.side_effect = slow_server
+            self._client._start_signer()
+
+            start = time.perf_counter()
+            self._client._run_loop(None, False)
+            elapsed = time.perf_counter() - start
+            release.set()
+            for _ in range(100):
+                if self._cur_times_path.exists():
+                    break
+                time.sleep(0.05)
+
+            assert elapsed < 1
+            assert json.loads(self._cur_times_path.read_text())["signed_time"]["sig"] == "sig"
+
+        def test_spills_a_full_queue_in_order(self, mocker: MockerFixture) -> None:
+            # a signer that never gets to the queue
+            self._client._signer = mocker.Mock()
+
+            for idx in range(3):
+                self._client._record_time(f"hash {idx}")
+
+            assert [event["hash"] for event in self._pending.peek(10)] == [
+                "hash 0",
+                "hash 1",
+                "hash 2",
+            ]
+
+        def test_drops_oldest_activity_when_full_without_pending(
+            self, mocker: MockerFixture, caplog: pytest.LogCaptureFixture
+        ) -> None:
+            client = PtymeClient("", self._watched_dirs, [], self._cur_times_path)
+            # a signer stuck on an unreachable server
+            client._signer = mocker.Mock()
+
+            client._record_time("hash 0", stop=True)
+            for idx in range(1, 4):
+                client._record_time(f"hash {idx}")
+
+            queued = [client._sign_queue.get_nowait() for _ in range(2)]
+            assert [event and event["hash"] for event in queued] == ["hash 0", "hash 3"]
+            assert "Sign queue is full" in caplog.text
+
+        @pytest.mark.parametrize(
+            ("signed_at", "delayed"),
+            [("2020-01-02 03:04:06", False), ("2020-01-02 03:10:00", True)],
+        )
+        def test_records_when_activity_was_detected(self, signed_at: str, delayed: bool) -> None:
+            self._client._sign_queue.put(
+                {"time": "2020-01-02 03:04:05", "hash": "hash", "stop": False}
+            )
+            self._mock_signed_time.return_value = self._signed_time
+
+            with freezegun.freeze_time(signed_at):
+                self._client._sign_next()
+
+            record = json.loads(self._cur_times_path.read_text())
+            assert record["time"] == "2020-01-02 03:04:05"
+            assert record.get("signing_delayed", False) is delayed
+
+        def test_puts_failed_event_in_front_of_pending(self) -> None:
+            self._client._sign_queue.put({"time": "t", "hash": "older", "stop": False})
+
+            def fail() -> SignedTime:
+                # newer activity spilled while the server was being asked
+                self._pending.append({"time": "t", "hash": "newer", "stop": False})
+                raise TransportError("unreachable")
+
+            self._mock_signed_time.side_effect = fail
+
+            self._client._sign_next()
+
+            assert [event["hash"] for event in self._pending.peek(10)] == ["older", "newer"]
+
+        def _spill_newer_after_get(self) -> None:
+            sign_queue = self._client._sign_queue
+            get = sign_queue.get
+
+            def get_then_spill(*args, **kwargs):
+                event = get(*args, **kwargs)
+                # the producer fills the queue and spills it before the signer checks
+                patched.stop()
+                sign_queue.put({"time": "t", "hash": "newer", "stop": False})
+                self._client._spill_sign_queue({"time": "t", "hash": "newest", "stop": False})
+                return event
+
+            patched = mock.patch.object(sign_queue, "get", side_effect=get_then_spill)
+            patched.start()
+
+        def test_keeps_event_in_front_of_events_spilled_after_it(self) -> None:
+            self._client._sign_queue.put({"time": "t", "hash": "older", "stop": False})
+            self._spill_newer_after_get()
+
+            self._client._sign_next()
+
+            assert [event["hash"] for event in self._pending.peek(10)] == [
+                "older",
+                "newer",
+                "newest",
+            ]
+
+        def test_keeps_event_behind_events_pending_before_it(self, mocker: MockerFixture) -> None:
+            self._pending.append({"time": "t", "hash": "oldest", "stop": False})
+            self._client._sign_queue.put({"time": "t", "hash": "older", "stop": False})
+            self._mock_signed_time.side_effect = TransportError("unreachable")
+            self._spill_newer_after_get()
+
+            self._client._sign_next()
+
+            assert [event["hash"] for event in self._pending.peek(10)] == [
+                "oldest",
+                "older",
+                "newer",
+                "newest",
+            ]
+
+        def test_drains_pending_before_the_queue(self) -> None:
+            self._pending.append({"time": "t", "hash": "older", "stop": False})
+            self._client._sign_queue.put(
+                {"time": "2020-01-02 03:04:05", "hash": "newer", "stop": False}
+            )
+            self._mock_signed_time.return_value = self._signed_time
+
+            self._client._sign_next()
+
+            hashes = [
+                json.loads(line)["hash"] for line in self._cur_times_path.read_text().splitlines()
+            ]
+            assert hashes == ["older", "newer"]
@@ -0,0 +1,77 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+from ptyme_track import file_hashing
+from ptyme_track.file_hashing import hash_file, new_hash
+
+
+class TestHashFile:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self.contents = b"Some value" * 1000
+        self.file = tmp_path / "a_file"
+        self.file.write_bytes(self.contents)
+
+    def test_matches_hashing_whole_contents(self) -> None:
+        result = hash_file(self.file)
+
+        assert result.hexdigest == hashlib.md5(self.contents).hexdigest()
+        assert result.bytes_read == len(self.contents)
+
+    def test_reads_in_chunks(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(file_hashing, "CHUNK_SIZE", 7)
+
+        assert hash_file(self.file).hexdigest == hashlib.md5(self.contents).hexdigest()
+
+    def test_file_truncated_while_hashing(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(file_hashing, "CHUNK_SIZE", 1024)
+        file_hash = hashlib.md5()
+        file = self.file
+
+        class TruncatingHash:
+            def update(self, data: bytes) -> None:
+                # another process rewrites the file after the first chunk was read
+                os.truncate(file, 0)
+                file_hash.update(data)
+
+            def hexdigest(self) -> str:
+                return file_hash.hexdigest()
+
+        monkeypatch.setattr(file_hashing, "new_hash", lambda algorithm: TruncatingHash())
+
+        assert hash_file(self.file) == (hashlib.md5(self.contents[:1024]).hexdigest(), 1024)
+
+    def test_empty_file(self, tmp_path: Path) -> None:
+        empty = tmp_path / "empty"
+        empty.write_bytes(b"")
+
+        assert hash_file(empty).hexdigest == hashlib.md5().hexdigest()
+
+    def test_blake2b(self) -> None:
+        expected = hashlib.blake2b(self.contents, digest_size=16).hexdigest()
+
+        assert hash_file(self.file, "blake2b").hexdigest == expected
+
+    def test_oversized_files_are_not_read(self) -> None:
+        result = hash_file(self.file, max_size=10)
+        assert result.bytes_read == 0
+        stat = self.file.stat()
+        self.file.write_bytes(self.contents[::-1])
+        os.utime(self.file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        assert result.hexdigest != hashlib.md5(self.contents).hexdigest()
+        assert hash_file(self.file, max_size=10) == result
+
+
+def test_new_hash_rejects_unknown_algorithm() -> None:
+    with pytest.raises(ValueError):
+        new_hash("crc32")
+
+
+@pytest.mark.skipif(file_hashing.xxhash is not None, reason="xxhash is installed")
+def test_new_hash_requires_xxhash_package() -> None:
+    with pytest.raises(ValueError):
+        new_hash("xxhash")
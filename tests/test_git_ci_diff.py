@@ -0,0 +1,87 @@
+import json
+import subprocess
+from pathlib import Path
+from shutil import which
+from typing import Optional
+
+import pytest
+
+from ptyme_track.git_ci_diff import display_git_ci_diff_times
+
+pytestmark = pytest.mark.skipif(not which("git"), reason="git is not installed")
+
+
+def _git(*args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        check=True,
+        capture_output=True,
+    )
+
+
+def _record(time_str: str, branch: Optional[str]) -> str:
+    return json.dumps(
+        {"signed_time": {"server_id": "id", "time": time_str, "sig": "sig"}, "git-branch": branch}
+    )
+
+
+class TestDisplayGitCiDiffTimes:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.chdir(tmp_path)
+        self.ptyme_dir = tmp_path / ".ptyme_track"
+        self.ptyme_dir.mkdir()
+        (self.ptyme_dir / ".gitignore").write_text("*.tmp\n")
+        (self.ptyme_dir / "alice").write_text(_record("2023-06-15 10:00:00", "old") + "\n")
+        _git("init", "-q", "-b", "main")
+        _git("add", ".")
+        _git("commit", "-q", "-m", "base")
+        _git("checkout", "-q", "-b", "feature")
+
+    def _commit(self, user: str, *lines: str) -> None:
+        with (self.ptyme_dir / user).open("a") as times_file:
+            times_file.writelines(line + "\n" for line in lines)
+        _git("add", ".")
+        _git("commit", "-q", "-m", user)
+
+    def test_reports_added_time_per_user(self, capsys: pytest.CaptureFixture) -> None:
+        self._commit(
+            "alice",
+            _record("2023-06-16 10:00:00", "feature"),
+            _record("2023-06-16 10:04:00", "feature"),
+        )
+        self._commit("bob", _record("2023-06-16 11:00:00", None))
+
+        display_git_ci_diff_times("main")
+
+        assert capsys.readouterr().out == (
+            "Ptyme Track total time logged:\nalice: 0:04:00\nbob: 0:00:00\n"
+        )
+
+    def test_reports_feature_branch_time(self, capsys: pytest.CaptureFixture) -> None:
+        self._commit(
+            "alice",
+            _record("2023-06-16 10:00:00", "feature"),
+            _record("2023-06-16 10:04:00", "other"),
+            _record("2023-06-16 10:08:00", "feature"),
+        )
+        self._commit("bob", _record("2023-06-16 11:00:00", "other"))
+
+        display_git_ci_diff_times("main", "feature")
+
+        assert capsys.readouterr().out == (
+            "Ptyme Track total time logged:\n"
+            "alice: 0:20:00 [0:18:00 across all branches]\n"
+            "bob: 0:00:00\n"
+        )
+
+    def test_ignores_gitignore_changes(self, capsys: pytest.CaptureFixture) -> None:
+        self._commit(".gitignore", "*.log")
+
+        display_git_ci_diff_times("main")
+
+        assert capsys.readouterr().out == "Ptyme Track total time logged:\n"
+
+    def test_git_failure_raises(self) -> None:
+        with pytest.raises(Exception, match="git diff"):
+            display_git_ci_diff_times("no-such-branch")
@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import pytest
+
+from ptyme_track import hash_cache
+from ptyme_track.hash_cache import PersistentHashCache, StatSignature
+
+
+class TestPersistentHashCache:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self.cache_path = tmp_path / ".file_hash_cache"
+        self.signature = StatSignature(10, 1234, 5)
+
+    def test_survives_reload(self) -> None:
+        cache = PersistentHashCache(self.cache_path)
+        cache.put("a_file", self.signature, b"abc123")
+        cache.flush()
+
+        reloaded = PersistentHashCache(self.cache_path)
+
+        assert reloaded.get("a_file", self.signature) == b"abc123"
+
+    def test_misses_when_signature_changes(self) -> None:
+        cache = PersistentHashCache(self.cache_path)
+        cache.put("a_file", self.signature, b"abc123")
+
+        assert cache.get("a_file", self.signature._replace(mtime_ns=4321)) is None
+
+    def test_removal_survives_reload(self) -> None:
+        cache = PersistentHashCache(self.cache_path)
+        cache.put("a_file", self.signature, b"abc123")
+        cache.flush()
+        cache.remove("a_file")
+        cache.flush()
+
+        reloaded = PersistentHashCache(self.cache_path)
+
+        assert reloaded.get("a_file", self.signature) is None
+
+    def test_flush_only_appends_changes(self) -> None:
+        cache = PersistentHashCache(self.cache_path)
+        cache.put("a_file", self.signature, b"abc123")
+        cache.flush()
+        cache.put("a_file", self.signature, b"abc123")
+        cache.put("b_file", self.signature, b"def456")
+        cache.flush()
+
+        # the scheme and the two entries
+        assert len(self.cache_path.read_text().splitlines()) == 3
+
+    def test_skips_partially_written_lines(self) -> None:
+        self.cache_path.write_text('{}\n["a_file", 10, 1234, 5, "abc123"]\n["b_file", 10')
+
+        cache = PersistentHashCache(self.cache_path)
+
+        assert cache.get("a_file", self.signature) == b"abc123"
+        assert cache.get("b_file", self.signature) is None
+
+    def test_compacts_stale_lines(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(hash_cache, "COMPACT_SLACK", 0)
+        cache = PersistentHashCache(self.cache_path)
+        for mtime_ns in range(5):
+            cache.put("a_file", self.signature._replace(mtime_ns=mtime_ns), b"abc123")
+            cache.flush()
+
+        assert len(self.cache_path.read_text().splitlines()) <= 2
+        assert PersistentHashCache(self.cache_path).get(
+            "a_file", self.signature._replace(mtime_ns=4)
+        )
+
+    def test_discards_hashes_of_another_scheme(self) -> None:
+        cache = PersistentHashCache(self.cache_path, {"algorithm": "md5"})
+        cache.put("a_file", self.signature, b"abc123")
+        cache.flush()
+
+        assert PersistentHashCache(self.cache_path, {"algorithm": "md5"}).get(
+            "a_file", self.signature
+        )
+        other = PersistentHashCache(self.cache_path, {"algorithm": "blake2b"})
+        assert other.get("a_file", self.signature) is None
+        other.put("b_file", self.signature, b"def456")
+        other.flush()
+
+        reloaded = PersistentHashCache(self.cache_path, {"algorithm": "blake2b"})
+        assert reloaded.get("a_file", self.signature) is None
+        assert reloaded.get("b_file", self.signature) == b"def456"
@@ -0,0 +1,74 @@
+import hashlib
+
+from pytest_mock import MockerFixture
+
+from ptyme_track import merkle
+from ptyme_track.merkle import MerkleTree
+
+
+class TestMerkleTree:
+    def test_empty_tree(self) -> None:
+        assert MerkleTree().hexdigest() == hashlib.md5().hexdigest()
+
+    def test_is_independent_of_insertion_order(self) -> None:
+        paths = ["b/c/d", "a", "b/e", "f/g"]
+        first = MerkleTree()
+        second = MerkleTree()
+        for path in paths:
+            first.set(path, path.encode("utf-8"))
+        for path in reversed(paths):
+            second.set(path, path.encode("utf-8"))
+
+        assert first.hexdigest() == second.hexdigest()
+
+    def test_changes_when_a_file_changes(self) -> None:
+        tree = MerkleTree()
+        tree.set("a/b", b"hash")
+        before = tree.hexdigest()
+
+        tree.set("a/b", b"other hash")
+
+        assert tree.hexdigest() != before
+
+    def test_only_recomputes_changed_path(self, mocker: MockerFixture) -> None:
+        tree = MerkleTree()
+        tree.set("a/b/c", b"hash")
+        tree.set("d/e", b"hash")
+        tree.hexdigest()
+        digest_spy = mocker.spy(merkle, "_digest")
+
+        tree.set("a/b/c", b"other hash")
+        tree.hexdigest()
+
+        # the root, a, b and a cached lookup of d
+        assert digest_spy.call_count == 4
+
+    def test_remove_prunes_empty_directories(self) -> None:
+        tree = MerkleTree()
+        tree.set("a", b"hash")
+        before = tree.hexdigest()
+        tree.set("b/c/d", b"hash")
+
+        assert tree.remove("b/c/d")
+
+        assert tree.hexdigest() == before
+        assert list(tree.iter_files()) == ["a"]
+
+    def test_remove_directory(self) -> None:
+        tree = MerkleTree()
+        tree.set("a/b", b"hash")
+        tree.set("a/c/d", b"hash")
+
+        assert tree.remove("a")
+        assert not tree.remove("a")
+        assert list(tree.iter_files()) == []
+
+    def test_iter_files_below_path(self) -> None:
+        tree = MerkleTree()
+        tree.set("a/b", b"hash")
+        tree.set("a/c/d", b"hash")
+        tree.set("e", b"hash")
+
+        assert sorted(tree.iter_files("a")) == ["a/b", "a/c/d"]
+        assert list(tree.iter_files("e")) == ["e"]
+        assert list(tree.iter_files("missing/path")) == []
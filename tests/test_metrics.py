@@ -0,0 +1,55 @@
+import json
+import socket
+import urllib.request
+from pathlib import Path
+
+from pytest_mock import MockerFixture
+
+from ptyme_track.metrics import MetricsRecorder, ScanMetrics
+
+
+class TestScanMetrics:
+    def test_cache_hit_ratio(self) -> None:
+        assert ScanMetrics(files_scanned=4, files_rehashed=1).cache_hit_ratio == 0.75
+
+    def test_cache_hit_ratio_without_files(self) -> None:
+        assert ScanMetrics().cache_hit_ratio is None
+
+
+class TestMetricsRecorder:
+    def test_record_appends_json_lines(self, tmp_path: Path) -> None:
+        path = tmp_path / ".metrics"
+        recorder = MetricsRecorder(path)
+
+        recorder.record(ScanMetrics(files_scanned=2))
+        recorder.record(ScanMetrics(files_scanned=3))
+
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [line["files_scanned"] for line in lines] == [2, 3]
+        assert recorder.latest == lines[-1]
+
+    def test_record_rotates_big_files(self, tmp_path: Path, mocker: MockerFixture) -> None:
+        mocker.patch("ptyme_track.metrics.MAX_METRICS_FILE_SIZE", 10)
+        path = tmp_path / ".metrics"
+        path.write_text("x" * 20)
+
+        MetricsRecorder(path).record(ScanMetrics())
+
+        assert (tmp_path / ".metrics.1").read_text() == "x" * 20
+        assert len(path.read_text().splitlines()) == 1
+
+    def test_serves_latest_metrics(self) -> None:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        recorder = MetricsRecorder(None, port)
+        recorder.start()
+        try:
+            recorder.record(ScanMetrics(bytes_read=42))
+
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/") as response:
+                served = json.loads(response.read().decode("utf-8"))
+        finally:
+            recorder.close()
+
+        assert served["bytes_read"] == 42
@@ -0,0 +1,100 @@
+import json
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from ptyme_track.parallel_validation import split_on_lines, validate_files_parallel
+from ptyme_track.signature import signature_from_time
+from ptyme_track.time_blocks import get_time_blocks
+from ptyme_track.validation import validate_entries
+from ptyme_track.verify_cache import VerificationCache
+
+
+def _write_times(file: Path, count: int, forged_every: int) -> None:
+    with file.open("w") as times_file:
+        for idx in range(count):
+            time_str = f"2023-06-16 22:{idx // 60:02}:{idx % 60:02}"
+            sig = "forged" if idx % forged_every == 0 else signature_from_time("secret", time_str)
+            times_file.write(
+                json.dumps({"signed_time": {"server_id": "id", "time": time_str, "sig": sig}})
+                + "\n"
+            )
+        times_file.write("not json\n")
+
+
+class TestSplitOnLines:
+    def test_ranges_cover_whole_lines(self, tmp_path: Path) -> None:
+        file = tmp_path / "user"
+        file.write_bytes(b"a\nbbbbbbbb\ncc\nd")
+
+        ranges = split_on_lines(file, 3)
+
+        data = file.read_bytes()
+        assert [data[start:end] for start, end in ranges] == [b"a\nbbbbbbbb\n", b"cc\n", b"d"]
+
+    def test_empty_file(self, tmp_path: Path) -> None:
+        file = tmp_path / "user"
+        file.write_bytes(b"")
+
+        assert split_on_lines(file, 3) == []
+
+
+class TestValidateFilesParallel:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self.cache_path = tmp_path / ".verify_cache"
+        self.files: List[Path] = []
+        for idx, count in enumerate([500, 120]):
+            file = tmp_path / f"user_{idx}"
+            _write_times(file, count, forged_every=7 + idx)
+            self.files.append(file)
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_matches_serial_validation(self, workers: int) -> None:
+        results = validate_files_parallel(self.files, "secret", workers, chunk_bytes=2000)
+
+        assert results == [validate_entries(file, "secret") for file in self.files]
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_fills_verify_cache(self, workers: int) -> None:
+        cache = VerificationCache(self.cache_path, "secret")
+
+        results = validate_files_parallel(
+            self.files, "secret", workers, chunk_bytes=2000, verify_cache=cache
+        )
+
+        assert results == [validate_entries(file, "secret") for file in self.files]
+        for valid, invalid in results:
+            for entry in valid:
+                assert cache.is_verified(
+                    entry["signed_time"]["time"], entry["signed_time"]["sig"]
+                )
+            for invalid_entry in invalid:
+                assert isinstance(invalid_entry, str) or not cache.is_verified(
+                    invalid_entry["signed_time"]["time"], invalid_entry["signed_time"]["sig"]
+                )
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_uses_verify_cache(self, workers: int) -> None:
+        cache = VerificationCache(self.cache_path, "secret")
+        # vouch for the first record, which is forged, to see the cache is consulted
+        cache.add("2023-06-16 22:00:00", "forged")
+
+        valid, invalid = validate_files_parallel(
+            self.files[:1], "secret", workers, chunk_bytes=2000, verify_cache=cache
+        )[0]
+
+        assert valid[0]["signed_time"]["sig"] == "forged"
+        assert len(invalid) == len(validate_entries(self.files[0], "secret")[1]) - 1
+
+    def test_time_blocks_fill_verify_cache_on_workers(self) -> None:
+        cache = VerificationCache(self.cache_path, "secret")
+        expected = get_time_blocks(self.files[0], "secret")
+
+        assert get_time_blocks(self.files[0], "secret", verify_cache=cache, workers=2) == expected
+
+        reloaded = VerificationCache(self.cache_path, "secret")
+        assert reloaded.is_verified(
+            "2023-06-16 22:00:01", signature_from_time("secret", "2023-06-16 22:00:01")
+        )
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from ptyme_track.pending import PendingEvents
+
+
+class TestPendingEvents:
+    def test_is_empty_without_file(self, tmp_path: Path) -> None:
+        assert not PendingEvents(tmp_path / ".pending")
+
+    def test_peek_returns_oldest_first(self, tmp_path: Path) -> None:
+        pending = PendingEvents(tmp_path / ".pending")
+        for idx in range(3):
+            pending.append({"idx": idx})
+
+        assert pending
+        assert pending.peek(2) == [{"idx": 0}, {"idx": 1}]
+
+    def test_pop_removes_oldest(self, tmp_path: Path) -> None:
+        pending = PendingEvents(tmp_path / ".pending")
+        for idx in range(3):
+            pending.append({"idx": idx})
+
+        pending.pop(2)
+
+        assert pending.peek(10) == [{"idx": 2}]
+        pending.pop(1)
+        assert not pending
+
+    def test_survives_torn_lines(self, tmp_path: Path) -> None:
+        path = tmp_path / ".pending"
+        pending = PendingEvents(path)
+        pending.append({"idx": 0})
+        with path.open("a") as pending_file:
+            pending_file.write('{"idx": ')
+
+        pending.append({"idx": 1})
+
+        assert pending.peek(10) == [{"idx": 0}, {"idx": 1}]
+        pending.pop(2)
+        assert not pending
+
+    def test_insert_behind_oldest(self, tmp_path: Path) -> None:
+        pending = PendingEvents(tmp_path / ".pending")
+        for idx in (0, 2):
+            pending.append({"idx": idx})
+
+        pending.insert(1, {"idx": 1})
+        pending.push_front({"idx": -1})
+
+        assert len(pending) == 4
+        assert pending.peek(10) == [{"idx": -1}, {"idx": 0}, {"idx": 1}, {"idx": 2}]
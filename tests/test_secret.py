@@ -0,0 +1,45 @@
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from ptyme_track.secret import SecretProvider
+from ptyme_track.signature import signature_from_time
+
+
+class TestSecretProvider:
+    @pytest.fixture(autouse=True)
+    def setup(self, mocker: MockerFixture, tmp_path: Path) -> None:
+        self.now = 100.0
+        mocker.patch("time.monotonic", side_effect=lambda: self.now)
+        self.secret_file = tmp_path / ".ptyme.secret"
+        self.secret_file.write_text("the secret\n")
+        self.provider = SecretProvider(self.secret_file, check_interval_sec=1, fallback="other")
+
+    def test_signature_matches_signature_from_time(self) -> None:
+        assert self.provider.signature("2023-06-16 22:26:26") == signature_from_time(
+            "the secret", "2023-06-16 22:26:26"
+        )
+
+    def test_reads_the_file_once(self, mocker: MockerFixture) -> None:
+        read_spy = mocker.spy(Path, "read_text")
+
+        for _ in range(3):
+            self.provider.signature("2023-06-16 22:26:26")
+        self.now += 5
+        self.provider.signature("2023-06-16 22:26:26")
+
+        assert read_spy.call_count == 1
+
+    def test_picks_up_rotated_secret_after_interval(self) -> None:
+        assert self.provider.secret == "the secret"
+        self.secret_file.write_text("a rotated secret, with a different size")
+
+        assert self.provider.secret == "the secret"
+        self.now += 1
+        assert self.provider.secret == "a rotated secret, with a different size"
+
+    def test_uses_fallback_without_file(self) -> None:
+        self.secret_file.unlink()
+
+        assert self.provider.secret == "other"
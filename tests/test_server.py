@@ -0,0 +1,147 @@
+import http.client
+import json
+import socket
+import threading
+import time
+from typing import Iterator
+
+import pytest
+from pytest_mock import MockerFixture
+
+from ptyme_track.server import (
+    BATCH_VALIDATE_PATH,
+    BoundedThreadingHTTPServer,
+    MyRequestHandler,
+)
+
+
+class TestBoundedThreadingHTTPServer:
+    @pytest.fixture
+    def server(self) -> Iterator[BoundedThreadingHTTPServer]:
+        httpd = BoundedThreadingHTTPServer(("127.0.0.1", 0), MyRequestHandler, max_workers=2)
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.start()
+        yield httpd
+        httpd.shutdown()
+        httpd.server_close()
+        thread.join()
+
+    def _connect(self, httpd: BoundedThreadingHTTPServer) -> http.client.HTTPConnection:
+        host, port = httpd.server_address[:2]
+        return http.client.HTTPConnection(str(host), port, timeout=5)
+
+    def test_keeps_connections_alive(self, server: BoundedThreadingHTTPServer) -> None:
+        conn = self._connect(server)
+        conn.request("GET", "/")
+        first = json.loads(conn.getresponse().read())
+        sock = conn.sock
+        conn.request("GET", "/")
+        second = json.loads(conn.getresponse().read())
+        reused = conn.sock is sock
+        conn.close()
+
+        assert reused
+        assert first["server_id"] == second["server_id"]
+
+    def test_stalled_client_does_not_block_others(
+        self, server: BoundedThreadingHTTPServer
+    ) -> None:
+        # connects but never sends a request
+        stalled = socket.create_connection(("127.0.0.1", server.server_address[1]))
+        try:
+            start = time.perf_counter()
+            conn = self._connect(server)
+            conn.request("GET", "/")
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+        finally:
+            stalled.close()
+
+        assert response.status == 200
+        assert time.perf_counter() - start < 1
+
+    def test_validates_signed_time(self, server: BoundedThreadingHTTPServer) -> None:
+        conn = self._connect(server)
+        conn.request("GET", "/")
+        signed_time = conn.getresponse().read()
+        conn.request("POST", "/", body=signed_time)
+        result = json.loads(conn.getresponse().read())
+        conn.close()
+
+        assert result["sig_matches"] is True
+
+    def test_rejects_invalid_json(self, server: BoundedThreadingHTTPServer) -> None:
+        conn = self._connect(server)
+        conn.request("POST", "/", body=b"not json")
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+
+        assert response.status == 400
+
+    def test_rejects_big_requests(self, server: BoundedThreadingHTTPServer) -> None:
+        conn = self._connect(server)
+        conn.request("POST", "/", body=b"x" * 2000)
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+
+        assert response.status == 413
+
+    def test_rejects_no_workers(self) -> None:
+        with pytest.raises(ValueError):
+            BoundedThreadingHTTPServer(("127.0.0.1", 0), MyRequestHandler, max_workers=0)
+
+    def test_validates_batches(self, server: BoundedThreadingHTTPServer) -> None:
+        conn = self._connect(server)
+        conn.request("GET", "/")
+        signed_time = json.loads(conn.getresponse().read())
+        forged = {**signed_time, "sig": "0" * 64}
+        body = "\n".join(
+            [
+                json.dumps(signed_time),
+                json.dumps({"time": signed_time["time"], "signed_time": signed_time}),
+                "",
+                json.dumps(forged),
+                "not json",
+            ]
+        ).encode("utf-8")
+        conn.request("POST", BATCH_VALIDATE_PATH, body=body)
+        response = conn.getresponse()
+        results = [json.loads(line) for line in response.read().splitlines()]
+        # the connection is still usable afterwards
+        conn.request("GET", "/")
+        conn.getresponse().read()
+        conn.close()
+
+        assert response.status == 200
+        assert [result["line"] for result in results] == [1, 2, 4, 5]
+        assert [result.get("sig_matches") for result in results] == [True, True, False, None]
+        assert results[3]["error"] == "invalid signed time"
+
+    def test_rejects_long_batch_lines(
+        self, server: BoundedThreadingHTTPServer, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("ptyme_track.server.MAX_BATCH_LINE_BYTES", 100)
+        conn = self._connect(server)
+        conn.request("POST", BATCH_VALIDATE_PATH, body=b"x" * 250 + b"\n" + b"{}\n")
+        results = [json.loads(line) for line in conn.getresponse().read().splitlines()]
+        conn.close()
+
+        assert results == [
+            {"line": 1, "error": "line too long"},
+            {"line": 2, "error": "invalid signed time"},
+        ]
+
+    def test_rejects_big_batches(
+        self, server: BoundedThreadingHTTPServer, mocker: MockerFixture
+    ) -> None:
+        mocker.patch("ptyme_track.server.PTYME_SERVER_MAX_BATCH_BYTES", 100)
+        conn = self._connect(server)
+        conn.request("POST", BATCH_VALIDATE_PATH, body=b"x" * 200)
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+
+        assert response.status == 413
@@ -0,0 +1,68 @@
+import logging
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from ptyme_track.throttle import ScanGovernor
+
+
+class TestScanGovernor:
+    @pytest.fixture(autouse=True)
+    def setup(self, mocker: MockerFixture) -> None:
+        self.wall = 0.0
+        self.cpu = 0.0
+        mocker.patch("time.perf_counter", side_effect=lambda: self.wall)
+        mocker.patch("time.process_time", side_effect=lambda: self.cpu)
+        self.sleep_mock = mocker.patch("time.sleep")
+        self.governor = ScanGovernor(25)
+
+    def test_sleeps_when_over_budget(self) -> None:
+        self.wall = 1.0
+        self.cpu = 0.5
+
+        self.governor.tick()
+
+        self.sleep_mock.assert_called_once_with(mock.ANY)
+        assert self.sleep_mock.call_args.args[0] == pytest.approx(1.0)
+
+    def test_does_not_sleep_when_within_budget(self) -> None:
+        self.wall = 1.0
+        self.cpu = 0.2
+
+        self.governor.tick()
+
+        self.sleep_mock.assert_not_called()
+
+    def test_only_checks_after_interval(self) -> None:
+        self.wall = 0.01
+        self.cpu = 0.01
+
+        self.governor.tick()
+
+        self.sleep_mock.assert_not_called()
+
+    def test_rejects_empty_budget(self) -> None:
+        with pytest.raises(ValueError):
+            ScanGovernor(0)
+
+    def test_sleeps_when_reading_too_fast(self) -> None:
+        governor = ScanGovernor(25, max_read_bytes_per_sec=1000)
+        self.wall = 1.0
+        self.cpu = 0.1
+
+        governor.tick(bytes_read=3000)
+
+        assert self.sleep_mock.call_args.args[0] == pytest.approx(2.0)
+
+    def test_logs_budget_usage(self, caplog: pytest.LogCaptureFixture) -> None:
+        self.wall = 1.0
+        self.cpu = 0.5
+        self.governor.tick(bytes_read=1024 * 1024)
+
+        with caplog.at_level(logging.DEBUG, logger="ptyme_track.throttle"):
+            self.governor.log_usage()
+
+        assert "Scan used 0.50s CPU" in caplog.text
+        assert "read 1.0 MiB" in caplog.text
+        assert "slept 1.00s" in caplog.text
@@ -1,14 +1,57 @@
 import datetime
+import json
+import random
+from array import array
+from pathlib import Path
+from typing import List
 
+import pytest
+from pytest_mock import MockerFixture
+
+from ptyme_track import time_blocks
+from ptyme_track.signature import signature_from_time
 from ptyme_track.time_blocks import (
+    _EPOCH,
+    TIME_BLOCK_ENGINES,
     TimeBlock,
+    TimeBlockAccumulator,
+    _epoch_time_block,
     _remove_buffer_from_bufferless_blocks,
+    build_time_blocks_from_epochs,
     build_time_blocks_from_records,
+    get_time_blocks,
+    get_time_blocks_incremental,
+    parse_epoch,
 )
 
+# the pure Python and numpy implementations must give the same blocks
+EPOCH_BACKENDS = [
+    pytest.param(False, id="python"),
+    pytest.param(
+        True,
+        id="numpy",
+        marks=pytest.mark.skipif(time_blocks.numpy is None, reason="numpy is not installed"),
+    ),
+]
+
+T0 = datetime.datetime(2020, 1, 1)
+T0_EPOCH = parse_epoch("2020-01-01 00:00:00")
+
+
+def _epochs(*minutes: float) -> "array[int]":
+    return array("q", [T0_EPOCH + int(minute * 60) for minute in minutes])
+
+
+def _block(start_minutes: float, end_minutes: float) -> TimeBlock:
+    return TimeBlock(
+        T0 + datetime.timedelta(minutes=start_minutes),
+        T0 + datetime.timedelta(minutes=end_minutes),
+    )
 
+
+@pytest.mark.parametrize("engine", TIME_BLOCK_ENGINES)
 class TestBuildTimeBlocksFromRecords:
-    def test_removes_buffer_from_isolated_blocks(self) -> None:
+    def test_removes_buffer_from_isolated_blocks(self, engine: str) -> None:
         records = [
             {
                 "signed_time": {
@@ -25,10 +68,12 @@ class TestBuildTimeBlocksFromRecords:
                 }
             },
         ]
-        result = build_time_blocks_from_records(records, datetime.timedelta(minutes=5), 5, 90)
+        result = build_time_blocks_from_records(
+            records, datetime.timedelta(minutes=5), 5, 90, engine=engine
+        )
         assert result[0].duration == datetime.timedelta(minutes=2)
 
-    def test_adds_buffer_to_non_isolated_blocks(self) -> None:
+    def test_adds_buffer_to_non_isolated_blocks(self, engine: str) -> None:
         records = [
             {
                 "signed_time": {
@@ -59,10 +104,188 @@ class TestBuildTimeBlocksFromRecords:
                 }
             },
         ]
-        result = build_time_blocks_from_records(records, datetime.timedelta(minutes=5), 5, 90)
+        result = build_time_blocks_from_records(
+            records, datetime.timedelta(minutes=5), 5, 90, engine=engine
+        )
         assert result[0].duration == datetime.timedelta(minutes=12)
         assert result[1].duration == datetime.timedelta(minutes=14)
 
+    def test_accepts_unpadded_times(self, engine: str) -> None:
+        records = [
+            {"signed_time": {"time": "2020-1-1 0:0:0", "sig": "sig", "server_id": "id"}},
+            {"signed_time": {"time": "2020-01-01 00:02:00", "sig": "sig", "server_id": "id"}},
+        ]
+        result = build_time_blocks_from_records(
+            records, datetime.timedelta(minutes=5), 5, 90, engine=engine
+        )
+        assert result == [
+            TimeBlock(datetime.datetime(2020, 1, 1), datetime.datetime(2020, 1, 1, 0, 2))
+        ]
+
+    def test_invalid_time_raises(self, engine: str) -> None:
+        records = [
+            {"signed_time": {"time": "2020-02-30 00:00:00", "sig": "sig", "server_id": "id"}}
+        ]
+        with pytest.raises(ValueError):
+            build_time_blocks_from_records(
+                records, datetime.timedelta(minutes=5), 5, 90, engine=engine
+            )
+
+
+class TestEpochEngine:
+    @pytest.mark.parametrize("seed", range(5))
+    def test_matches_datetime_engine(self, seed: int) -> None:
+        rand = random.Random(seed)
+        cur_time = datetime.datetime(2019, 12, 30, 23, 0, 0)
+        records = []
+        for _ in range(2000):
+            cur_time += datetime.timedelta(
+                seconds=rand.choice([rand.randint(0, 600), rand.randint(0, 200_000)])
+            )
+            records.append(
+                {
+                    "signed_time": {
+                        "time": cur_time.strftime("%Y-%m-%d %H:%M:%S"),
+                        "sig": "sig",
+                        "server_id": "id",
+                    }
+                }
+            )
+        rand.shuffle(records)
+        buffer = datetime.timedelta(minutes=rand.randint(0, 10))
+        min_size = rand.randint(0, 30)
+        gap = rand.randint(0, 180)
+
+        assert build_time_blocks_from_records(
+            records, buffer, min_size, gap, engine="epoch"
+        ) == build_time_blocks_from_records(records, buffer, min_size, gap, engine="datetime")
+
+    def test_unknown_engine_raises(self) -> None:
+        with pytest.raises(ValueError):
+            build_time_blocks_from_records([], datetime.timedelta(minutes=5), engine="pandas")
+
+
+@pytest.mark.parametrize("use_numpy", EPOCH_BACKENDS)
+class TestBuildTimeBlocksFromEpochs:
+    def test_no_entries(self, use_numpy: bool) -> None:
+        assert build_time_blocks_from_epochs(array("q"), 300, use_numpy=use_numpy) == []
+
+    def test_single_entry_loses_buffer(self, use_numpy: bool) -> None:
+        assert build_time_blocks_from_epochs(_epochs(0), 300, use_numpy=use_numpy) == [
+            _block(0, 0)
+        ]
+
+    def test_merges_entries_within_buffer(self, use_numpy: bool) -> None:
+        result = build_time_blocks_from_epochs(
+            _epochs(10, 0, 4.99, 5, 20, 24), 300, 0, 0, use_numpy=use_numpy
+        )
+        # entries exactly a buffer apart start a new block
+        assert result == [_block(-5, 10), _block(5, 15), _block(15, 29)]
+
+    def test_keeps_buffer_of_big_blocks(self, use_numpy: bool) -> None:
+        result = build_time_blocks_from_epochs(
+            _epochs(0, 3, 6, 1000), 300, 5, 90, use_numpy=use_numpy
+        )
+        assert result == [_block(-5, 11), _block(1000, 1000)]
+
+    def test_keeps_buffer_of_blocks_near_others(self, use_numpy: bool) -> None:
+        # the gap between each entry and the buffer of the other block is exactly 90 minutes
+        result = build_time_blocks_from_epochs(_epochs(0, 95), 300, 5, 90, use_numpy=use_numpy)
+        assert result == [_block(-5, 5), _block(90, 100)]
+
+    def test_removes_buffer_from_run_of_isolated_blocks(self, use_numpy: bool) -> None:
+        result = build_time_blocks_from_epochs(
+            _epochs(0, 2, 200, 400, 401, 600, 680), 300, 5, 90, use_numpy=use_numpy
+        )
+        assert result == [
+            _block(0, 2),
+            _block(200, 200),
+            _block(400, 401),
+            _block(595, 605),
+            _block(675, 685),
+        ]
+
+    def test_zero_buffer(self, use_numpy: bool) -> None:
+        result = build_time_blocks_from_epochs(_epochs(0, 0, 1), 0, 5, 90, use_numpy=use_numpy)
+        assert result == [_block(0, 0), _block(0, 0), _block(1, 1)]
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_matches_datetime_engine(self, use_numpy: bool, seed: int) -> None:
+        rand = random.Random(seed)
+        minutes: List[float] = []
+        cur_minute = 0.0
+        for _ in range(1000):
+            cur_minute += rand.choice([rand.randint(0, 20), rand.randint(0, 300)]) + rand.random()
+            minutes.append(cur_minute)
+        rand.shuffle(minutes)
+        epochs = _epochs(*minutes)
+        buffer_minutes = rand.randint(0, 10)
+        min_size = rand.randint(0, 30)
+        gap = rand.randint(0, 180)
+        records = [
+            {
+                "signed_time": {
+                    "time": str(_EPOCH + datetime.timedelta(seconds=epoch)),
+                    "sig": "sig",
+                    "server_id": "id",
+                }
+            }
+            for epoch in epochs
+        ]
+
+        assert build_time_blocks_from_epochs(
+            epochs, buffer_minutes * 60, min_size, gap, use_numpy=use_numpy
+        ) == build_time_blocks_from_records(
+            records, datetime.timedelta(minutes=buffer_minutes), min_size, gap, engine="datetime"
+        )
+
+
+@pytest.mark.skipif(time_blocks.numpy is not None, reason="numpy is installed")
+def test_use_numpy_requires_numpy_package() -> None:
+    with pytest.raises(ValueError):
+        build_time_blocks_from_epochs(_epochs(0), 300, use_numpy=True)
+
+
+class TestParseEpoch:
+    @pytest.mark.parametrize(
+        "time_str",
+        [
+            "1970-01-01 00:00:00",
+            "1969-12-31 23:59:59",
+            "2000-02-29 12:34:56",
+            "2023-06-16 10:00:00",
+            "0001-01-01 00:00:00",
+            "9999-12-31 23:59:59",
+        ],
+    )
+    def test_matches_strptime(self, time_str: str) -> None:
+        expected = datetime.datetime.strptime(time_str, "%Y-%m-%d %H:%M:%S") - datetime.datetime(
+            1970, 1, 1
+        )
+        assert parse_epoch(time_str) == expected // datetime.timedelta(seconds=1)
+
+    @pytest.mark.parametrize(
+        "time_str",
+        [
+            "",
+            "2023-06-16T10:00:00",
+            "2023-06-16 10:00:00Z",
+            "2023-6-16 10:00:00",
+            "2023-06-16 1a:00:00",
+            "2023-06-16 10:00:0\u0663",
+            "2023-13-01 00:00:00",
+            "2023-02-29 00:00:00",
+            "1900-02-29 00:00:00",
+            "2023-06-16 24:00:00",
+            "2023-06-16 00:60:00",
+            "2023-06-16 00:00:60",
+            "0000-01-01 00:00:00",
+        ],
+    )
+    def test_rejects_invalid(self, time_str: str) -> None:
+        with pytest.raises(ValueError):
+            parse_epoch(time_str)
+
 
 class TestRemoveBufferFromBufferlessBlocks:
     def test_removes_buffer_from_only_isolated_blocks(self) -> None:
@@ -106,3 +329,159 @@ class TestRemoveBufferFromBufferlessBlocks:
         assert result[2].duration == datetime.timedelta(minutes=40)
         assert result[3].duration == datetime.timedelta(minutes=12)
         assert result[4].duration == datetime.timedelta(minutes=12)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_accumulator_matches_building_all_blocks(seed: int) -> None:
+    rand = random.Random(seed)
+    epochs = array("q", [T0_EPOCH])
+    for _ in range(500):
+        epochs.append(epochs[-1] + rand.choice([rand.randint(0, 1200), rand.randint(0, 18000)]))
+    buffer_sec = rand.randint(0, 600)
+    min_size = rand.randint(0, 30)
+    gap = rand.randint(0, 180)
+
+    blocks = []
+    accumulator = TimeBlockAccumulator(buffer_sec, min_size, gap)
+    for idx, epoch in enumerate(epochs):
+        if idx % 50 == 0:
+            # continues from a saved state
+            accumulator = TimeBlockAccumulator(buffer_sec, min_size, gap, accumulator.state)
+        finished = accumulator.add(epoch)
+        if finished:
+            blocks.append(finished)
+    open_block = accumulator.open_block()
+    assert open_block is not None
+    blocks.append(open_block)
+
+    expected = build_time_blocks_from_epochs(epochs, buffer_sec, min_size, gap, use_numpy=False)
+    assert [_epoch_time_block(*block) for block in blocks] == expected
+    assert accumulator.finished_blocks == len(expected) - 1
+    assert accumulator.finished_sec == sum(
+        (block.end_time - block.start_time).total_seconds() for block in expected[:-1]
+    )
+
+
+class TestTimeBlockAccumulator:
+    def test_no_times(self) -> None:
+        assert TimeBlockAccumulator(300).open_block() is None
+
+    def test_accepts_times_within_open_block_out_of_order(self) -> None:
+        accumulator = TimeBlockAccumulator(300, 0, 0)
+        accumulator.add(T0_EPOCH)
+        accumulator.add(T0_EPOCH + 240)
+        accumulator.add(T0_EPOCH + 120)
+
+        assert accumulator.open_block() == (T0_EPOCH - 300, T0_EPOCH + 540)
+
+    def test_rejects_times_before_open_block(self) -> None:
+        accumulator = TimeBlockAccumulator(300)
+        accumulator.add(T0_EPOCH)
+
+        assert not accumulator.accepts(T0_EPOCH - 1)
+        with pytest.raises(ValueError):
+            accumulator.add(T0_EPOCH - 1)
+
+
+class TestGetTimeBlocksIncremental:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self.file = tmp_path / "times"
+        self.file.touch()
+
+    def _append(self, *minutes: float) -> None:
+        with self.file.open("a") as times_file:
+            for minute in minutes:
+                time_str = str(T0 + datetime.timedelta(minutes=minute))
+                signed_time = {
+                    "server_id": "id",
+                    "time": time_str,
+                    "sig": signature_from_time("secret", time_str),
+                }
+                times_file.write(json.dumps({"signed_time": signed_time}) + "\n")
+
+    def _expected(self) -> List[TimeBlock]:
+        return get_time_blocks(self.file, "secret")
+
+    def test_first_run_matches_get_time_blocks(self) -> None:
+        self._append(0, 2, 4, 200, 300, 301)
+
+        blocks, total = get_time_blocks_incremental(self.file, "secret")
+
+        assert blocks == self._expected()
+        assert total == sum((block.duration for block in blocks), datetime.timedelta())
+
+    def test_only_returns_blocks_since_checkpoint(self) -> None:
+        self._append(0, 2, 4, 200, 300, 301)
+        get_time_blocks_incremental(self.file, "secret")
+        self._append(302, 500)
+
+        blocks, total = get_time_blocks_incremental(self.file, "secret")
+
+        expected = self._expected()
+        # the block that was open is finished now
+        assert blocks == expected[-2:]
+        assert total == sum((block.duration for block in expected), datetime.timedelta())
+
+    def test_does_not_reread_file(self, mocker: MockerFixture) -> None:
+        self._append(0, 2, 4, 200)
+        get_time_blocks_incremental(self.file, "secret")
+        self._append(300)
+        iter_valid_records = mocker.spy(time_blocks, "iter_valid_records")
+
+        get_time_blocks_incremental(self.file, "secret")
+
+        assert iter_valid_records.call_args.kwargs["byte_range"][0] > 0
+
+    def test_nothing_new(self) -> None:
+        self._append(0, 2, 4, 200)
+        _, total = get_time_blocks_incremental(self.file, "secret")
+
+        blocks, new_total = get_time_blocks_incremental(self.file, "secret")
+
+        assert blocks == self._expected()[-1:]
+        assert new_total == total
+
+    def test_leaves_partial_line_for_next_run(self) -> None:
+        self._append(0, 2)
+        with self.file.open("a") as times_file:
+            times_file.write('{"signed_time": ')
+        get_time_blocks_incremental(self.file, "secret")
+        self.file.write_text(self.file.read_text()[: -len('{"signed_time": ')])
+        self._append(3, 100)
+
+        _, total = get_time_blocks_incremental(self.file, "secret")
+
+        assert total == sum((block.duration for block in self._expected()), datetime.timedelta())
+
+    def test_rebuilds_when_earlier_records_are_added(self) -> None:
+        self._append(0, 2, 200, 300)
+        get_time_blocks_incremental(self.file, "secret")
+        self._append(100, 400)
+
+        blocks, total = get_time_blocks_incremental(self.file, "secret")
+
+        assert blocks == self._expected()
+        assert total == sum((block.duration for block in blocks), datetime.timedelta())
+
+    def test_rebuilds_when_config_changes(self) -> None:
+        self._append(0, 2, 200, 300)
+        get_time_blocks_incremental(self.file, "secret")
+
+        blocks, _ = get_time_blocks_incremental(self.file, "secret", buffer_minutes=10)
+
+        assert blocks == get_time_blocks(self.file, "secret", buffer_minutes=10)
+
+    def test_skips_invalid_records(self) -> None:
+        self._append(0, 2)
+        with self.file.open("a") as times_file:
+            times_file.write(
+                json.dumps({"signed_time": {"server_id": "id", "time": str(T0), "sig": "x"}})
+                + "\n"
+            )
+        get_time_blocks_incremental(self.file, "secret")
+        self._append(200)
+
+        _, total = get_time_blocks_incremental(self.file, "secret")
+
+        assert total == sum((block.duration for block in self._expected()), datetime.timedelta())
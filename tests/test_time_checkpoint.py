@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import pytest
+
+from ptyme_track.time_checkpoint import (
+    TimeBlockCheckpoint,
+    checkpoint_path_for,
+    complete_lines_end,
+)
+
+CONFIG = {"buffer_sec": 300}
+STATE = {"start": 1, "end": 2}
+
+
+class TestTimeBlockCheckpoint:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self.file = tmp_path / "times"
+        self.file.write_text('{"first": 1}\n{"second": 2}\n')
+
+    def _save(self, secret: str = "secret") -> None:
+        TimeBlockCheckpoint.at(self.file, self.file.stat().st_size, CONFIG, STATE).save(
+            self.file, secret
+        )
+
+    def test_saves_next_to_file(self) -> None:
+        self._save()
+
+        assert checkpoint_path_for(self.file) == self.file.with_name(".times.checkpoint")
+        assert checkpoint_path_for(self.file).exists()
+
+    def test_loads_saved_checkpoint(self) -> None:
+        self._save()
+
+        checkpoint = TimeBlockCheckpoint.load(self.file, "secret", CONFIG)
+
+        assert checkpoint is not None
+        assert checkpoint.offset == self.file.stat().st_size
+        assert checkpoint.state == STATE
+
+    def test_loads_after_appending(self) -> None:
+        self._save()
+        with self.file.open("a") as times_file:
+            times_file.write('{"third": 3}\n')
+
+        assert TimeBlockCheckpoint.load(self.file, "secret", CONFIG) is not None
+
+    def test_missing_checkpoint(self) -> None:
+        assert TimeBlockCheckpoint.load(self.file, "secret", CONFIG) is None
+
+    def test_ignores_checkpoint_for_another_secret(self) -> None:
+        self._save("other secret")
+
+        assert TimeBlockCheckpoint.load(self.file, "secret", CONFIG) is None
+
+    def test_ignores_checkpoint_for_another_config(self) -> None:
+        self._save()
+
+        assert TimeBlockCheckpoint.load(self.file, "secret", {"buffer_sec": 600}) is None
+
+    def test_ignores_modified_checkpoint(self) -> None:
+        self._save()
+        path = checkpoint_path_for(self.file)
+        path.write_bytes(path.read_bytes().replace(b'"end": 2', b'"end": 9'))
+
+        assert TimeBlockCheckpoint.load(self.file, "secret", CONFIG) is None
+
+    def test_ignores_malformed_checkpoint(self) -> None:
+        checkpoint_path_for(self.file).write_text("nope")
+
+        assert TimeBlockCheckpoint.load(self.file, "secret", CONFIG) is None
+
+    def test_ignores_checkpoint_when_file_was_rewritten(self) -> None:
+        self._save()
+        self.file.write_text('{"first": 1}\n{"other": 2}\n')
+
+        assert TimeBlockCheckpoint.load(self.file, "secret", CONFIG) is None
+
+    def test_ignores_checkpoint_when_file_was_truncated(self) -> None:
+        self._save()
+        self.file.write_text('{"first": 1}\n')
+
+        assert TimeBlockCheckpoint.load(self.file, "secret", CONFIG) is None
+
+
+class TestCompleteLinesEnd:
+    def test_end_of_file(self, tmp_path: Path) -> None:
+        file = tmp_path / "times"
+        file.write_text("one\ntwo\n")
+
+        assert complete_lines_end(file, 0) == 8
+
+    def test_skips_partial_line(self, tmp_path: Path) -> None:
+        file = tmp_path / "times"
+        file.write_text("one\ntwo\nthr")
+
+        assert complete_lines_end(file, 0) == 8
+
+    def test_partial_line_longer_than_tail(self, tmp_path: Path) -> None:
+        file = tmp_path / "times"
+        file.write_text("one\n" + "x" * 10000)
+
+        assert complete_lines_end(file, 0) == 4
+
+    def test_no_complete_line_after_start(self, tmp_path: Path) -> None:
+        file = tmp_path / "times"
+        file.write_text("one\ntwo")
+
+        assert complete_lines_end(file, 4) == 4
@@ -0,0 +1,104 @@
+import datetime
+import json
+import os
+from pathlib import Path
+from typing import List
+
+import pytest
+from pytest_mock import MockerFixture
+
+from ptyme_track.time_blocks import get_time_blocks
+from ptyme_track.time_index import TimeIndex, index_path_for, time_region, update_time_index
+
+
+def _record(time_str: str) -> str:
+    return json.dumps({"signed_time": {"server_id": "id", "time": time_str, "sig": ""}}) + "\n"
+
+
+class TestTimeIndex:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self.file = tmp_path / "user"
+        self.lines = [
+            _record("2023-06-15 10:00:00"),
+            _record("2023-06-16 10:00:00"),
+            _record("2023-06-16 11:00:00"),
+            _record("2023-06-17 10:00:00"),
+        ]
+        self.file.write_text("".join(self.lines))
+
+    def _read(self, byte_range: tuple) -> List[str]:
+        with self.file.open("rb") as times_file:
+            times_file.seek(byte_range[0])
+            data = times_file.read(byte_range[1] - byte_range[0])
+        return data.decode("utf-8").splitlines(keepends=True)
+
+    def test_region_covers_the_days_in_range(self) -> None:
+        index = TimeIndex.build(self.file)
+
+        region = index.region(
+            datetime.datetime(2023, 6, 16, 9), datetime.datetime(2023, 6, 16, 12)
+        )
+
+        assert self._read(region) == self.lines[1:3]
+
+    def test_region_is_empty_without_records(self) -> None:
+        index = TimeIndex.build(self.file)
+
+        assert index.region(datetime.datetime(2024, 1, 1), None) == (0, 0)
+
+    def test_region_covers_records_out_of_order(self) -> None:
+        late = _record("2023-06-15 12:00:00")
+        with self.file.open("a") as times_file:
+            times_file.write(late)
+        index = TimeIndex.build(self.file)
+
+        region = index.region(None, datetime.datetime(2023, 6, 15, 23))
+
+        assert self._read(region)[0] == self.lines[0]
+        assert self._read(region)[-1] == late
+
+    def test_update_scans_only_appended_records(self, mocker: MockerFixture) -> None:
+        TimeIndex.build(self.file).save(self.file)
+        previous_stat = self.file.stat()
+        with self.file.open("a") as times_file:
+            times_file.write(_record("2023-06-18 10:00:00"))
+        scan_spy = mocker.spy(TimeIndex, "_scan")
+
+        update_time_index(self.file, previous_stat)
+
+        assert scan_spy.call_args.args[2] == previous_stat.st_size
+        index = TimeIndex.load(self.file)
+        assert index is not None
+        region = index.region(datetime.datetime(2023, 6, 18), None)
+        assert self._read(region) == [_record("2023-06-18 10:00:00")]
+
+    def test_rebuilds_after_other_changes(self) -> None:
+        TimeIndex.build(self.file).save(self.file)
+        self.file.write_text("".join(self.lines[2:]))
+        os.utime(self.file, ns=(0, 0))
+
+        assert TimeIndex.load(self.file) is None
+        region = time_region(self.file, datetime.datetime(2023, 6, 16), None)
+
+        assert self._read(region) == self.lines[2:]
+        assert index_path_for(self.file).exists()
+
+    def test_get_time_blocks_reads_only_the_region(self, mocker: MockerFixture) -> None:
+        TimeIndex.build(self.file).save(self.file)
+        loads_spy = mocker.spy(json, "loads")
+
+        blocks = get_time_blocks(
+            self.file,
+            "",
+            start_time_utc=datetime.datetime(2023, 6, 16),
+            end_time_utc=datetime.datetime(2023, 6, 16, 23),
+            check_against_secret=False,
+        )
+
+        # one to load the index, two for the records
+        assert loads_spy.call_count == 3
+        assert [block.start_time for block in blocks] == [
+            datetime.datetime(2023, 6, 16, 9, 55),
+            datetime.datetime(2023, 6, 16, 10, 55),
+        ]
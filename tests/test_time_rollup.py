@@ -0,0 +1,133 @@
+import datetime
+import io
+import json
+import random
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from ptyme_track.signature import signature_from_time
+from ptyme_track.time_blocks import build_time_blocks_from_records
+from ptyme_track.time_rollup import TimeRollup, get_time_rollup, rollup_records
+
+T0 = datetime.datetime(2023, 6, 16, 23, 50)
+
+
+def _record(minutes: float, branch: Optional[str] = None, secret: str = "secret") -> dict:
+    time_str = (T0 + datetime.timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S")
+    return {
+        "signed_time": {
+            "server_id": "id",
+            "time": time_str,
+            "sig": signature_from_time(secret, time_str),
+        },
+        "git-branch": branch,
+    }
+
+
+def _total_sec(records: List[dict]) -> int:
+    blocks = build_time_blocks_from_records(records, datetime.timedelta(minutes=5))
+    return sum(int(block.duration.total_seconds()) for block in blocks)
+
+
+class TestRollupRecords:
+    def test_no_records(self) -> None:
+        assert rollup_records([]) == TimeRollup()
+
+    def test_splits_blocks_at_midnight(self) -> None:
+        rollup = rollup_records([_record(minutes) for minutes in range(0, 24, 4)])
+
+        # one block from 23:45 to 00:15
+        assert rollup.total_sec == 30 * 60
+        assert rollup.days == {"2023-06-16": 15 * 60, "2023-06-17": 15 * 60}
+
+    def test_buckets_by_iso_week(self) -> None:
+        # 2023-06-18 is a Sunday
+        rollup = rollup_records([_record(2 * 24 * 60 + minutes) for minutes in range(0, 24, 4)])
+
+        assert rollup.weeks == {"2023-W24": 15 * 60, "2023-W25": 15 * 60}
+
+    def test_buckets_by_branch(self) -> None:
+        records = [
+            _record(0, "main"),
+            _record(4, "feature"),
+            _record(8, "main"),
+            _record(200, "feature"),
+            _record(201),
+        ]
+
+        rollup = rollup_records(records)
+
+        assert rollup.total_sec == _total_sec(records)
+        assert rollup.branch_secs == {
+            "main": _total_sec([r for r in records if r["git-branch"] == "main"]),
+            "feature": _total_sec([r for r in records if r["git-branch"] == "feature"]),
+            None: _total_sec([r for r in records if r["git-branch"] is None]),
+        }
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_matches_time_blocks(self, seed: int) -> None:
+        rand = random.Random(seed)
+        minute = 0.0
+        records = []
+        for _ in range(500):
+            minute += rand.choice([rand.randint(0, 15), rand.randint(0, 1000)]) + rand.random()
+            records.append(_record(minute, rand.choice(["main", "feature", None])))
+        rand.shuffle(records)
+
+        rollup = rollup_records(records)
+
+        assert rollup.total_sec == _total_sec(records)
+        assert sum(rollup.days.values()) == rollup.total_sec
+        assert sum(rollup.weeks.values()) == rollup.total_sec
+        for branch in ("main", "feature", None):
+            assert rollup.branch_secs[branch] == _total_sec(
+                [r for r in records if r["git-branch"] == branch]
+            )
+
+
+class TestTimeRollupOutput:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self.rollup = TimeRollup(
+            total_sec=3600, day_secs={19524: 3600}, branch_secs={"main": 3000, None: 600}
+        )
+
+    def test_writes_json_lines(self) -> None:
+        out = io.StringIO()
+        self.rollup.write(out, "json")
+
+        assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+            {"bucket": "total", "key": None, "seconds": 3600, "duration": "1:00:00"},
+            {"bucket": "day", "key": "2023-06-16", "seconds": 3600, "duration": "1:00:00"},
+            {"bucket": "week", "key": "2023-W24", "seconds": 3600, "duration": "1:00:00"},
+            {"bucket": "branch", "key": None, "seconds": 600, "duration": "0:10:00"},
+            {"bucket": "branch", "key": "main", "seconds": 3000, "duration": "0:50:00"},
+        ]
+
+    def test_writes_csv(self) -> None:
+        out = io.StringIO()
+        self.rollup.write(out, "csv")
+
+        assert out.getvalue() == (
+            "bucket,key,seconds,duration\n"
+            "total,,3600,1:00:00\n"
+            "day,2023-06-16,3600,1:00:00\n"
+            "week,2023-W24,3600,1:00:00\n"
+            "branch,,600,0:10:00\n"
+            "branch,main,3000,0:50:00\n"
+        )
+
+    def test_unknown_format(self) -> None:
+        with pytest.raises(ValueError):
+            self.rollup.write(io.StringIO(), "xml")
+
+
+def test_get_time_rollup_skips_invalid_records(tmp_path: Path) -> None:
+    file = tmp_path / "times"
+    records = [_record(0), _record(2), _record(4, secret="other secret")]
+    file.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+    assert get_time_rollup(file, "secret").total_sec == 2 * 60
+    assert get_time_rollup(file, "secret", check_against_secret=False).total_sec == 4 * 60
@@ -0,0 +1,98 @@
+import json
+import socket
+import threading
+import time
+from typing import Iterator
+from unittest import mock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from ptyme_track.server import BoundedThreadingHTTPServer, MyRequestHandler
+from ptyme_track.transport import HttpTransport, TransportError
+
+
+class QuickTimeoutHandler(MyRequestHandler):
+    timeout = 0.1
+
+
+class FailingHandler(MyRequestHandler):
+    failures = 0
+
+    def do_GET(self) -> None:
+        if FailingHandler.failures:
+            FailingHandler.failures -= 1
+            self._send_json(503)
+            return
+        super().do_GET()
+
+
+class TestHttpTransport:
+    def _serve(self, handler_class: type) -> Iterator[str]:
+        httpd = BoundedThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.start()
+        yield f"http://127.0.0.1:{httpd.server_address[1]}"
+        httpd.shutdown()
+        httpd.server_close()
+        thread.join()
+
+    @pytest.fixture
+    def server_url(self) -> Iterator[str]:
+        yield from self._serve(MyRequestHandler)
+
+    @pytest.fixture
+    def sleep_mock(self, mocker: MockerFixture) -> Iterator[mock.MagicMock]:
+        yield mocker.patch("ptyme_track.transport.time.sleep")
+
+    def test_reuses_connections(self, server_url: str, mocker: MockerFixture) -> None:
+        connect_spy = mocker.spy(socket, "create_connection")
+        transport = HttpTransport(server_url)
+
+        first = json.loads(transport.request("GET"))
+        second = json.loads(transport.request("GET"))
+        transport.close()
+
+        assert connect_spy.call_count == 1
+        assert first["server_id"] == second["server_id"]
+
+    def test_replaces_connections_closed_by_the_server(self, sleep_mock: mock.MagicMock) -> None:
+        for server_url in self._serve(QuickTimeoutHandler):
+            transport = HttpTransport(server_url, retries=0)
+            transport.request("GET")
+            # the server drops the idle connection
+            time.sleep(0.3)
+
+            assert json.loads(transport.request("GET"))["server_id"]
+            transport.close()
+
+    def test_retries_server_errors(self, sleep_mock: mock.MagicMock) -> None:
+        FailingHandler.failures = 2
+        for server_url in self._serve(FailingHandler):
+            transport = HttpTransport(server_url, retries=2)
+
+            assert json.loads(transport.request("GET"))["server_id"]
+            transport.close()
+
+    def test_gives_up_after_retries(self, sleep_mock: mock.MagicMock) -> None:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        transport = HttpTransport(f"http://127.0.0.1:{port}", retries=3, backoff_sec=1)
+
+        with pytest.raises(TransportError):
+            transport.request("GET")
+
+        delays = [call.args[0] for call in sleep_mock.call_args_list]
+        assert len(delays) == 3
+        assert delays[0] < delays[2]
+
+    def test_does_not_retry_client_errors(
+        self, server_url: str, sleep_mock: mock.MagicMock
+    ) -> None:
+        transport = HttpTransport(server_url)
+
+        with pytest.raises(TransportError):
+            transport.request("POST", body=b"not json")
+
+        sleep_mock.assert_not_called()
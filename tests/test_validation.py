@@ -1,9 +1,16 @@
+import datetime
 import json
 from pathlib import Path
+from typing import Any, List
 
 import pytest
 
-from ptyme_track.validation import _SecretAndValidator, load_entries
+from ptyme_track.validation import (
+    _SecretAndValidator,
+    iter_entries,
+    iter_valid_records,
+    load_entries,
+)
 
 
 class TestLoadEntries:
@@ -70,3 +77,42 @@ class TestLoadEntries:
 
         assert len(valid) == 2
         assert len(invalid) == 0
+
+
+class TestIterEntries:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self.input_file = tmp_path / "input"
+        with self.input_file.open("w") as in_file:
+            for time_str in ["2023-06-16 22:26:26", "2023-06-16 22:27:36", "2023-06-17 01:00:00"]:
+                json.dump(
+                    {"signed_time": {"server_id": "id", "time": time_str, "sig": ""}}, in_file
+                )
+                in_file.write("\n")
+            in_file.write("not json\n")
+
+    def _times(self, **kwargs: Any) -> List[str]:
+        return [
+            record["signed_time"]["time"]
+            for record in iter_valid_records(self.input_file, None, **kwargs)
+        ]
+
+    def test_is_lazy(self) -> None:
+        entries = iter_entries(self.input_file)
+
+        assert next(entries)[1] is True
+
+    def test_yields_invalid_lines(self) -> None:
+        assert list(iter_entries(self.input_file))[-1] == ("not json\n", False)
+
+    def test_filters_by_time_exclusively(self) -> None:
+        assert self._times(
+            start_time_utc=datetime.datetime(2023, 6, 16, 22, 26, 26),
+            end_time_utc=datetime.datetime(2023, 6, 17, 1, 0, 0),
+        ) == ["2023-06-16 22:27:36"]
+
+    def test_filters_by_fractional_times(self) -> None:
+        assert self._times(
+            start_time_utc=datetime.datetime(2023, 6, 16, 22, 26, 25, 500000),
+            end_time_utc=datetime.datetime(2023, 6, 17, 1, 0, 0, 500000),
+        ) == ["2023-06-16 22:26:26", "2023-06-16 22:27:36", "2023-06-17 01:00:00"]
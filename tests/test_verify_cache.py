@@ -0,0 +1,83 @@
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from ptyme_track import validation
+from ptyme_track.signature import signature_from_time
+from ptyme_track.signed_time import SignedTime
+from ptyme_track.validation import cached_validator
+from ptyme_track.verify_cache import VerificationCache
+
+
+class TestVerificationCache:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self.path = tmp_path / ".verify_cache"
+
+    def test_remembers_verified_times(self) -> None:
+        cache = VerificationCache(self.path, "secret")
+        cache.add("2023-06-16 22:26:26", "sig")
+        cache.save()
+
+        cache = VerificationCache(self.path, "secret")
+
+        assert cache.is_verified("2023-06-16 22:26:26", "sig")
+        assert not cache.is_verified("2023-06-16 22:26:26", "other sig")
+        assert not cache.is_verified("2023-06-16 22:26:27", "sig")
+
+    def test_ignores_cache_for_another_secret(self) -> None:
+        cache = VerificationCache(self.path, "secret")
+        cache.add("2023-06-16 22:26:26", "sig")
+        cache.save()
+
+        assert not VerificationCache(self.path, "other secret").is_verified(
+            "2023-06-16 22:26:26", "sig"
+        )
+
+    def test_ignores_modified_cache(self) -> None:
+        cache = VerificationCache(self.path, "secret")
+        cache.add("2023-06-16 22:26:26", "sig")
+        cache.save()
+        self.path.write_bytes(self.path.read_bytes().replace(b'"sig"', b'"forged"'))
+
+        assert not VerificationCache(self.path, "secret").is_verified(
+            "2023-06-16 22:26:26", "forged"
+        )
+
+    def test_evicts_least_recently_used(self) -> None:
+        cache = VerificationCache(self.path, "secret", max_entries=2)
+        cache.add("a", "sig a")
+        cache.add("b", "sig b")
+        cache.is_verified("a", "sig a")
+        cache.add("c", "sig c")
+        cache.save()
+
+        cache = VerificationCache(self.path, "secret")
+
+        assert cache.is_verified("a", "sig a")
+        assert not cache.is_verified("b", "sig b")
+        assert cache.is_verified("c", "sig c")
+
+
+class TestCachedValidator:
+    def test_skips_verified_signatures(self, tmp_path: Path, mocker: MockerFixture) -> None:
+        signed_time = SignedTime(
+            "id", "2023-06-16 22:26:26", signature_from_time("secret", "2023-06-16 22:26:26")
+        )
+        validator = cached_validator(VerificationCache(tmp_path / ".verify_cache", "secret"))
+        assert validator("secret", signed_time)["sig_matches"]
+        signature_spy = mocker.spy(validation, "signature_from_time")
+
+        assert validator("secret", signed_time)["sig_matches"]
+
+        signature_spy.assert_not_called()
+
+    def test_does_not_cache_invalid_signatures(self, tmp_path: Path) -> None:
+        cache = VerificationCache(tmp_path / ".verify_cache", "secret")
+        validator = cached_validator(cache)
+
+        assert not validator("secret", SignedTime("id", "2023-06-16 22:26:26", "forged"))[
+            "sig_matches"
+        ]
+        assert not cache.is_verified("2023-06-16 22:26:26", "forged")
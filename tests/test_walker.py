@@ -0,0 +1,154 @@
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from ptyme_track.walker import (
+    GitignoreCache,
+    IgnoreMatcher,
+    list_git_files,
+    walk_dirs,
+    walk_files,
+)
+
+
+class TestIgnoreMatcher:
+    @pytest.mark.parametrize(
+        "pattern, rel_path, is_dir, expected",
+        [
+            ("node_modules", "node_modules", True, True),
+            ("node_modules", "a/b/node_modules", True, True),
+            ("node_modules", "my_node_modules", True, False),
+            ("*.log", "a/debug.log", False, True),
+            ("build/", "build", False, False),
+            ("build/", "src/build", True, True),
+            ("/build", "src/build", True, False),
+            ("docs/*.md", "docs/index.md", False, True),
+            ("docs/*.md", "docs/api/index.md", False, False),
+            ("docs/**/*.md", "docs/api/index.md", False, True),
+            ("**/generated", "a/b/generated", True, True),
+            ("file[0-9]", "file1", False, True),
+            ("file[!0-9]", "file1", False, False),
+        ],
+    )
+    def test_matches(self, pattern: str, rel_path: str, is_dir: bool, expected: bool) -> None:
+        assert IgnoreMatcher([pattern]).matches(rel_path, is_dir) is expected
+
+    def test_negation_reincludes(self) -> None:
+        matcher = IgnoreMatcher(["*.log", "!keep.log"])
+
+        assert matcher.matches("debug.log", False)
+        assert not matcher.matches("keep.log", False)
+
+    def test_skips_comments_and_blank_lines(self) -> None:
+        assert not IgnoreMatcher(["# comment", "", "  "])
+
+    def test_is_ignored_checks_parent_directories(self) -> None:
+        matcher = IgnoreMatcher(["node_modules"])
+
+        assert matcher.is_ignored("node_modules/package/index.js")
+        assert not matcher.is_ignored("src/index.js")
+
+
+class TestWalkFiles:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self.root = tmp_path / "root"
+        (self.root / "src" / "__pycache__").mkdir(parents=True)
+        (self.root / "src" / "main.py").write_text("")
+        (self.root / "src" / "__pycache__" / "main.pyc").write_text("")
+        (self.root / "node_modules" / "package").mkdir(parents=True)
+        (self.root / "node_modules" / "package" / "index.js").write_text("")
+        (self.root / ".git").mkdir()
+        (self.root / ".git" / "HEAD").write_text("")
+        (self.root / ".env").write_text("")
+        (self.root / "README.md").write_text("")
+        self.matcher = IgnoreMatcher(["node_modules", "__pycache__"])
+
+    def test_skips_hidden_and_ignored(self) -> None:
+        result = sorted(walk_files(self.root, self.matcher))
+
+        assert result == [self.root / "README.md", self.root / "src" / "main.py"]
+
+    def test_does_not_descend_into_ignored_directories(self, mocker: MockerFixture) -> None:
+        scandir_spy = mocker.spy(os, "scandir")
+
+        list(walk_files(self.root, self.matcher))
+
+        scanned = {Path(call.args[0]) for call in scandir_spy.call_args_list}
+        assert scanned == {self.root, self.root / "src"}
+
+    def test_starts_from_directory_relative_to_root(self) -> None:
+        matcher = IgnoreMatcher(["/src/main.py", "__pycache__"])
+
+        result = list(walk_files(self.root, matcher, self.root / "src"))
+
+        assert result == []
+
+    def test_walk_dirs_includes_start(self) -> None:
+        result = sorted(walk_dirs(self.root, self.matcher))
+
+        assert result == [str(self.root), str(self.root / "src")]
+
+
+class TestGitignore:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self.root = tmp_path / "root"
+        (self.root / "build").mkdir(parents=True)
+        (self.root / "build" / "out.js").write_text("")
+        (self.root / "src" / "generated").mkdir(parents=True)
+        (self.root / "src" / "generated" / "api.py").write_text("")
+        (self.root / "src" / "main.py").write_text("")
+        (self.root / "src" / "main.log").write_text("")
+        (self.root / "src" / "keep.log").write_text("")
+        (self.root / ".gitignore").write_text("build/\n*.log\n")
+        (self.root / "src" / ".gitignore").write_text("generated\n!keep.log\n")
+        self.gitignore = GitignoreCache()
+
+    def test_walk_honors_nested_gitignore_files(self) -> None:
+        result = sorted(walk_files(self.root, IgnoreMatcher([]), gitignore=self.gitignore))
+
+        assert result == [self.root / "src" / "keep.log", self.root / "src" / "main.py"]
+
+    def test_walk_from_directory_honors_parent_gitignore(self) -> None:
+        result = sorted(
+            walk_files(self.root, IgnoreMatcher([]), self.root / "src", self.gitignore)
+        )
+
+        assert result == [self.root / "src" / "keep.log", self.root / "src" / "main.py"]
+
+    def test_is_ignored(self) -> None:
+        assert self.gitignore.is_ignored(self.root, "build/out.js")
+        assert self.gitignore.is_ignored(self.root, "src/generated/api.py")
+        assert self.gitignore.is_ignored(self.root, "src/main.log")
+        assert not self.gitignore.is_ignored(self.root, "src/keep.log")
+        assert not self.gitignore.is_ignored(self.root, "src/main.py")
+
+    def test_reloads_changed_gitignore(self) -> None:
+        assert self.gitignore.is_ignored(self.root, "build/out.js")
+        gitignore_file = self.root / ".gitignore"
+        gitignore_file.write_text("")
+        stat = gitignore_file.stat()
+        os.utime(gitignore_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        assert not self.gitignore.is_ignored(self.root, "build/out.js")
+
+    @pytest.mark.skipif(not shutil.which("git"), reason="requires git")
+    def test_list_git_files(self) -> None:
+        subprocess.run(["git", "init", "-q"], cwd=self.root, check=True)
+
+        result = sorted(list_git_files(self.root) or [])
+
+        assert result == [
+            self.root / ".gitignore",
+            self.root / "src" / ".gitignore",
+            self.root / "src" / "keep.log",
+            self.root / "src" / "main.py",
+        ]
+
+    def test_list_git_files_outside_work_tree(self, tmp_path: Path) -> None:
+        assert list_git_files(tmp_path / "missing") is None